@@ -0,0 +1,232 @@
+"""
+Offline benchmarks for the hot paths of bootstrap.py.
+
+No network access is needed: the bootstrap environment is built from a local,
+file-based package index containing a fake package manager, whose ``install``
+command does nothing.
+
+Usage:
+
+    python benchmarks/bench_bootstrap.py --output results.json
+    python benchmarks/bench_bootstrap.py --baseline benchmarks/baseline.json --threshold 0.25
+    python benchmarks/bench_bootstrap.py --baseline benchmarks/baseline.json --update-baseline
+
+The exit code is 1 if any benchmark is slower than its baseline by more than the threshold.
+"""
+
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import zipfile
+from argparse import ArgumentParser, Namespace
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import bootstrap
+from bootstrap import BootstrapConfig, CreateBootstrapEnvironment, Executor, PyPiSourceParser, Runnable
+
+FAKE_PACKAGE_MANAGER = "fakepm"
+FAKE_PACKAGE_MANAGER_VERSION = "1.0.0"
+EXECUTOR_INPUT_COUNTS = [10, 100, 1000, 10000]
+
+
+@dataclass
+class BenchmarkResult:
+    median_s: float
+    min_s: float
+    repeats: int
+
+
+class _FilesRunnable(Runnable):
+    def __init__(self, inputs: List[Path]) -> None:
+        self.inputs = inputs
+
+    def run(self) -> int:
+        return 0
+
+    def get_name(self) -> str:
+        return f"files-{len(self.inputs)}"
+
+    def get_inputs(self) -> List[Path]:
+        return self.inputs
+
+    def get_outputs(self) -> List[Path]:
+        return []
+
+
+def measure(function: Callable[[], object], repeats: int) -> BenchmarkResult:
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return BenchmarkResult(statistics.median(durations), min(durations), repeats)
+
+
+@contextmanager
+def working_directory(path: Path) -> Iterator[None]:
+    previous = Path.cwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def create_package_index(index_dir: Path) -> str:
+    """Create a PEP 503 simple index with a wheel of the fake package manager. Returns the index URL."""
+    name, version = FAKE_PACKAGE_MANAGER, FAKE_PACKAGE_MANAGER_VERSION
+    dist_info = f"{name}-{version}.dist-info"
+    wheel_name = f"{name}-{version}-py3-none-any.whl"
+    files = {
+        f"{name}/__init__.py": "def main() -> int:\n    return 0\n",
+        f"{dist_info}/METADATA": f"Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n",
+        f"{dist_info}/WHEEL": "Wheel-Version: 1.0\nGenerator: bench_bootstrap\nRoot-Is-Purelib: true\nTag: py3-none-any\n",
+        f"{dist_info}/entry_points.txt": f"[console_scripts]\n{name} = {name}:main\n",
+    }
+    files[f"{dist_info}/RECORD"] = "".join(f"{file_name},,\n" for file_name in [*files, f"{dist_info}/RECORD"])
+
+    package_dir = index_dir / "simple" / name
+    package_dir.mkdir(parents=True)
+    with zipfile.ZipFile(package_dir / wheel_name, "w") as wheel:
+        for file_name, content in files.items():
+            wheel.writestr(file_name, content)
+    (package_dir / "index.html").write_text(f'<html><body><a href="{wheel_name}">{wheel_name}</a></body></html>\n')
+    (index_dir / "simple" / "index.html").write_text(f'<html><body><a href="{name}/">{name}</a></body></html>\n')
+    return (index_dir / "simple").as_uri()
+
+
+def create_project(project_dir: Path, cache_dir: Path) -> None:
+    project_dir.mkdir(parents=True)
+    (project_dir / "pyproject.toml").write_text('[tool.poetry]\nname = "benchmark"\nversion = "0.1.0"\n')
+    (project_dir / "bootstrap.json").write_text(
+        json.dumps(
+            {
+                "python_package_manager": f"{FAKE_PACKAGE_MANAGER}=={FAKE_PACKAGE_MANAGER_VERSION}",
+                "bootstrap_packages": [],
+                "bootstrap_cache_dir": str(cache_dir),
+            }
+        )
+    )
+
+
+def create_large_pyproject(sections: int) -> str:
+    lines = ['[tool.poetry]\nname = "large"\nversion = "0.1.0"\n\n[tool.poetry.dependencies]\npython = "^3.10"']
+    lines.extend(f'package-{index} = "^{index % 10}.{index % 7}"' for index in range(sections))
+    for index in range(sections):
+        lines.append(f'\n[tool.section-{index}]\nkey = "value {index}"\nlist = ["a", "b", "c"]')
+    lines.append('\n[[tool.poetry.source]]\nname = "internal"\nurl = "https://pypi.example.com/simple"\n')
+    return "\n".join(lines)
+
+
+def run_benchmarks(work_dir: Path, quick: bool) -> Dict[str, BenchmarkResult]:
+    results: Dict[str, BenchmarkResult] = {}
+    repeats = 3 if quick else 10
+
+    # Executor status checks over synthetic input sets
+    for count in EXECUTOR_INPUT_COUNTS:
+        inputs_dir = work_dir / f"inputs-{count}"
+        inputs_dir.mkdir()
+        inputs = []
+        for index in range(count):
+            input_file = inputs_dir / f"file-{index}.txt"
+            input_file.write_text(f"content {index}\n" * 10)
+            inputs.append(input_file)
+        runnable = _FilesRunnable(inputs)
+        executor = Executor(work_dir / f"cache-{count}")
+        executor.store_run_info(runnable)
+        results[f"executor_status_check_{count}_files"] = measure(lambda executor=executor, runnable=runnable: executor.previous_run_info_matches(runnable), repeats)
+
+    # TOML section parsing on large pyproject files
+    large_pyproject = create_large_pyproject(500 if quick else 5000)
+    results["toml_sections_large_pyproject"] = measure(lambda: PyPiSourceParser.get_toml_sections(large_pyproject), repeats)
+    # Bypasses the per-run cache of sources_from_toml_content, which would turn every repeat into a lookup
+    results["toml_sources_large_pyproject"] = measure(lambda: PyPiSourceParser._parse_source_entries(large_pyproject, "tool.poetry.source"), repeats)
+
+    # Bootstrap environment creation from a local package index
+    index_url = create_package_index(work_dir / "index")
+    os.environ["PIP_INDEX_URL"] = index_url
+    os.environ["PIP_DISABLE_PIP_VERSION_CHECK"] = "1"
+    cache_dir = work_dir / "bootstrap-cache"
+    project_dir = work_dir / "project"
+    create_project(project_dir, cache_dir)
+    config = BootstrapConfig.from_json_file(project_dir / "bootstrap.json")
+
+    def create_bootstrap_environment() -> None:
+        bootstrap_env = CreateBootstrapEnvironment(config, project_dir)
+        Executor(bootstrap_env.bootstrap_env_dir).execute(bootstrap_env)
+
+    results["bootstrap_environment_cold"] = measure(create_bootstrap_environment, 1)
+    results["bootstrap_environment_warm"] = measure(create_bootstrap_environment, repeats)
+
+    # No-op run of main(), every stage is up to date
+    with working_directory(project_dir):
+        if bootstrap.main([]) != 0:
+            raise RuntimeError("bootstrap.main() failed in the benchmark project")
+        results["noop_main"] = measure(lambda: bootstrap.main([]), repeats)
+
+    return results
+
+
+def compare_with_baseline(results: Dict[str, BenchmarkResult], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """Return a description of every benchmark which is slower than its baseline by more than the threshold."""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        baseline_median = baseline[name]["median_s"]
+        if result.median_s > baseline_median * (1 + threshold):
+            regressions.append(f"{name}: {result.median_s * 1000:.2f} ms > {baseline_median * 1000:.2f} ms baseline (+{threshold:.0%} allowed)")
+    return regressions
+
+
+def parse_arguments(args: Optional[List[str]] = None) -> Namespace:
+    parser = ArgumentParser(description="Offline benchmarks for bootstrap.py")
+    parser.add_argument("--output", type=Path, help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", type=Path, help="Baseline JSON file to compare the results with.")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown relative to the baseline (default: 0.25 = 25%%).")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the results to the baseline file instead of comparing.")
+    parser.add_argument("--quick", action="store_true", help="Fewer repeats and smaller inputs.")
+    return parser.parse_args(args)
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    arguments = parse_arguments(args)
+    logging.getLogger("bootstrap").setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = run_benchmarks(Path(work_dir), arguments.quick)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": {name: asdict(result) for name, result in results.items()},
+    }
+    for name, result in results.items():
+        print(f"{name:45} median {result.median_s * 1000:10.2f} ms   min {result.min_s * 1000:10.2f} ms   ({result.repeats}x)")
+    if arguments.output:
+        arguments.output.write_text(json.dumps(report, indent=4))
+
+    if arguments.baseline:
+        if arguments.update_baseline or not arguments.baseline.exists():
+            arguments.baseline.write_text(json.dumps(report, indent=4))
+            print(f"Baseline written to {arguments.baseline}")
+            return 0
+        regressions = compare_with_baseline(results, json.loads(arguments.baseline.read_text())["results"], arguments.threshold)
+        if regressions:
+            print("Performance regressions:\n" + "\n".join(regressions))
+            return 1
+        print(f"No regressions compared to {arguments.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
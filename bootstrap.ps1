@@ -3,6 +3,10 @@
     Wrapper for installing dependencies of a project
 #>
 
+# Version of the environment this script sets up. Increase it when a change requires the project
+# virtual environments to be recreated, other changes of the script do not trigger a reinstall.
+$BOOTSTRAP_SCHEMA_VERSION = 1
+
 # Load configuration from bootstrap.json or use default values
 function Get-BootstrapConfig {
     $bootstrapConfig = @{
@@ -114,8 +118,12 @@ function Install-PythonEnvironment {
             Remove-Path '.venv'
         }
         New-Directory '.venv'
-        $bootstrapPy = Join-Path $PSScriptRoot "bootstrap.py"
-        Invoke-CommandLine "$python $bootstrapPy"
+        # Import bootstrap.py as a module instead of running it as a script, so Python can reuse its cached bytecode.
+        # The bytecode is cached in the bootstrap cache directory instead of a __pycache__ directory in the project.
+        # Both directories are passed in the environment, so paths with quotes need no escaping.
+        $env:BOOTSTRAP_SCRIPT_DIR = $PSScriptRoot
+        $env:BOOTSTRAP_PYCACHE_DIR = Join-Path (Get-BootstrapCacheDir -cacheDir $config.bootstrap_cache_dir) "pycache"
+        Invoke-CommandLine "$python -c `"import os, sys; sys.path.insert(0, os.environ['BOOTSTRAP_SCRIPT_DIR']); sys.pycache_prefix = os.environ['BOOTSTRAP_PYCACHE_DIR']; import bootstrap; sys.exit(bootstrap.main())`""
     }
     else {
         Write-Output "No Python config file found, skipping Python setup."
@@ -144,6 +152,22 @@ function Install-Python {
     }
 }
 
+function Get-BootstrapCacheDir {
+    param (
+        [string]$cacheDir
+    )
+
+    # Resolve bootstrap_cache_dir like bootstrap.py does: the default is ~/.bootstrap and a leading ~ is the home directory
+    if (-Not $cacheDir) {
+        return Join-Path $HOME ".bootstrap"
+    }
+    if ($cacheDir -match '^~($|[\\/])') {
+        $cacheDir = $HOME + $cacheDir.Substring(1)
+    }
+    # Relative paths are relative to the project directory, the working directory of bootstrap.py
+    return $ExecutionContext.SessionState.Path.GetUnresolvedProviderPathFromPSPath($cacheDir)
+}
+
 function Get-PythonExecutableName {
     param (
         [string]$pythonVersion
@@ -1,21 +1,24 @@
-import configparser
-import ensurepip
 import hashlib
 import json
 import logging
 import os
 import re
-import shutil
-import subprocess  # nosec
+import stat
 import sys
-import venv
+import threading
+import time
 from abc import ABC, abstractmethod
+from contextlib import ExitStack, contextmanager
 from dataclasses import dataclass, field
 from enum import Enum
 from functools import total_ordering
 from pathlib import Path
-from typing import Any, List, Optional, Tuple
-from urllib.parse import urlparse
+from typing import IO, TYPE_CHECKING, Any, Callable, ClassVar, Dict, Iterator, List, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+    from argparse import ArgumentParser, Namespace
+    from collections import deque
+    from concurrent.futures import Future
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("bootstrap")
@@ -25,6 +28,85 @@ DEFAULT_PACKAGE_MANAGER = "poetry>=2.1.0"
 DEFAULT_BOOTSTRAP_PACKAGES = ["pip-system-certs>=4.0,<5.0"]
 BOOTSTRAP_COMPLETE_MARKER = ".bootstrap-complete"
 VENV_PYTHON_VERSION_MARKER = ".python_version"
+TRACE_FILE_ENV_VAR = "BOOTSTRAP_TRACE"
+LOG_FILE_ENV_VAR = "BOOTSTRAP_LOG_FILE"
+#: Version of the environments this script sets up. Increase it when a change requires the project
+#: virtual environments to be recreated, other changes of the script do not trigger a reinstall.
+BOOTSTRAP_SCHEMA_VERSION = 1
+
+
+class Tracer:
+    """Records spans of a bootstrap run as Chrome trace events.
+
+    The written JSON file can be opened in chrome://tracing or https://ui.perfetto.dev.
+    Recording is disabled until enabled, spans are then cheap no-ops.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.events: List[dict[str, Any]] = []
+        self._origin_ns = time.perf_counter_ns()
+        self._named_threads: set[int] = set()
+        self._lock = threading.Lock()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    @contextmanager
+    def span(self, name: str, **args: Any) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        start_ns = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end_ns = time.perf_counter_ns()
+            self._add_event(
+                {
+                    "name": name,
+                    "cat": "bootstrap",
+                    "ph": "X",
+                    "ts": (start_ns - self._origin_ns) / 1000,
+                    "dur": (end_ns - start_ns) / 1000,
+                    "args": {key: str(value) for key, value in args.items()},
+                }
+            )
+
+    def _add_event(self, event: dict[str, Any]) -> None:
+        thread = threading.current_thread()
+        event.update(pid=os.getpid(), tid=thread.ident)
+        with self._lock:
+            if thread.ident not in self._named_threads:
+                self._named_threads.add(thread.ident or 0)
+                self.events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": thread.ident, "args": {"name": thread.name}})
+            self.events.append(event)
+
+    def start_worker(self, origin_ns: int) -> None:
+        """Record the spans of a worker process, with an empty event list, on the timeline of the main process.
+        perf_counter is system-wide, so timestamps of different processes relative to the same origin line up."""
+        with self._lock:
+            self.enabled = True
+            self.events = []
+            self._named_threads = set()
+            self._origin_ns = origin_ns
+
+    def get_origin_ns(self) -> int:
+        return self._origin_ns
+
+    def merge(self, events: List[dict[str, Any]]) -> None:
+        """Add the events recorded by a worker process."""
+        with self._lock:
+            self.events.extend(events)
+
+    def write(self, trace_file: Path) -> None:
+        trace_file.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            trace_file.write_text(json.dumps({"traceEvents": self.events, "displayTimeUnit": "ms"}))
+        logger.info(f"Trace written to {trace_file}")
+
+
+tracer = Tracer()
 
 
 @dataclass
@@ -37,6 +119,24 @@ class BootstrapConfig:
     bootstrap_packages: List[str] = field(default_factory=lambda: list(DEFAULT_BOOTSTRAP_PACKAGES))
     bootstrap_cache_dir: Optional[Path] = None
     venv_install_command: Optional[str] = None
+    bootstrap_wheelhouse: bool = False
+    bootstrap_builder: str = "venv"
+    package_store: bool = False
+    command_timeout: Optional[float] = None
+    #: Keep one project virtual environment per Python version (.venv-3.12) and point .venv to the active one
+    venv_per_python_version: bool = False
+    #: How project inputs are fingerprinted: "file" hashes whole files, "semantic" only their dependency-relevant parts
+    input_fingerprint: str = "file"
+    #: Drift check of the project environment: "off", "stat" (dist-info listings and stats) or "records" (also verify the installed files)
+    venv_drift_check: str = "off"
+    #: Download the artifacts pinned in poetry.lock into Poetry's cache while the bootstrap environment is built
+    prefetch_dependencies: bool = False
+    #: Directory (e.g. a shared mount) keeping archives of project environments to restore instead of installing, see VenvSnapshotCache
+    venv_snapshot_dir: Optional[Path] = None
+    #: Budget of the bootstrap cache directory enforced by the automatic garbage collection, e.g. "10G"
+    bootstrap_cache_max_size: Optional[str] = None
+    #: Bootstrap environments unused for more days are removed by the automatic garbage collection
+    bootstrap_cache_max_age_days: Optional[float] = None
 
     @classmethod
     def from_json_file(cls, json_path: Path) -> "BootstrapConfig":
@@ -51,6 +151,7 @@ class BootstrapConfig:
 
         cache_dir_str = data.get("bootstrap_cache_dir")
         cache_dir = Path(cache_dir_str).expanduser() if cache_dir_str else None
+        snapshot_dir_str = data.get("venv_snapshot_dir")
 
         return cls(
             python_version=data.get("python_version", ""),
@@ -59,6 +160,17 @@ class BootstrapConfig:
             bootstrap_packages=bootstrap_packages,
             bootstrap_cache_dir=cache_dir,
             venv_install_command=data.get("venv_install_command"),
+            bootstrap_wheelhouse=data.get("bootstrap_wheelhouse", False),
+            bootstrap_builder=data.get("bootstrap_builder", "venv"),
+            package_store=data.get("package_store", False),
+            command_timeout=data.get("command_timeout"),
+            venv_per_python_version=data.get("venv_per_python_version", False),
+            input_fingerprint=data.get("input_fingerprint", "file"),
+            venv_drift_check=data.get("venv_drift_check", "off"),
+            prefetch_dependencies=data.get("prefetch_dependencies", False),
+            venv_snapshot_dir=Path(snapshot_dir_str).expanduser() if snapshot_dir_str else None,
+            bootstrap_cache_max_size=data.get("bootstrap_cache_max_size"),
+            bootstrap_cache_max_age_days=data.get("bootstrap_cache_max_age_days"),
         )
 
     def get_bootstrap_cache_dir(self) -> Path:
@@ -67,6 +179,23 @@ class BootstrapConfig:
             return self.bootstrap_cache_dir
         return Path.home() / ".bootstrap"
 
+    def get_wheelhouse_dir(self) -> Path:
+        """Return the directory keeping every wheel installed into a bootstrap environment."""
+        return self.get_bootstrap_cache_dir() / "wheelhouse"
+
+    def get_cache_budget(self) -> Tuple[Optional[int], Optional[float]]:
+        """Return the maximum size in bytes and the maximum age in seconds configured for the bootstrap cache."""
+        try:
+            max_size = parse_size(self.bootstrap_cache_max_size) if self.bootstrap_cache_max_size else None
+        except ValueError as exc:
+            raise UserNotificationException(f"Invalid bootstrap_cache_max_size in bootstrap.json: {exc}") from exc
+        max_age = self.bootstrap_cache_max_age_days * 24 * 60 * 60 if self.bootstrap_cache_max_age_days is not None else None
+        return max_size, max_age
+
+    def get_package_store_dir(self) -> Path:
+        """Return the content-addressed store of files installed into project virtual environments."""
+        return self.get_bootstrap_cache_dir() / PackageStore.STORE_DIR
+
     def compute_bootstrap_env_hash(self) -> str:
         """Compute a hash for the bootstrap environment based on configuration."""
         if self.python_version:
@@ -119,51 +248,106 @@ class TomlSection:
 
 
 class PyPiSourceParser:
+    #: Sources parsed during this run, keyed by the hash of the file content and the section name.
+    #: Both stages look up the project's package index, the file is parsed only once.
+    _sources_cache: ClassVar[Dict[Tuple[str, str], List[PyPiSource]]] = {}
+
     @staticmethod
     def from_pyproject(project_dir: Path) -> Optional[PyPiSource]:
+        sources = PyPiSourceParser.sources_from_pyproject(project_dir)
+        return sources[0] if sources else None
+
+    @staticmethod
+    def sources_from_pyproject(project_dir: Path) -> List[PyPiSource]:
+        """Return all package sources of pyproject.toml ([[tool.poetry.source]]) or, if there is none, of the Pipfile ([[source]])."""
         pyproject_toml = project_dir / "pyproject.toml"
         pipfile = project_dir / "Pipfile"
         if pyproject_toml.exists():
-            return PyPiSourceParser.from_toml_content(pyproject_toml.read_text(), "tool.poetry.source")
+            return PyPiSourceParser.sources_from_toml_content(pyproject_toml.read_text(encoding="utf-8"), "tool.poetry.source")
         elif pipfile.exists():
-            return PyPiSourceParser.from_toml_content(pipfile.read_text(), "source")
+            return PyPiSourceParser.sources_from_toml_content(pipfile.read_text(encoding="utf-8"), "source")
         else:
-            return None
+            return []
 
     @staticmethod
     def from_toml_content(content: str, source_section_name: str) -> Optional[PyPiSource]:
-        sections = PyPiSourceParser.get_toml_sections(content)
-        for section in sections:
+        sources = PyPiSourceParser.sources_from_toml_content(content, source_section_name)
+        return sources[0] if sources else None
+
+    @staticmethod
+    def sources_from_toml_content(content: str, source_section_name: str) -> List[PyPiSource]:
+        """Return every entry of the source table or array of tables, in the order of the file."""
+        key = (hashlib.sha256(content.encode("utf-8")).hexdigest(), source_section_name)
+        sources = PyPiSourceParser._sources_cache.get(key)
+        if sources is None:
+            entries = PyPiSourceParser._parse_source_entries(content, source_section_name)
+            sources = [PyPiSourceParser._to_pypi_source(entry, source_section_name) for entry in entries if not PyPiSourceParser._is_implicit_pypi(entry)]
+            PyPiSourceParser._sources_cache[key] = sources
+        return list(sources)
+
+    @staticmethod
+    def _parse_source_entries(content: str, source_section_name: str) -> List[Dict[str, Any]]:
+        if sys.version_info >= (3, 11):
+            import tomllib
+
+            try:
+                document: Any = tomllib.loads(content)
+            except tomllib.TOMLDecodeError:
+                # Keep the lenient behavior for files which are not valid TOML
+                return PyPiSourceParser._parse_source_sections(content, source_section_name)
+            for key in source_section_name.split("."):
+                document = document.get(key) if isinstance(document, dict) else None
+            if document is None:
+                return []
+            return document if isinstance(document, list) else [document]
+        return PyPiSourceParser._parse_source_sections(content, source_section_name)
+
+    @staticmethod
+    def _parse_source_sections(content: str, source_section_name: str) -> List[Dict[str, Any]]:
+        """Fallback without tomllib (Python < 3.11): read the key/value pairs of every matching section."""
+        import configparser
+
+        entries: List[Dict[str, Any]] = []
+        for section in PyPiSourceParser.get_toml_sections(content):
             if section.name == source_section_name:
-                try:
-                    parser = configparser.ConfigParser()
-                    parser.read_string(str(section))
-                    name = parser[section.name]["name"].strip('"')
-                    url = parser[section.name]["url"].strip('"')
-                    return PyPiSource(name, url)
-                except KeyError:
-                    raise UserNotificationException(
-                        f'Could not parse PyPi source from section {section.name}. Please make sure the section has the following format:\n[{source_section_name}]\nname = "name"\nurl = "https://url"\nverify_ssl = true'
-                    ) from None
-        return None
+                parser = configparser.ConfigParser()
+                parser.read_string(str(section))
+                entries.append({key: value.strip('"') for key, value in parser[section.name].items()})
+        return entries
 
     @staticmethod
-    def get_toml_sections(toml_content: str) -> List[TomlSection]:
-        # Use a regular expression to find all sections with [ or [[ at the beginning of the line
-        raw_sections = re.findall(r"^\[+.*\]+\n(?:[^[]*\n)*", toml_content, re.MULTILINE)
+    def _is_implicit_pypi(entry: Any) -> bool:
+        """Poetry accepts a source named PyPI without url (e.g. to make PyPI supplemental), it does not configure a custom index."""
+        return isinstance(entry, dict) and "url" not in entry and str(entry.get("name", "")).lower() == "pypi"
 
-        # Process each section
-        sections = []
-        for section in raw_sections:
-            # Split the lines, from the first line extract the section name
-            # and merge all the other lines into the content
-            lines = section.splitlines()
-            name_match = re.match(r"^\[+([^]]*)\]+", lines[0])
-            if name_match:
-                name = name_match.group(1).strip()
-                content = "\n".join(lines[1:]).strip()
-                sections.append(TomlSection(name, content))
+    @staticmethod
+    def _to_pypi_source(entry: Any, source_section_name: str) -> PyPiSource:
+        try:
+            return PyPiSource(entry["name"], entry["url"])
+        except (KeyError, TypeError):
+            raise UserNotificationException(
+                f'Could not parse PyPi source from section {source_section_name}. Please make sure the section has the following format:\n[{source_section_name}]\nname = "name"\nurl = "https://url"\nverify_ssl = true'
+            ) from None
 
+    @staticmethod
+    def get_toml_sections(toml_content: str) -> List[TomlSection]:
+        """Split TOML content into its [table] and [[array of tables]] sections in a single pass over the lines."""
+        sections = []
+        name: Optional[str] = None
+        content_lines: List[str] = []
+        for line in toml_content.splitlines():
+            if not line.startswith("["):
+                content_lines.append(line)
+                continue
+            if name is not None:
+                sections.append(TomlSection(name, "\n".join(content_lines).strip()))
+            # Header line: the name is everything between the opening and the first closing bracket
+            header = line.lstrip("[")
+            name_end = header.find("]")
+            name = header[:name_end].strip() if name_end >= 0 else None
+            content_lines = []
+        if name is not None:
+            sections.append(TomlSection(name, "\n".join(content_lines).strip()))
         return sections
 
 
@@ -188,16 +372,174 @@ class Runnable(ABC):
         """Get stage configuration for change detection."""
         return None
 
+    def get_dependencies(self) -> List["Runnable"]:
+        """Get the stages which must have finished before this stage can run."""
+        return []
+
+    def skip(self) -> None:
+        """Called instead of run() when the stage is up to date."""
+        return None
+
+    def get_state(self) -> Optional[Dict[str, Any]]:
+        """Get state to record in the run info, handed to update() on the next run. Not used for change detection."""
+        return None
+
+    def get_fingerprint_scheme(self) -> str:
+        """Get the name of the scheme get_fingerprints() uses. A changed scheme makes the stage run again."""
+        return "file"
+
+    def get_fingerprints(self) -> Dict[str, str]:
+        """Get fingerprints of inputs which are not hashed as whole files, by path (e.g. only the dependencies of pyproject.toml)."""
+        return {}
+
+    def get_drift(self) -> List[str]:
+        """Get changes of the outputs which the run info does not cover (e.g. packages installed by hand). Only checked if nothing else has changed."""
+        return []
+
+    def update(self, changes: List[str], previous_state: Dict[str, Any]) -> Optional[int]:
+        """Bring the outputs up to date with only the changed input files. Returns None if that is not possible and run() is needed."""
+        return None
+
 
 class RunInfoStatus(Enum):
-    MATCH = (False, "Nothing has changed, previous execution information matches.")
-    NO_INFO = (True, "No previous execution information found.")
-    FILE_CHANGED = (True, "Dependencies have been changed.")
-    CONFIG_CHANGED = (True, "Configuration has been changed.")
+    MATCH = (False, "Nothing has changed, previous execution information matches.", 0)
+    NO_INFO = (True, "No previous execution information found.", 2)
+    FILE_CHANGED = (True, "Dependencies have been changed.", 3)
+    CONFIG_CHANGED = (True, "Configuration has been changed.", 4)
+    ENVIRONMENT_DRIFT = (True, "The installed environment has been changed since it was created.", 5)
 
-    def __init__(self, should_run: bool, message: str) -> None:
+    def __init__(self, should_run: bool, message: str, check_exit_code: int) -> None:
         self.should_run = should_run
         self.message = message
+        #: Exit code of ``bootstrap.py --check`` (1 is reserved for errors)
+        self.check_exit_code = check_exit_code
+
+
+@dataclass
+class RunInfoCheck:
+    """Result of comparing a runnable with its previous run info."""
+
+    status: RunInfoStatus
+    #: Changed input/output paths (FILE_CHANGED), configuration keys (CONFIG_CHANGED) or drift of the outputs (ENVIRONMENT_DRIFT)
+    changes: List[str] = field(default_factory=list)
+    #: State recorded by the previous run (see Runnable.get_state)
+    previous_state: Optional[Dict[str, Any]] = None
+
+
+class DirectoryFingerprint:
+    """Merkle-style fingerprint of a directory tree.
+
+    Each directory is hashed over the sorted names, sizes and modification times of its entries
+    (in content mode, the hashes of the files' contents instead of modification times), with
+    subdirectories contributing their own fingerprint. The fingerprint of a missing directory is an empty string, like for files.
+
+    Subtree fingerprints are memoised for the lifetime of the instance, so nested or repeated
+    paths are walked only once per check. In content mode, file content hashes are kept in
+    ``content_hashes`` keyed by path and stat, so unchanged files are not read again across checks.
+
+    The entries of every walked directory are recorded in ``directories`` together with the directory's
+    modification time and inode, to be persisted in the run info. Handed back as ``previous_directories``,
+    the listing of a directory whose stat has not changed is reused instead of scanning it again: adding,
+    removing or replacing an entry changes the directory's modification time. A file rewritten in place
+    does not, so the files of a reused listing are still stat'ed for their current size and modification time.
+    Content mode always lists the directories.
+    """
+
+    def __init__(
+        self,
+        algorithm: str = "sha256",
+        include_content: bool = False,
+        content_hashes: Optional[Dict[Tuple[str, int, int, int], str]] = None,
+        previous_directories: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.algorithm = algorithm
+        self.include_content = include_content
+        self.content_hashes = content_hashes if content_hashes is not None else {}
+        self.previous_directories = previous_directories or {}
+        #: Directory path -> {"stat": [mtime_ns, inode], "entries": [...]}, see _list_entries
+        self.directories: Dict[str, Dict[str, Any]] = {}
+        self._subtrees: Dict[str, str] = {}
+
+    def get_hash(self, path: Path) -> str:
+        if not path.is_dir():
+            return ""
+        with tracer.span("hash directory", path=path):
+            return self._get_subtree_hash(os.fspath(path))
+
+    def _get_subtree_hash(self, path: str) -> str:
+        if path in self._subtrees:
+            return self._subtrees[path]
+        try:
+            directory_stat = os.stat(path)
+        except OSError:
+            return ""
+        directory_key = [directory_stat.st_mtime_ns, directory_stat.st_ino]
+        previous = self.previous_directories.get(path)
+        entries: Optional[List[str]] = None
+        if not self.include_content and isinstance(previous, dict) and previous.get("stat") == directory_key:
+            entries = self._restat_entries(path, previous["entries"])
+        if entries is None:
+            entries = self._list_entries(path)
+            if entries is None:
+                return ""
+        if not self.include_content:
+            self.directories[path] = {"stat": directory_key, "entries": entries}
+        digest = hashlib.new(self.algorithm)
+        for entry in entries:
+            if entry.startswith("D "):
+                name = entry[2:]
+                digest.update(f"D {name} {self._get_subtree_hash(os.path.join(path, name))}\n".encode())
+            else:
+                digest.update(f"{entry}\n".encode())
+        self._subtrees[path] = digest.hexdigest()
+        return self._subtrees[path]
+
+    def _list_entries(self, path: str) -> Optional[List[str]]:
+        """List the entries of a directory as they enter the fingerprint, sorted by name. Subdirectories are listed as "D <name>"."""
+        try:
+            with os.scandir(path) as iterator:
+                dir_entries = sorted(iterator, key=lambda entry: entry.name)
+        except OSError:
+            return None
+        entries = []
+        for entry in dir_entries:
+            try:
+                if entry.is_symlink():
+                    entries.append(f"L {entry.name} {os.readlink(entry.path)}")
+                elif entry.is_dir(follow_symlinks=False):
+                    entries.append(f"D {entry.name}")
+                else:
+                    entry_stat = entry.stat(follow_symlinks=False)
+                    # In content mode the content hash replaces the modification time
+                    version = self._get_content_hash(entry.path, entry_stat) if self.include_content else entry_stat.st_mtime_ns
+                    entries.append(f"F {entry.name} {entry_stat.st_size} {version}")
+            except OSError:
+                # Entry vanished while walking, leave it out of the fingerprint
+                continue
+        return entries
+
+    @staticmethod
+    def _restat_entries(path: str, previous_entries: Any) -> Optional[List[str]]:
+        """Update the sizes and modification times of the files of a previous listing. Returns None if the listing cannot be reused."""
+        if not isinstance(previous_entries, list):
+            return None
+        entries = []
+        for entry in previous_entries:
+            if entry.startswith("F "):
+                name = entry[2:].rsplit(" ", 2)[0]
+                try:
+                    entry_stat = os.lstat(os.path.join(path, name))
+                except OSError:
+                    return None
+                entry = f"F {name} {entry_stat.st_size} {entry_stat.st_mtime_ns}"
+            entries.append(entry)
+        return entries
+
+    def _get_content_hash(self, path: str, entry_stat: os.stat_result) -> str:
+        key = (path, entry_stat.st_size, entry_stat.st_mtime_ns, entry_stat.st_ino)
+        if key not in self.content_hashes:
+            self.content_hashes[key] = Executor.get_file_hash(Path(path), self.algorithm)
+        return self.content_hashes[key]
 
 
 class Executor:
@@ -208,115 +550,606 @@ class Executor:
     and if they match, it skips the execution."""
 
     RUN_INFO_FILE_EXTENSION = ".deps.json"
+    DEFAULT_HASH_ALGORITHM = "sha256"
+    HASH_CHUNK_SIZE = 1024 * 1024
 
-    def __init__(self, cache_dir: Path) -> None:
+    def __init__(
+        self,
+        cache_dir: Path,
+        hash_algorithm: str = DEFAULT_HASH_ALGORITHM,
+        max_workers: Optional[int] = None,
+        directory_content_hash: bool = False,
+    ) -> None:
+        # shake_* digests need an explicit length and are not usable as file fingerprints
+        if hash_algorithm not in hashlib.algorithms_available or hash_algorithm.startswith("shake_"):
+            raise UserNotificationException(f"Unsupported hash algorithm '{hash_algorithm}'. Use one of: {sorted(hashlib.algorithms_guaranteed)}")
         self.cache_dir = cache_dir
+        self.hash_algorithm = hash_algorithm
+        self.max_workers = max_workers
+        self.directory_content_hash = directory_content_hash
+        self._directory_content_hashes: Dict[Tuple[str, int, int, int], str] = {}
+        #: Status of the run info check of the last execute(), None before the first one
+        self.last_run_info_status: Optional[RunInfoStatus] = None
 
     @staticmethod
-    def get_file_hash(path: Path) -> str:
+    def get_file_hash(path: Path, algorithm: str = DEFAULT_HASH_ALGORITHM) -> str:
         """Get the hash of a file.
+        The file is read in fixed-size chunks, so large files are never loaded into memory at once.
         Returns an empty string if the file does not exist."""
         if path.is_file():
-            with open(path, "rb") as file:
-                bytes = file.read()
-                readable_hash = hashlib.sha256(bytes).hexdigest()
-                return readable_hash
+            with tracer.span("hash file", path=path), open(path, "rb") as file:
+                file_hash = hashlib.new(algorithm)
+                while chunk := file.read(Executor.HASH_CHUNK_SIZE):
+                    file_hash.update(chunk)
+                return file_hash.hexdigest()
         else:
             return ""
 
+    def get_file_hashes(self, paths: List[Path], algorithm: Optional[str] = None, fingerprint: Optional[DirectoryFingerprint] = None) -> Dict[Path, str]:
+        """Hash several files concurrently. hashlib releases the GIL while hashing, so threads scale with the number of files.
+        Directories are hashed with the given DirectoryFingerprint (by default a new one)."""
+        algorithm = algorithm or self.hash_algorithm
+        fingerprint = fingerprint or self.create_directory_fingerprint(algorithm)
+
+        def get_hash(path: Path) -> str:
+            return fingerprint.get_hash(path) if path.is_dir() else self.get_file_hash(path, algorithm)
+
+        # Missing paths and directories fingerprinted by stat are cheap, the worker pool only pays off when two or more paths have to be read
+        if sum(1 for path in paths if path.is_file() or (fingerprint.include_content and path.is_dir())) <= 1:
+            return {path: get_hash(path) for path in paths}
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return dict(zip(paths, pool.map(get_hash, paths)))
+
+    def create_directory_fingerprint(self, algorithm: str, previous_info: Optional[Dict[str, Any]] = None) -> DirectoryFingerprint:
+        """Create a DirectoryFingerprint reusing the directory entries recorded in the previous run info."""
+        previous_directories = previous_info.get("directories") if previous_info else None
+        return DirectoryFingerprint(algorithm, self.directory_content_hash, self._directory_content_hashes, previous_directories)
+
+    @staticmethod
+    def get_file_stat(path: Path) -> Optional[List[int]]:
+        """Get the (size, mtime_ns, inode) tuple of a regular file.
+        Returns None if the path does not exist or is not a regular file."""
+        try:
+            stat_result = path.stat()
+        except OSError:
+            return None
+        if not stat.S_ISREG(stat_result.st_mode):
+            return None
+        return [stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ino]
+
     def store_run_info(self, runnable: Runnable) -> None:
-        file_info = {
-            "inputs": {str(path): self.get_file_hash(path) for path in runnable.get_inputs()},
-            "outputs": {str(path): self.get_file_hash(path) for path in runnable.get_outputs()},
-            "config": runnable.get_config() or {},
-        }
+        paths = {"inputs": runnable.get_inputs(), "outputs": runnable.get_outputs()}
+        fingerprint = self.create_directory_fingerprint(self.hash_algorithm, self.get_run_info(runnable))
+        file_hashes = self.get_file_hashes(list(dict.fromkeys(path for file_paths in paths.values() for path in file_paths)), fingerprint=fingerprint)
+        file_info: dict[str, Any] = {file_type: {str(path): file_hashes[path] for path in file_paths} for file_type, file_paths in paths.items()}
+        file_info["stats"] = {str(path): file_stat for path in file_hashes if (file_stat := self.get_file_stat(path)) is not None}
+        file_info["hash_algorithm"] = self.hash_algorithm
+        file_info["config"] = runnable.get_config() or {}
+        file_info["fingerprint_scheme"] = runnable.get_fingerprint_scheme()
+        file_info["fingerprints"] = runnable.get_fingerprints()
+        file_info["directories"] = fingerprint.directories
+        if (state := runnable.get_state()) is not None:
+            file_info["state"] = state
 
         run_info_path = self.get_runnable_run_info_file(runnable)
         run_info_path.parent.mkdir(parents=True, exist_ok=True)
-        with run_info_path.open("w") as f:
+        # Write to a temporary file first, concurrent runs may read or write the same run info
+        tmp_run_info_path = run_info_path.with_name(f"{run_info_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with tmp_run_info_path.open("w") as f:
             # pretty print the json file
             json.dump(file_info, f, indent=4)
+        os.replace(tmp_run_info_path, run_info_path)
 
     def get_runnable_run_info_file(self, runnable: Runnable) -> Path:
         return self.cache_dir / f"{runnable.get_name()}{self.RUN_INFO_FILE_EXTENSION}"
 
-    def previous_run_info_matches(self, runnable: Runnable) -> RunInfoStatus:
+    def get_run_info(self, runnable: Runnable) -> Optional[Dict[str, Any]]:
+        """Return the run info stored by the previous execution, or None if there is none."""
         run_info_path = self.get_runnable_run_info_file(runnable)
         if not run_info_path.exists():
-            return RunInfoStatus.NO_INFO
-
+            return None
         with run_info_path.open() as f:
-            previous_info = json.load(f)
+            return json.load(f)
+
+    def previous_run_info_matches(self, runnable: Runnable) -> RunInfoStatus:
+        return self.check_run_info(runnable).status
+
+    def check_run_info(self, runnable: Runnable) -> RunInfoCheck:
+        """Compare the runnable with its previous run info. Only reads files, nothing is created or modified."""
+        previous_info = self.get_run_info(runnable)
+        if previous_info is None:
+            return RunInfoCheck(RunInfoStatus.NO_INFO)
 
         # Check if config has changed
         current_config = runnable.get_config() or {}
         previous_config = previous_info.get("config", {})
         if current_config != previous_config:
-            return RunInfoStatus.CONFIG_CHANGED
-
+            changed_keys = sorted(key for key in current_config.keys() | previous_config.keys() if current_config.get(key) != previous_config.get(key))
+            return RunInfoCheck(RunInfoStatus.CONFIG_CHANGED, changed_keys)
+        # Run info files written before fingerprint schemes were recorded hashed whole files
+        if previous_info.get("fingerprint_scheme", "file") != runnable.get_fingerprint_scheme():
+            return RunInfoCheck(RunInfoStatus.CONFIG_CHANGED, ["fingerprint_scheme"])
+
+        # Run info files written before stats were recorded have no "stats" entry and are always rehashed
+        previous_stats = previous_info.get("stats", {})
+        changed_candidates: Dict[Path, str] = {}
         for file_type in ["inputs", "outputs"]:
             for path_str, previous_hash in previous_info[file_type].items():
                 path = Path(path_str)
-                if self.get_file_hash(path) != previous_hash:
-                    return RunInfoStatus.FILE_CHANGED
-        return RunInfoStatus.MATCH
+                previous_stat = previous_stats.get(path_str)
+                if previous_stat is not None and self.get_file_stat(path) == previous_stat:
+                    # Same size, modification time and inode: skip reading the file
+                    continue
+                changed_candidates[path] = previous_hash
+
+        # Compare with the algorithm the previous run info was written with (older files have no entry and used sha256)
+        previous_algorithm = previous_info.get("hash_algorithm", self.DEFAULT_HASH_ALGORITHM)
+        current_hashes = self.get_file_hashes(list(changed_candidates), previous_algorithm, self.create_directory_fingerprint(previous_algorithm, previous_info))
+        changed_paths = [str(path) for path, previous_hash in changed_candidates.items() if current_hashes[path] != previous_hash]
+        previous_fingerprints = previous_info.get("fingerprints", {})
+        current_fingerprints = runnable.get_fingerprints()
+        changed_paths += sorted(path for path in current_fingerprints.keys() | previous_fingerprints.keys() if current_fingerprints.get(path) != previous_fingerprints.get(path))
+        if changed_paths:
+            return RunInfoCheck(RunInfoStatus.FILE_CHANGED, changed_paths, previous_info.get("state"))
+        with tracer.span("drift check"):
+            drift = runnable.get_drift()
+        if drift:
+            return RunInfoCheck(RunInfoStatus.ENVIRONMENT_DRIFT, drift, previous_info.get("state"))
+        return RunInfoCheck(RunInfoStatus.MATCH, previous_state=previous_info.get("state"))
 
     def execute(self, runnable: Runnable) -> int:
-        run_info_status = self.previous_run_info_matches(runnable)
-        if run_info_status.should_run:
-            logger.info(f"Executing '{runnable.get_name()}': {run_info_status.message}")
-            exit_code = runnable.run()
-            self.store_run_info(runnable)
-            return exit_code
-        logger.info(f"Skipping '{runnable.get_name()}': {run_info_status.message}")
+        with tracer.span(f"execute {runnable.get_name()}"):
+            with tracer.span("status check"):
+                run_info_check = self.check_run_info(runnable)
+                run_info_status = run_info_check.status
+            self.last_run_info_status = run_info_status
+            if run_info_status.should_run:
+                logger.info(f"Executing '{runnable.get_name()}': {run_info_status.message}")
+                exit_code = None
+                if run_info_status is RunInfoStatus.FILE_CHANGED and run_info_check.previous_state is not None:
+                    with tracer.span("update", changes=len(run_info_check.changes)):
+                        exit_code = runnable.update(run_info_check.changes, run_info_check.previous_state)
+                if exit_code is None:
+                    with tracer.span("run", reason=run_info_status.name):
+                        exit_code = runnable.run()
+                with tracer.span("store_run_info"):
+                    self.store_run_info(runnable)
+                return exit_code
+            logger.info(f"Skipping '{runnable.get_name()}': {run_info_status.message}")
+            runnable.skip()
 
         return 0
 
 
+class PackageStore:
+    """Content-addressed store of installed files, shared by all project virtual environments.
+
+    Every file is kept once in the store, keyed by the hash of its content (and executable bit).
+    Files in a virtual environment are replaced by hardlinks to the store object, so disk usage
+    scales with the number of unique files instead of the number of checkouts. The files are
+    deduplicated after the install, which saves disk space but does not make the install faster.
+    If a file cannot be hardlinked (e.g. the store is on another filesystem), the environment keeps
+    its own copy. An existing object is only linked after its content has been verified.
+
+    A write into a linked file would change every environment linking to it, so the objects are made
+    read-only on Unix (a hardlink shares the mode, the files in the environments are read-only too).
+    Package managers may rewrite installed files in place, so ``detach`` gives the environment private,
+    writable copies before its package manager runs. On Windows read-only files cannot be deleted,
+    there the objects stay writable and only ``detach`` protects them.
+
+    The stat of every linked file is recorded in an index inside the directory, so unchanged
+    files are not hashed again on the next run. Objects no environment links to any more are
+    removed by ``collect_garbage``.
+    """
+
+    #: Directory of the store in the bootstrap cache directory
+    STORE_DIR = "store"
+    INDEX_FILE = ".bootstrap-store.json"
+
+    def __init__(self, store_dir: Path, algorithm: str = Executor.DEFAULT_HASH_ALGORITHM) -> None:
+        self.store_dir = store_dir
+        self.objects_dir = store_dir / "objects"
+        self.algorithm = algorithm
+        self._verified_digests: Set[str] = set()
+
+    def get_object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / digest[2:]
+
+    def deduplicate(self, directory: Path, index_dir: Path) -> Tuple[int, int]:
+        """Replace all files below directory by hardlinks to store objects.
+        Returns the number of files linked and the number of files left as copies."""
+        index_file = index_dir / self.INDEX_FILE
+        try:
+            index: Dict[str, List[int]] = json.loads(index_file.read_text())
+        except (OSError, ValueError):
+            index = {}
+        new_index: Dict[str, List[int]] = {}
+        linked = copied = 0
+        for current_dir, _, file_names in os.walk(directory):
+            for file_name in file_names:
+                path = Path(current_dir) / file_name
+                file_stat = Executor.get_file_stat(path)
+                if file_stat is None:
+                    continue
+                if index.get(str(path)) == file_stat:
+                    new_index[str(path)] = file_stat
+                    linked += 1
+                elif self._link_to_store(path):
+                    new_index[str(path)] = Executor.get_file_stat(path) or []
+                    linked += 1
+                else:
+                    copied += 1
+        index_file.write_text(json.dumps(new_index))
+        return linked, copied
+
+    def get_digest(self, path: Path) -> str:
+        """Get the store key of a file: the hash of its content, marked if the file is executable."""
+        return Executor.get_file_hash(path, self.algorithm) + ("x" if os.access(path, os.X_OK) else "")
+
+    def _link_to_store(self, path: Path) -> bool:
+        digest = self.get_digest(path)
+        object_path = self.get_object_path(digest)
+        try:
+            if not (object_path.is_file() and os.path.samefile(path, object_path)):
+                object_path.parent.mkdir(parents=True, exist_ok=True)
+                if self._is_consistent(object_path, digest):
+                    self._replace_atomic(object_path, path)
+                else:
+                    # A missing or corrupted object is replaced by the file
+                    self._replace_atomic(path, object_path)
+            self._verified_digests.add(digest)
+            if not sys.platform.startswith("win32"):
+                object_path.chmod(stat.S_IMODE(object_path.stat().st_mode) & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+            return True
+        except OSError as exc:
+            logger.debug(f"Could not link {path} to the package store: {exc}")
+            return False
+
+    def _is_consistent(self, object_path: Path, digest: str) -> bool:
+        """Check that the content of an object matches its key. Every object is hashed at most once per instance."""
+        if digest in self._verified_digests:
+            return True
+        return object_path.is_file() and Executor.get_file_hash(object_path, self.algorithm) == digest.rstrip("x")
+
+    def detach(self, index_dir: Path) -> int:
+        """Replace the files linked by deduplicate() with private, writable copies, so that the package manager
+        can write into them without changing the store. Returns the number of copied files."""
+        index_file = index_dir / self.INDEX_FILE
+        try:
+            index: Dict[str, List[int]] = json.loads(index_file.read_text())
+        except (OSError, ValueError):
+            return 0
+        import shutil
+
+        copied = 0
+        for path_name in index:
+            path = Path(path_name)
+            try:
+                file_stat = path.stat()
+                if file_stat.st_nlink > 1:
+                    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+                    shutil.copy2(path, tmp_path)
+                    try:
+                        os.replace(tmp_path, path)
+                    except OSError:
+                        tmp_path.unlink()
+                        raise
+                    copied += 1
+                path.chmod(stat.S_IMODE(file_stat.st_mode) | stat.S_IWUSR)
+            except OSError as exc:
+                logger.debug(f"Could not detach {path} from the package store: {exc}")
+        # The copies have new inodes, deduplicate() has to hash them again anyway
+        index_file.unlink()
+        return copied
+
+    def collect_garbage(self) -> Tuple[int, int]:
+        """Remove the objects which are not linked into any environment any more (link count 1).
+        Returns the number of removed objects and their total size."""
+        removed = freed = 0
+        for current_dir, _, file_names in os.walk(self.objects_dir):
+            for file_name in file_names:
+                path = Path(current_dir) / file_name
+                try:
+                    object_stat = path.stat()
+                    if object_stat.st_nlink > 1:
+                        continue
+                    path.unlink()
+                except OSError as exc:
+                    logger.debug(f"Could not remove {path} from the package store: {exc}")
+                    continue
+                removed += 1
+                freed += object_stat.st_size
+        return removed, freed
+
+    @staticmethod
+    def _replace_atomic(source: Path, target: Path) -> None:
+        """Make target a hardlink to source, replacing target atomically."""
+        tmp_path = target.with_name(f"{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        os.link(source, tmp_path)
+        try:
+            os.replace(tmp_path, target)
+        except OSError:
+            tmp_path.unlink()
+            raise
+
+
+class Scheduler:
+    """Executes Runnables with their Executors.
+
+    The stages run one after the other in the calling thread, each after the stages it depends on.
+    Only stages without dependencies overlap: all but the first of them are started on worker threads
+    right away (the prefetch of the project dependencies while the bootstrap environment is built),
+    and a stage depending on them waits for them. In the default configuration the stages form a chain,
+    so no thread is created. No further stage is started once a stage failed."""
+
+    def __init__(self, max_workers: Optional[int] = None) -> None:
+        self.max_workers = max_workers
+        self.stages: Dict[Runnable, Executor] = {}
+
+    def add(self, runnable: Runnable, executor: Executor) -> None:
+        self.stages[runnable] = executor
+
+    def run(self) -> int:
+        """Run all stages. Returns the first non-zero exit code and re-raises the first exception of a failed stage.
+
+        If the run is interrupted (Ctrl+C), no further stage is started and the commands of the running stages are killed.
+        """
+        ordered = self._get_order()
+        background = [runnable for runnable in ordered if not runnable.get_dependencies()][1:]
+        futures: Dict[Runnable, Future[int]] = {}
+        results: List[Tuple[int, Optional[Exception]]] = []
+        pool = None
+        try:
+            if background:
+                from concurrent.futures import ThreadPoolExecutor
+
+                pool = ThreadPoolExecutor(max_workers=self.max_workers)
+                futures = {runnable: pool.submit(self.stages[runnable].execute, runnable) for runnable in background}
+            for runnable in ordered:
+                if runnable in futures:
+                    continue
+                for dependency in runnable.get_dependencies():
+                    if dependency in futures:
+                        results.append(self._wait(futures.pop(dependency)))
+                if any(exit_code or error for exit_code, error in results):
+                    break
+                try:
+                    results.append((self.stages[runnable].execute(runnable), None))
+                except Exception as exc:
+                    results.append((0, exc))
+            for future in futures.values():
+                results.append(self._wait(future))
+        except BaseException:
+            for future in futures.values():
+                future.cancel()
+            SubprocessExecutor.kill_running()
+            raise
+        finally:
+            if pool:
+                pool.shutdown(wait=True)
+        error = next((error for _, error in results if error), None)
+        if error:
+            raise error
+        return next((exit_code for exit_code, _ in results if exit_code), 0)
+
+    def _get_order(self) -> List[Runnable]:
+        """Order the stages so that every stage comes after its dependencies, otherwise keeping the order they were added in."""
+        for runnable in self.stages:
+            for dependency in runnable.get_dependencies():
+                if dependency not in self.stages:
+                    raise UserNotificationException(f"Stage '{runnable.get_name()}' depends on '{dependency.get_name()}' which is not scheduled.")
+        ordered: List[Runnable] = []
+        pending = list(self.stages)
+        while pending:
+            runnable = next((runnable for runnable in pending if all(dependency in ordered for dependency in runnable.get_dependencies())), None)
+            if runnable is None:
+                raise UserNotificationException(f"Stages have circular dependencies: {[runnable.get_name() for runnable in pending]}")
+            ordered.append(runnable)
+            pending.remove(runnable)
+        return ordered
+
+    @staticmethod
+    def _wait(future: "Future[int]") -> Tuple[int, Optional[Exception]]:
+        try:
+            return future.result(), None
+        except Exception as exc:
+            return 0, exc
+
+
 class UserNotificationException(Exception):
     pass
 
 
 class SubprocessExecutor:
+    """Run a command and fail with a UserNotificationException if it returns a non-zero exit code.
+
+    The arguments are passed to the process as they are (no shell, no splitting).
+    ``execute`` runs the command in the calling thread.
+
+    With ``capture_output``, the output of the command (stdout and stderr merged) is streamed line by line
+    to the logger while the command runs. Only the last ``MAX_OUTPUT_LINES`` lines are kept for the error report,
+    the full output can be appended to a log file (``log_file`` or, if not given, ``SubprocessExecutor.default_log_file``).
+
+    With a ``timeout``, the command runs in its own process group, which is killed as a whole if the command
+    does not finish in time. Without one, the command stays in the process group of the terminal and receives Ctrl+C itself.
+    The command is killed if the call running it is interrupted (KeyboardInterrupt),
+    commands running in other threads are killed with ``kill_running``.
+
+    ``env`` holds environment variables set for the command only, on top of the ones of the current process.
+    """
+
+    MAX_OUTPUT_LINES = 200
+    #: Longest line of output accepted from a command
+    MAX_LINE_LENGTH = 1024 * 1024
+    #: Log file used by all executors without an explicit one, set with ``bootstrap.py --log-file``
+    default_log_file: ClassVar[Optional[Path]] = None
+    #: Processes of all commands currently running, with whether they run in their own process group
+    _running_processes: ClassVar[Dict[int, bool]] = {}
+    _running_processes_lock: ClassVar[threading.Lock] = threading.Lock()
+
     def __init__(
         self,
         command: List[str | Path],
         cwd: Optional[Path] = None,
         capture_output: bool = True,
+        log_file: Optional[Path] = None,
+        timeout: Optional[float] = None,
+        env: Optional[Dict[str, str]] = None,
     ):
-        self.command = " ".join([str(cmd) for cmd in command])
+        self.args = [str(cmd) for cmd in command]
+        self.command = " ".join(self.args)
         self.current_working_directory = cwd
         self.capture_output = capture_output
+        self.log_file = log_file or SubprocessExecutor.default_log_file
+        self.timeout = timeout
+        self.env = env
 
     def execute(self) -> None:
-        result = None
-        try:
-            current_dir = (self.current_working_directory or Path.cwd()).as_posix()
-            logger.info(f"Running command: {self.command} in {current_dir}")
-            # print all virtual environment variables
-            logger.debug(json.dumps(dict(os.environ), indent=4))
-            result = subprocess.run(
-                self.command.split(),
+        import subprocess  # nosec
+        from collections import deque
+
+        current_dir = self._log_start()
+        output_tail: deque[str] = deque(maxlen=self.MAX_OUTPUT_LINES)
+        timed_out = threading.Event()
+        with tracer.span("subprocess", command=self.command, cwd=current_dir):
+            process = subprocess.Popen(  # nosec
+                self.args,
                 cwd=current_dir,
-                capture_output=self.capture_output,
-                text=True,  # to get stdout and stderr as strings instead of bytes
-            )  # nosec
-            result.check_returncode()
-        except subprocess.CalledProcessError as e:
-            raise UserNotificationException(f"Command '{self.command}' failed with:\n{result.stdout if result else ''}\n{result.stderr if result else e}") from e
+                env={**os.environ, **self.env} if self.env else None,
+                stdout=subprocess.PIPE if self.capture_output else None,
+                stderr=subprocess.STDOUT if self.capture_output else None,
+                **self._new_process_group_arguments(),
+            )
+            timer = None
+            if self.timeout is not None:
+                timer = threading.Timer(self.timeout, lambda: (timed_out.set(), self._kill(process.pid, True)))
+                timer.daemon = True
+                timer.start()
+            self._register(process.pid, self.timeout is not None)
+            try:
+                if process.stdout is not None:
+                    with ExitStack() as stack:
+                        log = self._open_log(stack, current_dir)
+                        encoding = self._get_output_encoding()
+                        while line_bytes := process.stdout.readline(self.MAX_LINE_LENGTH):
+                            self._handle_line(line_bytes, encoding, output_tail, log)
+                process.wait()
+            except BaseException:
+                self._kill(process.pid, self.timeout is not None)
+                process.wait()
+                raise
+            finally:
+                if timer:
+                    timer.cancel()
+                self._unregister(process.pid)
+                if process.stdout is not None:
+                    process.stdout.close()
+        if timed_out.is_set():
+            raise UserNotificationException(f"Command '{self.command}' timed out after {self.timeout} seconds:\n" + "\n".join(output_tail))
+        if process.returncode != 0:
+            raise UserNotificationException(f"Command '{self.command}' failed with exit code {process.returncode}:\n" + "\n".join(output_tail))
+
+    @classmethod
+    def kill_running(cls) -> None:
+        """Kill all commands still running, e.g. in worker threads after the main thread was interrupted."""
+        with cls._running_processes_lock:
+            running_processes = dict(cls._running_processes)
+        for pid, own_process_group in running_processes.items():
+            cls._kill(pid, own_process_group)
+
+    def _log_start(self) -> str:
+        current_dir = (self.current_working_directory or Path.cwd()).as_posix()
+        logger.info(f"Running command: {self.command} in {current_dir}")
+        # print all virtual environment variables
+        logger.debug(json.dumps(dict(os.environ), indent=4))
+        return current_dir
+
+    def _open_log(self, stack: ExitStack, current_dir: str) -> Optional[IO[str]]:
+        if not self.log_file:
+            return None
+        self.log_file.parent.mkdir(parents=True, exist_ok=True)
+        log = stack.enter_context(self.log_file.open("a", encoding="utf-8"))
+        log.write(f"$ {self.command} (in {current_dir})\n")
+        return log
+
+    @staticmethod
+    def _get_output_encoding() -> str:
+        import locale
+
+        return locale.getpreferredencoding(False)
+
+    @staticmethod
+    def _handle_line(line_bytes: bytes, encoding: str, output_tail: "deque[str]", log: Optional[IO[str]]) -> None:
+        line = line_bytes.decode(encoding, errors="replace").rstrip()
+        logger.info(line)
+        output_tail.append(line)
+        if log:
+            log.write(line + "\n")
+            log.flush()
+
+    def _new_process_group_arguments(self) -> Dict[str, Any]:
+        import subprocess  # nosec
+
+        if self.timeout is None:
+            return {}
+        if sys.platform.startswith("win32"):
+            return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+        return {"start_new_session": True}
+
+    @classmethod
+    def _register(cls, pid: int, own_process_group: bool) -> None:
+        with cls._running_processes_lock:
+            cls._running_processes[pid] = own_process_group
+
+    @classmethod
+    def _unregister(cls, pid: int) -> None:
+        with cls._running_processes_lock:
+            cls._running_processes.pop(pid, None)
+
+    @staticmethod
+    def _kill(pid: int, own_process_group: bool) -> None:
+        """Kill the process and, if it runs in its own process group, every process it started.
+        They may outlive the process itself and keep its output open."""
+        import subprocess  # nosec
+
+        if sys.platform.startswith("win32"):
+            # taskkill /T terminates the whole process tree
+            taskkill = Path(os.environ.get("SystemRoot", "C:\\Windows")) / "System32" / "taskkill.exe"
+            subprocess.run([taskkill, "/F", "/T", "/PID", str(pid)], capture_output=True)  # nosec
+        else:
+            import signal
+
+            try:
+                if own_process_group:
+                    os.killpg(pid, signal.SIGKILL)
+                else:
+                    os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
 
 
 class VirtualEnvironment(ABC):
     def __init__(self, venv_dir: Path) -> None:
         self.venv_dir = venv_dir
 
-    def create(self) -> None:
+    def create(self, template: Optional["VirtualEnvironmentTemplate"] = None) -> None:
         """
         Create a new virtual environment. This should configure the virtual environment such that
         subsequent calls to `pip` and `run` operate within this environment.
+
+        If a template is given, the environment is cloned from it instead of running ensurepip.
         """
+        import venv
+
         try:
-            venv.create(env_dir=self.venv_dir, with_pip=True)
+            if template:
+                with tracer.span("clone venv template", venv_dir=self.venv_dir):
+                    template.clone(self.venv_dir)
+            else:
+                with tracer.span("venv.create", venv_dir=self.venv_dir):
+                    venv.create(env_dir=self.venv_dir, with_pip=True)
             self.gitignore_configure()
         except PermissionError as e:
             if "python.exe" in str(e):
@@ -350,8 +1183,8 @@ class VirtualEnvironment(ABC):
             if not verify_ssl:
                 pip_ini_file.write("cert = false\n")
 
-    def pip(self, args: List[str]) -> None:
-        SubprocessExecutor([self.pip_path().as_posix(), *args]).execute()
+    def pip(self, args: List[str], timeout: Optional[float] = None) -> None:
+        SubprocessExecutor([self.pip_path().as_posix(), *args], timeout=timeout).execute()
 
     @abstractmethod
     def python_path(self) -> Path:
@@ -369,7 +1202,11 @@ class VirtualEnvironment(ABC):
     def scripts_path(self) -> Path:
         """Get the path to the Scripts (Windows) or bin (Unix) directory within the virtual environment."""
 
-    def run(self, args: List[str], capture_output: bool = True, cwd: Optional[Path] = None) -> None:
+    @abstractmethod
+    def lib_path(self) -> Path:
+        """Get the path to the Lib (Windows) or lib (Unix) directory containing the installed packages."""
+
+    def run(self, args: List[str], capture_output: bool = True, cwd: Optional[Path] = None, timeout: Optional[float] = None, env: Optional[Dict[str, str]] = None) -> None:
         """
         Run an arbitrary command within the virtual environment using the venv's Python.
 
@@ -381,12 +1218,14 @@ class VirtualEnvironment(ABC):
             args: Command-line arguments. For example, `run(['python', '-m', 'poetry', 'install'])`
             capture_output: Whether to capture stdout/stderr.
             cwd: Working directory for the command.
+            timeout: Seconds after which the command is killed, no limit if None.
+            env: Environment variables set for the command only.
 
         """
         command = list(args)
         if command and command[0] == "python":
             command[0] = self.python_path().as_posix()
-        SubprocessExecutor(command, cwd=cwd, capture_output=capture_output).execute()
+        SubprocessExecutor(command, cwd=cwd, capture_output=capture_output, timeout=timeout, env=env).execute()
 
 
 class WindowsVirtualEnvironment(VirtualEnvironment):
@@ -405,6 +1244,9 @@ class WindowsVirtualEnvironment(VirtualEnvironment):
     def scripts_path(self) -> Path:
         return self.venv_dir.joinpath("Scripts")
 
+    def lib_path(self) -> Path:
+        return self.venv_dir.joinpath("Lib")
+
 
 class UnixVirtualEnvironment(VirtualEnvironment):
     def __init__(self, venv_dir: Path) -> None:
@@ -422,6 +1264,9 @@ class UnixVirtualEnvironment(VirtualEnvironment):
     def scripts_path(self) -> Path:
         return self.venv_dir.joinpath("bin")
 
+    def lib_path(self) -> Path:
+        return self.venv_dir.joinpath("lib")
+
 
 def instantiate_os_specific_venv(venv_dir: Path) -> VirtualEnvironment:
     """Create an OS-specific VirtualEnvironment instance."""
@@ -433,6 +1278,621 @@ def instantiate_os_specific_venv(venv_dir: Path) -> VirtualEnvironment:
         raise UserNotificationException(f"Unsupported operating system: {sys.platform}")
 
 
+class FileLock:
+    """Advisory inter-process lock held on a lock file.
+
+    Uses fcntl.flock on Unix and msvcrt.locking on Windows. The lock is released when the
+    lock is released explicitly or when the owning process dies.
+    """
+
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, path: Path, timeout: Optional[float] = None) -> None:
+        self.path = path
+        self.timeout = timeout
+        self._file: Optional[IO[bytes]] = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Acquire the lock. Returns False if the lock is held elsewhere and it shall not or could not be waited for."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.path, "a+b")
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        waiting_logged = False
+        while not self._try_lock(lock_file):
+            if not blocking or (deadline is not None and time.monotonic() >= deadline):
+                lock_file.close()
+                return False
+            if not waiting_logged:
+                logger.info(f"Waiting for lock {self.path} held by another process")
+                waiting_logged = True
+            time.sleep(self.POLL_INTERVAL)
+        self._file = lock_file
+        return True
+
+    def release(self) -> None:
+        if self._file is None:
+            return
+        if sys.platform.startswith("win32"):
+            import msvcrt
+
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
+
+    @staticmethod
+    def _try_lock(lock_file: IO[bytes]) -> bool:
+        try:
+            if sys.platform.startswith("win32"):
+                import msvcrt
+
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        return True
+
+    def __enter__(self) -> "FileLock":
+        if not self.acquire():
+            raise UserNotificationException(f"Timed out waiting for lock {self.path}")
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.release()
+
+
+def relocate_virtual_environment(venv_dir: Path, target_venv_dir: Path, origin_venv_dir: Optional[Path] = None) -> None:
+    """Rewrite the absolute paths a virtual environment records about its own location.
+
+    Virtual environments are not relocatable: pyvenv.cfg, the activation scripts and the
+    shebangs of the entry point scripts (also those embedded in Windows .exe launchers)
+    contain the directory the environment was created in (``origin_venv_dir``, by default
+    its current location ``venv_dir``). This replaces them with ``target_venv_dir``.
+    """
+    origin_venv_dir = origin_venv_dir or venv_dir
+    # On Unix both spellings are the same, replacing twice would break targets containing the origin (.venv -> .venv-3.12)
+    replacements = dict.fromkeys(
+        [
+            (os.fsencode(str(origin_venv_dir)), os.fsencode(str(target_venv_dir))),
+            (os.fsencode(origin_venv_dir.as_posix()), os.fsencode(target_venv_dir.as_posix())),
+        ]
+    )
+    scripts_dir = instantiate_os_specific_venv(venv_dir).scripts_path()
+    candidates = [venv_dir / "pyvenv.cfg", *(scripts_dir.iterdir() if scripts_dir.is_dir() else [])]
+    for path in candidates:
+        if path.is_symlink() or not path.is_file():
+            continue
+        content = path.read_bytes()
+        relocated = content
+        for old, new in replacements:
+            relocated = relocated.replace(old, new)
+        if relocated != content:
+            path.write_bytes(relocated)
+
+
+def is_directory_link(path: Path) -> bool:
+    """Check whether the path is a symlink or (on Windows) a directory junction."""
+    try:
+        path_stat = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISLNK(path_stat.st_mode) or bool(getattr(path_stat, "st_file_attributes", 0) & getattr(stat, "FILE_ATTRIBUTE_REPARSE_POINT", 0))
+
+
+def replace_directory_link(link: Path, target: Path) -> None:
+    """Point ``link`` to the directory ``target``, replacing an existing link.
+
+    On Unix a relative symlink is created next to ``link`` and renamed over it, which is atomic.
+    On Windows a junction is used, which (unlike a symlink) needs no privileges. A directory
+    cannot be renamed over another one there, so the old junction is removed right before the rename.
+    """
+    tmp_link = link.with_name(f"{link.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    if sys.platform.startswith("win32"):
+        import _winapi
+
+        _winapi.CreateJunction(str(target.absolute()), str(tmp_link))
+        if is_directory_link(link):
+            os.rmdir(link)
+    else:
+        os.symlink(os.path.relpath(target, link.parent), tmp_link, target_is_directory=True)
+    os.replace(tmp_link, link)
+
+
+class VirtualEnvironmentTemplate:
+    """Virtual environment with pip already seeded, kept in the bootstrap cache once per base interpreter.
+
+    Creating a virtual environment with ``venv.create(..., with_pip=True)`` runs ensurepip in a
+    subprocess, which takes several seconds. Cloning the template instead only copies the files:
+    the site-packages are reflinked (copy-on-write) or hardlinked where the filesystem supports it,
+    the scripts and pyvenv.cfg are copied and relocated.
+    """
+
+    COMPLETE_MARKER = ".template-complete"
+    # FICLONE ioctl request number from linux/fs.h
+    LINUX_FICLONE = 0x40049409
+
+    def __init__(self, cache_dir: Path) -> None:
+        base_executable = getattr(sys, "_base_executable", sys.executable)
+        self.key = hashlib.sha256(f"{base_executable}|{sys.version}".encode()).hexdigest()[:12]
+        self.template_dir = cache_dir / "templates" / self.key
+        self.venv_dir = self.template_dir / ".venv"
+        self.marker_file = self.template_dir / self.COMPLETE_MARKER
+        self._reflink_supported = sys.platform.startswith("linux")
+        self._hardlink_supported = True
+
+    def is_valid(self) -> bool:
+        try:
+            return self.marker_file.read_text().strip() == self.key
+        except OSError:
+            return False
+
+    def ensure(self) -> None:
+        """Create the template if it does not exist yet."""
+        import shutil
+        import venv
+
+        if self.is_valid():
+            return
+        with FileLock(self.template_dir.with_name(f"{self.key}.lock")):
+            if self.is_valid():
+                return
+            staging_dir = self.template_dir.with_name(f"{self.key}.staging-{os.getpid()}")
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            try:
+                logger.info(f"Creating virtual environment template in {self.template_dir}")
+                staging_venv_dir = staging_dir / self.venv_dir.name
+                with tracer.span("venv.create", venv_dir=staging_venv_dir):
+                    venv.create(env_dir=staging_venv_dir, with_pip=True)
+                relocate_virtual_environment(staging_venv_dir, self.venv_dir)
+                (staging_dir / self.COMPLETE_MARKER).write_text(self.key)
+                shutil.rmtree(self.template_dir, ignore_errors=True)
+                staging_dir.rename(self.template_dir)
+            except Exception:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+                raise
+
+    def clone(self, venv_dir: Path) -> None:
+        """Create a virtual environment in venv_dir as a clone of the template."""
+        import shutil
+
+        self.ensure()
+        scripts_dir = instantiate_os_specific_venv(self.venv_dir).scripts_path()
+        for current_dir, dir_names, file_names in os.walk(self.venv_dir):
+            source_dir = Path(current_dir)
+            target_dir = venv_dir / source_dir.relative_to(self.venv_dir)
+            target_dir.mkdir(parents=True, exist_ok=True)
+            for name in [*dir_names, *file_names]:
+                source = source_dir / name
+                # os.walk does not descend into symlinked directories, they are recreated like symlinked files
+                if source.is_symlink():
+                    os.symlink(os.readlink(source), target_dir / name)
+                elif name in file_names:
+                    if source_dir == scripts_dir or source == self.venv_dir / "pyvenv.cfg":
+                        # Relocated below, must not share the data with the template
+                        shutil.copy2(source, target_dir / name)
+                    else:
+                        self._link_or_copy(source, target_dir / name)
+        relocate_virtual_environment(venv_dir, venv_dir, self.venv_dir)
+
+    def _link_or_copy(self, source: Path, target: Path) -> None:
+        import shutil
+
+        if self._reflink_supported:
+            if self._reflink(source, target):
+                return
+            self._reflink_supported = False
+        if self._hardlink_supported:
+            try:
+                os.link(source, target)
+                return
+            except OSError:
+                self._hardlink_supported = False
+        shutil.copy2(source, target)
+
+    def _reflink(self, source: Path, target: Path) -> bool:
+        import fcntl
+        import shutil
+
+        with open(source, "rb") as source_file, open(target, "wb") as target_file:
+            try:
+                fcntl.ioctl(target_file.fileno(), self.LINUX_FICLONE, source_file.fileno())
+            except OSError:
+                cloned = False
+            else:
+                cloned = True
+        if cloned:
+            shutil.copystat(source, target)
+        else:
+            target.unlink()
+        return cloned
+
+
+def parse_size(size: str) -> int:
+    """Parse a size in bytes, with an optional binary unit suffix: 500M, 10G, 1.5T."""
+    units = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)(?:i?B)?\s*", size, re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid size '{size}', expected e.g. 500M or 10G")
+    return int(float(match.group(1)) * units[match.group(2).upper()])
+
+
+def format_size(size: int) -> str:
+    value = float(size)
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if value < 1024:
+            return f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} TiB"
+
+
+def write_output(line: str) -> None:
+    """Write a line of a command report (--check, list, stats, snapshot) to stdout. Progress and errors go to the logger."""
+    sys.stdout.write(f"{line}\n")
+
+
+def get_directory_size(path: Path) -> int:
+    """Return the total size of the files in a directory tree, without following symlinks."""
+    size = 0
+    for current_dir, _, file_names in os.walk(path):
+        for file_name in file_names:
+            try:
+                size += os.lstat(os.path.join(current_dir, file_name)).st_size
+            except OSError:
+                pass
+    return size
+
+
+@dataclass
+class CachedEnvironment:
+    env_hash: str
+    path: Path
+    size: int
+    #: Time of the last use, in seconds since the epoch
+    last_used: float
+    #: Time of the creation, in seconds since the epoch
+    created: float = 0.0
+    python_version: str = ""
+    #: The package manager specification from bootstrap.json, e.g. "poetry>=2.0"
+    package_manager: str = ""
+    #: Normalized names and versions of the installed distributions
+    packages: Dict[str, str] = field(default_factory=dict)
+
+    def to_registry_entry(self) -> Dict[str, Any]:
+        return {
+            "python_version": self.python_version,
+            "package_manager": self.package_manager,
+            "packages": self.packages,
+            "size": self.size,
+            "created": self.created,
+            "last_used": self.last_used,
+        }
+
+    @classmethod
+    def from_registry_entry(cls, cache_dir: Path, env_hash: str, entry: Dict[str, Any]) -> "CachedEnvironment":
+        return cls(
+            env_hash=env_hash,
+            path=cache_dir / env_hash,
+            size=entry.get("size", 0),
+            last_used=entry.get("last_used", 0.0),
+            created=entry.get("created", 0.0),
+            python_version=entry.get("python_version", ""),
+            package_manager=entry.get("package_manager", ""),
+            packages=entry.get("packages", {}),
+        )
+
+    def get_package_manager_version(self) -> Optional[str]:
+        """Return the installed version of the package manager, if known."""
+        if not self.package_manager:
+            return None
+        return self.packages.get(normalize_distribution_name(extract_package_manager_name(self.package_manager)))
+
+
+def normalize_distribution_name(name: str) -> str:
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def get_site_packages_dirs(venv_dir: Path) -> List[Path]:
+    return [*venv_dir.glob("lib/python*/site-packages"), *venv_dir.glob("Lib/site-packages")]
+
+
+def get_installed_distributions(venv_dir: Path) -> Dict[str, str]:
+    """Return the names and versions of the distributions installed in a virtual environment, from their dist-info directories."""
+    distributions = {}
+    for dist_info in [path for site_packages_dir in get_site_packages_dirs(venv_dir) for path in site_packages_dir.glob("*.dist-info")]:
+        name, _, version = dist_info.name[: -len(".dist-info")].rpartition("-")
+        if name:
+            distributions[normalize_distribution_name(name)] = version
+    return dict(sorted(distributions.items()))
+
+
+def get_virtual_environment_python_version(venv_dir: Path) -> str:
+    """Return the Python version recorded in the pyvenv.cfg of a virtual environment."""
+    try:
+        lines = (venv_dir / "pyvenv.cfg").read_text().splitlines()
+    except OSError:
+        return ""
+    for line in lines:
+        key, _, value = line.partition("=")
+        if key.strip() in ("version", "version_info"):
+            return value.strip()
+    return ""
+
+
+class BootstrapCache:
+    """The bootstrap environments in the shared cache directory (``<cache dir>/<hash>/``).
+
+    The registry file ``registry.json`` indexes the environments: per hash the Python version, package manager,
+    installed distributions, size, creation and last use time. Listing, statistics and the garbage collection
+    read it instead of walking the environments. It is updated under the lock ``registry.lock`` and replaced atomically,
+    only when an environment is built and by the garbage collection, listing and statistics. These add environments
+    missing in the registry (e.g. created by an older bootstrap) and take over the last use times.
+
+    A run using an environment only touches its ``.last-used`` file, so the no-op run neither locks nor reads the registry.
+
+    A process using an environment holds a lease on it: an exclusively locked ``<hash>.use-<pid>.lock`` file.
+    The garbage collector evicts the least recently used environments, but never one with a held lease or
+    one which is being built (its build lock ``<hash>.lock`` is held). Leases are taken and checked under the
+    build lock, so an environment cannot be leased while it is being evicted.
+    Templates, the wheelhouse and the package store are not bootstrap environments and are never evicted.
+    """
+
+    ENV_HASH_PATTERN = re.compile(r"[0-9a-f]{12}")
+    REGISTRY_FILE = "registry.json"
+    REGISTRY_VERSION = 1
+    LAST_GC_FILE = ".last-gc"
+    #: Minimum time between two automatic garbage collections
+    GC_INTERVAL = 24 * 60 * 60
+    #: File in the environment directory whose modification time is the last use of the environment
+    LAST_USED_FILE = ".last-used"
+    #: The last use file is only touched if it is older, to avoid a write on every run
+    LAST_USED_RESOLUTION = 60 * 60
+
+    def __init__(self, cache_dir: Path) -> None:
+        self.cache_dir = cache_dir
+        self.registry_file = cache_dir / self.REGISTRY_FILE
+
+    def get_build_lock(self, env_hash: str) -> FileLock:
+        return FileLock(self.cache_dir / f"{env_hash}.lock")
+
+    @contextmanager
+    def use(self, env_hash: str) -> Iterator[None]:
+        """Hold a lease on the environment while using it, so it is not evicted. Records the time of use when done."""
+        lease = FileLock(self.cache_dir / f"{env_hash}.use-{os.getpid()}.lock")
+        with self.get_build_lock(env_hash):
+            lease.acquire()
+        try:
+            yield
+        finally:
+            try:
+                self.record_use(env_hash)
+            finally:
+                lease.release()
+                self._remove_lease_file(lease.path)
+
+    def is_in_use(self, env_hash: str) -> bool:
+        """Check whether any process holds a lease on the environment. Leases left over by dead processes are removed."""
+        in_use = False
+        for lease_file in self.cache_dir.glob(f"{env_hash}.use-*.lock"):
+            lease = FileLock(lease_file)
+            if lease.acquire(blocking=False):
+                lease.release()
+                self._remove_lease_file(lease_file)
+            else:
+                in_use = True
+        return in_use
+
+    @staticmethod
+    def _remove_lease_file(lease_file: Path) -> None:
+        try:
+            lease_file.unlink()
+        except OSError:
+            # Already removed, or (on Windows) opened by another process
+            pass
+
+    def read_registry(self) -> Dict[str, CachedEnvironment]:
+        """Return the registered environments by hash. A missing or unreadable registry is empty."""
+        try:
+            with self.registry_file.open() as file_handle:
+                data = json.load(file_handle)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get("version") != self.REGISTRY_VERSION:
+            return {}
+        return {env_hash: CachedEnvironment.from_registry_entry(self.cache_dir, env_hash, entry) for env_hash, entry in data.get("environments", {}).items()}
+
+    def _update_registry(self, update: Callable[[Dict[str, CachedEnvironment]], bool]) -> Dict[str, CachedEnvironment]:
+        """Apply ``update`` to the registry under the registry lock. The registry is written if ``update`` returns True."""
+        with FileLock(self.cache_dir / "registry.lock"):
+            environments = self.read_registry()
+            if update(environments):
+                data = {
+                    "version": self.REGISTRY_VERSION,
+                    "environments": {env_hash: environments[env_hash].to_registry_entry() for env_hash in sorted(environments)},
+                }
+                tmp_registry_file = self.registry_file.with_name(f"{self.registry_file.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+                with tmp_registry_file.open("w") as file_handle:
+                    json.dump(data, file_handle, indent=4)
+                os.replace(tmp_registry_file, self.registry_file)
+        return environments
+
+    def register(self, env_hash: str, package_manager: str) -> CachedEnvironment:
+        """Add a newly built environment to the registry, replacing an entry of a previous environment with the same hash."""
+        environment = self._describe(env_hash, package_manager)
+        environment.created = environment.last_used = time.time()
+
+        def add(environments: Dict[str, CachedEnvironment]) -> bool:
+            environments[env_hash] = environment
+            return True
+
+        self._update_registry(add)
+        return environment
+
+    def record_use(self, env_hash: str) -> None:
+        """Update the last use time of the environment by touching its last use file. The registry is updated from it by sync_registry()."""
+        last_used_file = self.cache_dir / env_hash / self.LAST_USED_FILE
+        try:
+            if time.time() - last_used_file.stat().st_mtime < self.LAST_USED_RESOLUTION:
+                return
+        except OSError:
+            if not last_used_file.parent.is_dir():
+                return
+        try:
+            last_used_file.touch()
+        except OSError as exc:
+            logger.debug(f"Could not record the use of bootstrap environment {env_hash}: {exc}")
+
+    def sync_registry(self) -> Dict[str, CachedEnvironment]:
+        """Add the environments missing in the registry, remove the entries of environments which no longer exist
+        and take over the last use times recorded by record_use(). Only lists the cache directory and stats the last use files,
+        registered environments are not walked."""
+        if not self.cache_dir.is_dir():
+            return {}
+        env_hashes = {path.name for path in self.cache_dir.iterdir() if self.ENV_HASH_PATTERN.fullmatch(path.name) and path.is_dir()}
+
+        def reconcile(environments: Dict[str, CachedEnvironment]) -> bool:
+            removed = environments.keys() - env_hashes
+            added = env_hashes - environments.keys()
+            for env_hash in removed:
+                del environments[env_hash]
+            for env_hash in added:
+                environments[env_hash] = self._describe(env_hash)
+            used = [env_hash for env_hash in env_hashes - added if self.get_last_used(self.cache_dir / env_hash) > environments[env_hash].last_used]
+            for env_hash in used:
+                environments[env_hash].last_used = self.get_last_used(self.cache_dir / env_hash)
+            return bool(removed or added or used) or not self.registry_file.exists()
+
+        return self._update_registry(reconcile)
+
+    def _describe(self, env_hash: str, package_manager: str = "") -> CachedEnvironment:
+        """Collect the registry entry of an environment from its directory."""
+        env_dir = self.cache_dir / env_hash
+        venv_dir = env_dir / ".venv"
+        return CachedEnvironment(
+            env_hash=env_hash,
+            path=env_dir,
+            size=get_directory_size(env_dir),
+            last_used=self.get_last_used(env_dir),
+            created=self.get_created(env_dir),
+            python_version=get_virtual_environment_python_version(venv_dir),
+            package_manager=package_manager,
+            packages=get_installed_distributions(venv_dir),
+        )
+
+    @classmethod
+    def get_last_used(cls, env_dir: Path) -> float:
+        """Return the time the environment was last used: the time of its last use file or, for environments
+        of an older bootstrap, the time of its creation as the best guess."""
+        try:
+            return (env_dir / cls.LAST_USED_FILE).stat().st_mtime
+        except OSError:
+            return cls.get_created(env_dir)
+
+    @staticmethod
+    def get_created(env_dir: Path) -> float:
+        for path in [env_dir / BOOTSTRAP_COMPLETE_MARKER, env_dir]:
+            try:
+                return path.stat().st_mtime
+            except OSError:
+                continue
+        return 0.0
+
+    def get_environment(self, env_hash: str) -> Optional[CachedEnvironment]:
+        return self.read_registry().get(env_hash)
+
+    def get_environments(self) -> List[CachedEnvironment]:
+        """Return the environments in the registry, synchronized with the cache directory first."""
+        environments = self.sync_registry()
+        return [environments[env_hash] for env_hash in sorted(environments)]
+
+    def collect_garbage(self, max_size: Optional[int] = None, max_age: Optional[float] = None) -> List[CachedEnvironment]:
+        """Evict the least recently used environments until the cache holds at most ``max_size`` bytes
+        and no environment has been unused for more than ``max_age`` seconds. Returns the evicted environments."""
+        self._remove_leftovers()
+        environments = sorted(self.sync_registry().values(), key=lambda environment: environment.last_used)
+        total_size = sum(environment.size for environment in environments)
+        now = time.time()
+        evicted = []
+        for environment in environments:
+            too_old = max_age is not None and now - environment.last_used > max_age
+            too_big = max_size is not None and total_size > max_size
+            if (too_old or too_big) and self._evict(environment):
+                evicted.append(environment)
+                total_size -= environment.size
+        self._collect_package_store_garbage()
+        return evicted
+
+    def _collect_package_store_garbage(self) -> None:
+        store = PackageStore(self.cache_dir / PackageStore.STORE_DIR)
+        if not store.objects_dir.is_dir():
+            return
+        removed, freed = store.collect_garbage()
+        if removed:
+            logger.info(f"Removed {removed} unused files from the package store {store.store_dir} ({format_size(freed)})")
+
+    def collect_garbage_if_due(self, max_size: Optional[int] = None, max_age: Optional[float] = None) -> List[CachedEnvironment]:
+        """Run collect_garbage() unless it already ran within GC_INTERVAL."""
+        last_gc_file = self.cache_dir / self.LAST_GC_FILE
+        try:
+            if time.time() - last_gc_file.stat().st_mtime < self.GC_INTERVAL:
+                return []
+        except OSError:
+            pass
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        last_gc_file.touch()
+        return self.collect_garbage(max_size, max_age)
+
+    def _evict(self, environment: CachedEnvironment) -> bool:
+        import shutil
+
+        build_lock = self.get_build_lock(environment.env_hash)
+        if not build_lock.acquire(blocking=False):
+            return False
+        try:
+            if self.is_in_use(environment.env_hash):
+                return False
+            trash_dir = environment.path.with_name(f"{environment.env_hash}.trash-{os.getpid()}")
+            try:
+                environment.path.rename(trash_dir)
+            except OSError as exc:
+                # e.g. a file of the environment is opened on Windows
+                logger.warning(f"Could not remove bootstrap environment {environment.path}: {exc}")
+                return False
+            self._update_registry(lambda environments: environments.pop(environment.env_hash, None) is not None)
+        finally:
+            build_lock.release()
+        shutil.rmtree(trash_dir, ignore_errors=True)
+        logger.info(f"Removed bootstrap environment {environment.path} ({format_size(environment.size)}, last used {time.ctime(environment.last_used)})")
+        return True
+
+    def _remove_leftovers(self) -> None:
+        """Remove staging and trash directories of aborted runs, and leases of dead processes."""
+        import shutil
+
+        if not self.cache_dir.is_dir():
+            return
+        for path in self.cache_dir.iterdir():
+            env_hash, _, suffix = path.name.partition(".")
+            if not self.ENV_HASH_PATTERN.fullmatch(env_hash):
+                continue
+            if suffix.startswith(("staging-", "trash-")):
+                build_lock = self.get_build_lock(env_hash)
+                if build_lock.acquire(blocking=False):
+                    try:
+                        shutil.rmtree(path, ignore_errors=True)
+                    finally:
+                        build_lock.release()
+            elif suffix.startswith("use-"):
+                self.is_in_use(env_hash)
+
+
 def extract_package_manager_name(package_manager_spec: str) -> str:
     """Extract the package manager name from a specification like 'poetry>=1.7.1'."""
     match = re.match(r"^([a-zA-Z0-9_-]+)", package_manager_spec)
@@ -482,60 +1942,155 @@ class CreateBootstrapEnvironment(Runnable):
         return True
 
     def _create_environment_atomic(self) -> None:
-        """Create the bootstrap environment, replacing any existing invalid environment."""
-        try:
-            # Remove existing directory if present (invalid or leftover from failed attempt)
-            if self.bootstrap_env_dir.exists():
-                logger.info(f"Removing existing bootstrap environment at {self.bootstrap_env_dir}")
-                shutil.rmtree(self.bootstrap_env_dir)
-
-            # Create bootstrap environment directory
-            self.bootstrap_env_dir.mkdir(parents=True, exist_ok=True)
-            bootstrap_venv = instantiate_os_specific_venv(self.venv_dir)
-
-            logger.info(f"Creating bootstrap environment in {self.bootstrap_env_dir}")
-            venv.create(env_dir=self.venv_dir, with_pip=True)
+        """Create the bootstrap environment in a staging directory and publish it with an atomic rename.
 
-            # Configure pip with PyPI source if available
-            pypi_source = PyPiSourceParser.from_pyproject(self.project_dir)
-            if pypi_source:
-                bootstrap_venv.pip_configure(index_url=pypi_source.url, verify_ssl=True)
-
-            # Build pip install arguments
-            packages_to_install = [self.config.package_manager, *self.config.bootstrap_packages]
-            pip_args = ["install", *packages_to_install]
+        The build runs under an exclusive lock per environment hash. Concurrent callers wait for the lock
+        and reuse the environment if another process has published it in the meantime.
+        """
+        import shutil
+
+        cache_dir = self.bootstrap_env_dir.parent
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        cache = BootstrapCache(cache_dir)
+        with cache.get_build_lock(self.env_hash):
+            if self._is_valid_environment():
+                logger.info(f"Reusing bootstrap environment at {self.bootstrap_env_dir} created by another process")
+                return
+
+            # Only the lock holder builds, so any staging directory left over is from an aborted run
+            for leftover_dir in cache_dir.glob(f"{self.env_hash}.staging-*"):
+                shutil.rmtree(leftover_dir, ignore_errors=True)
+
+            uv_executable = self._find_uv_executable() if self.config.bootstrap_builder == "uv" else None
+            # uv's Windows launchers embed the interpreter path in a binary format which cannot be relocated
+            build_in_place = uv_executable is not None and sys.platform.startswith("win32")
+            build_dir = self.bootstrap_env_dir if build_in_place else cache_dir / f"{self.env_hash}.staging-{os.getpid()}"
+            try:
+                if build_in_place:
+                    self._remove_environment()
+                self._build_environment(build_dir, uv_executable)
+                if not build_in_place:
+                    self._publish_environment(build_dir)
+                cache.register(self.env_hash, self.config.package_manager)
+                logger.info(f"Bootstrap environment created successfully at {self.bootstrap_env_dir}")
+            except Exception as exc:
+                logger.error(f"Bootstrap environment creation failed at {self.bootstrap_env_dir}")
+                shutil.rmtree(build_dir, ignore_errors=True)
+                raise UserNotificationException(f"Failed to create bootstrap environment: {exc}") from exc
+
+    def _find_uv_executable(self) -> Optional[Path]:
+        """Find a uv executable on the PATH or in the bin directory of the bootstrap cache."""
+        import shutil
+
+        uv_name = "uv.exe" if sys.platform.startswith("win32") else "uv"
+        uv_path = shutil.which("uv")
+        if uv_path:
+            return Path(uv_path)
+        cached_uv_path = self.config.get_bootstrap_cache_dir() / "bin" / uv_name
+        if cached_uv_path.is_file():
+            return cached_uv_path
+        logger.info("No uv executable found, building the bootstrap environment with venv and pip.")
+        return None
 
-            # Handle SSL certificates for older pip versions
-            if Version(ensurepip.version()) < Version("24.2"):
-                if pypi_source and (hostname := urlparse(pypi_source.url).hostname):
-                    pip_args.extend(["--trusted-host", hostname])
-                else:
-                    pip_args.extend(
-                        [
-                            "--trusted-host",
-                            "pypi.org",
-                            "--trusted-host",
-                            "pypi.python.org",
-                            "--trusted-host",
-                            "files.pythonhosted.org",
-                        ]
-                    )
+    def _build_environment(self, env_dir: Path, uv_executable: Optional[Path] = None) -> None:
+        """Build a complete bootstrap environment, including its completion marker, in the given directory.
+        If a uv executable is given, it is used to create the environment and install the packages."""
+        env_dir.mkdir(parents=True, exist_ok=True)
+        venv_dir = env_dir / self.venv_dir.name
+        bootstrap_venv = instantiate_os_specific_venv(venv_dir)
+
+        logger.info(f"Creating bootstrap environment in {env_dir}")
+        if uv_executable:
+            # --seed installs pip, which is expected in every bootstrap environment
+            SubprocessExecutor([uv_executable, "venv", "--seed", "--python", sys.executable, venv_dir]).execute()
+            bootstrap_venv.gitignore_configure()
+        else:
+            bootstrap_venv.create(VirtualEnvironmentTemplate(self.config.get_bootstrap_cache_dir()))
+
+        # Configure pip with PyPI source if available
+        pypi_source = PyPiSourceParser.from_pyproject(self.project_dir)
+        if pypi_source:
+            bootstrap_venv.pip_configure(index_url=pypi_source.url, verify_ssl=True)
+
+        packages_to_install = [self.config.package_manager, *self.config.bootstrap_packages]
+        logger.info(f"Installing bootstrap packages: {packages_to_install}")
+        if uv_executable:
+            index_args = ["--index-url", pypi_source.url] if pypi_source else []
+            SubprocessExecutor([uv_executable, "pip", "install", "--python", bootstrap_venv.python_path(), *index_args, *packages_to_install], timeout=self.config.command_timeout).execute()
+        elif self.config.bootstrap_wheelhouse:
+            self._install_from_wheelhouse(bootstrap_venv, packages_to_install, self._get_index_arguments(pypi_source))
+        else:
+            bootstrap_venv.pip(["install", *packages_to_install, *self._get_index_arguments(pypi_source)], timeout=self.config.command_timeout)
 
-            logger.info(f"Installing bootstrap packages: {packages_to_install}")
-            bootstrap_venv.pip(pip_args)
+        # Scripts and pyvenv.cfg refer to the staging location, point them to the final location
+        relocate_virtual_environment(venv_dir, self.venv_dir)
 
-            # Write the completion marker
-            marker_path = self.bootstrap_env_dir / BOOTSTRAP_COMPLETE_MARKER
-            marker_path.write_text(self.env_hash)
+        # Write the completion marker
+        (env_dir / BOOTSTRAP_COMPLETE_MARKER).write_text(self.env_hash)
 
-            # Update the virtual_env reference
-            self.virtual_env = instantiate_os_specific_venv(self.venv_dir)
+    @staticmethod
+    def _get_index_arguments(pypi_source: Optional[PyPiSource]) -> List[str]:
+        """Return the pip arguments needed to access the package index."""
+        import ensurepip
+        from urllib.parse import urlparse
+
+        # Handle SSL certificates for older pip versions
+        if Version(ensurepip.version()) < Version("24.2"):
+            if pypi_source and (hostname := urlparse(pypi_source.url).hostname):
+                return ["--trusted-host", hostname]
+            return [
+                "--trusted-host",
+                "pypi.org",
+                "--trusted-host",
+                "pypi.python.org",
+                "--trusted-host",
+                "files.pythonhosted.org",
+            ]
+        return []
 
-            logger.info(f"Bootstrap environment created successfully at {self.bootstrap_env_dir}")
+    def _install_from_wheelhouse(self, bootstrap_venv: VirtualEnvironment, packages: List[str], index_args: List[str]) -> None:
+        """Install the packages from the local wheelhouse without accessing the package index.
 
-        except Exception as exc:
-            logger.error(f"Bootstrap environment creation failed at {self.bootstrap_env_dir}")
-            raise UserNotificationException(f"Failed to create bootstrap environment: {exc}") from exc
+        Only if the wheelhouse cannot satisfy the requirements, the missing wheels are downloaded
+        (or built) into the wheelhouse first, so later environments can be created offline.
+        """
+        wheelhouse_dir = self.config.get_wheelhouse_dir()
+        offline_args = ["install", "--no-index", "--find-links", wheelhouse_dir.as_posix(), *packages]
+        if wheelhouse_dir.is_dir():
+            try:
+                bootstrap_venv.pip(offline_args, timeout=self.config.command_timeout)
+                return
+            except UserNotificationException:
+                logger.info(f"Wheelhouse {wheelhouse_dir} cannot satisfy {packages}, fetching missing wheels from the package index")
+
+        with FileLock(wheelhouse_dir.with_name(f"{wheelhouse_dir.name}.lock")):
+            bootstrap_venv.pip(["wheel", "--wheel-dir", wheelhouse_dir.as_posix(), "--find-links", wheelhouse_dir.as_posix(), *packages, *index_args], timeout=self.config.command_timeout)
+        bootstrap_venv.pip(offline_args, timeout=self.config.command_timeout)
+
+    def _publish_environment(self, staging_dir: Path) -> None:
+        """Atomically move the staged environment to its final location, replacing an invalid one."""
+        import shutil
+
+        trash_dir = self._move_environment_aside()
+        staging_dir.rename(self.bootstrap_env_dir)
+        if trash_dir:
+            shutil.rmtree(trash_dir, ignore_errors=True)
+
+    def _remove_environment(self) -> None:
+        import shutil
+
+        trash_dir = self._move_environment_aside()
+        if trash_dir:
+            shutil.rmtree(trash_dir, ignore_errors=True)
+
+    def _move_environment_aside(self) -> Optional[Path]:
+        """Rename an existing (invalid) environment out of the way. Returns its new location."""
+        if not self.bootstrap_env_dir.exists():
+            return None
+        logger.info(f"Replacing invalid bootstrap environment at {self.bootstrap_env_dir}")
+        trash_dir = self.bootstrap_env_dir.with_name(f"{self.env_hash}.trash-{os.getpid()}")
+        self.bootstrap_env_dir.rename(trash_dir)
+        return trash_dir
 
     def get_name(self) -> str:
         return "create-bootstrap-environment"
@@ -556,20 +2111,695 @@ class CreateBootstrapEnvironment(Runnable):
         }
 
 
+PYPI_INDEX_URL = "https://pypi.org/simple"
+
+
+@dataclass
+class LockedPackage:
+    name: str
+    version: str
+    #: Index the pinned version is installed from, None if it does not come from an index (git, path, url, the project itself)
+    index_url: Optional[str]
+    #: Only installed under some condition (environment markers, extras)
+    conditional: bool = False
+    #: Installed by a default install of the lock, independent of the dependency graph (Pipfile.lock "default" section)
+    required: bool = False
+    #: Names of the packages this one always depends on
+    dependencies: List[str] = field(default_factory=list)
+    #: Names of the packages this one depends on under some condition
+    conditional_dependencies: List[str] = field(default_factory=list)
+    #: Hashes of the artifacts of the pinned version by file name, e.g. "sha256:<hex digest>" (poetry.lock only)
+    files: Dict[str, str] = field(default_factory=dict)
+
+
+class LockFileParser:
+    """Read the pinned packages of poetry.lock, uv.lock and Pipfile.lock, with normalized names."""
+
+    @staticmethod
+    def parse(lock_file: Path) -> Optional[Dict[str, LockedPackage]]:
+        """Return the locked packages by name, or None if the lock file is missing or cannot be read."""
+        try:
+            content = lock_file.read_text(encoding="utf-8")
+            if lock_file.name == "Pipfile.lock":
+                return LockFileParser._parse_pipfile_lock(json.loads(content))
+            # The TOML lock files are only read with tomllib (Python >= 3.11)
+            if sys.version_info < (3, 11) or lock_file.name not in ("poetry.lock", "uv.lock"):
+                return None
+            import tomllib
+
+            document = tomllib.loads(content)
+            if lock_file.name == "poetry.lock":
+                return LockFileParser._parse_poetry_lock(document)
+            return LockFileParser._parse_uv_lock(document)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            # tomllib.TOMLDecodeError and json.JSONDecodeError are ValueErrors, the others come from unexpected content
+            return None
+
+    @staticmethod
+    def _add_package(packages: Dict[str, LockedPackage], package: LockedPackage) -> None:
+        if package.name in packages:
+            # Several versions for different environments (uv forks): never updated incrementally
+            package = LockedPackage(package.name, "", None, conditional=True)
+        packages[package.name] = package
+
+    @staticmethod
+    def _parse_poetry_lock(document: Dict[str, Any]) -> Dict[str, LockedPackage]:
+        packages: Dict[str, LockedPackage] = {}
+        for entry in document.get("package", []):
+            source = entry.get("source")
+            if not source:
+                index_url: Optional[str] = PYPI_INDEX_URL
+            elif source.get("type") == "legacy":
+                index_url = source["url"]
+            else:
+                index_url = None
+            dependencies, conditional_dependencies = [], []
+            for name, constraint in entry.get("dependencies", {}).items():
+                unconditional = isinstance(constraint, str) or (isinstance(constraint, dict) and "markers" not in constraint and not constraint.get("optional", False))
+                (dependencies if unconditional else conditional_dependencies).append(normalize_distribution_name(name))
+            conditional = "markers" in entry or entry.get("optional", False)
+            files = {file["file"]: file["hash"] for file in entry.get("files", []) if "file" in file and "hash" in file}
+            LockFileParser._add_package(
+                packages,
+                LockedPackage(normalize_distribution_name(entry["name"]), entry["version"], index_url, conditional, dependencies=dependencies, conditional_dependencies=conditional_dependencies, files=files),
+            )
+        return packages
+
+    @staticmethod
+    def _parse_uv_lock(document: Dict[str, Any]) -> Dict[str, LockedPackage]:
+        packages: Dict[str, LockedPackage] = {}
+        for entry in document.get("package", []):
+            index_url = entry.get("source", {}).get("registry")
+            dependencies, conditional_dependencies = [], []
+            for dependency in entry.get("dependencies", []):
+                (conditional_dependencies if "marker" in dependency else dependencies).append(normalize_distribution_name(dependency["name"]))
+            conditional = "resolution-markers" in entry
+            LockFileParser._add_package(
+                packages, LockedPackage(normalize_distribution_name(entry["name"]), entry.get("version", ""), index_url, conditional, dependencies=dependencies, conditional_dependencies=conditional_dependencies)
+            )
+        return packages
+
+    @staticmethod
+    def _parse_pipfile_lock(document: Dict[str, Any]) -> Dict[str, LockedPackage]:
+        index_urls = {source["name"]: source["url"] for source in document.get("_meta", {}).get("sources", [])}
+        packages: Dict[str, LockedPackage] = {}
+        for section in ["default", "develop"]:
+            for name, entry in document.get(section, {}).items():
+                version = entry.get("version", "")
+                pinned = version.startswith("==") and not any(key in entry for key in ("git", "path", "file", "editable"))
+                index_url = index_urls.get(entry.get("index", "pypi"), PYPI_INDEX_URL) if pinned else None
+                conditional = "markers" in entry
+                LockFileParser._add_package(packages, LockedPackage(normalize_distribution_name(name), version[2:] if pinned else version, index_url, conditional, required=section == "default" and not conditional))
+        return packages
+
+
+@dataclass
+class LockDelta:
+    """Packages to install (without their dependencies) and to uninstall, to update an environment from one lock to the next."""
+
+    install: List[LockedPackage] = field(default_factory=list)
+    uninstall: List[str] = field(default_factory=list)
+
+    @staticmethod
+    def get_snapshot(packages: Dict[str, LockedPackage]) -> Dict[str, Dict[str, Optional[str]]]:
+        """Normalized form of a lock stored in the run info: the version and index of every package."""
+        return {name: {"version": package.version, "index_url": package.index_url} for name, package in sorted(packages.items())}
+
+    @classmethod
+    def compute(cls, previous_snapshot: Dict[str, Dict[str, Optional[str]]], packages: Dict[str, LockedPackage], installed: Dict[str, str]) -> Optional["LockDelta"]:
+        """Compute the delta from the previous lock snapshot to the locked packages, for an environment with the given installed distributions.
+
+        Packages of the previous lock which are installed in its version are updated or uninstalled. Whether a package which
+        is not installed (added, or not needed so far) is needed now is decided with the dependency graph of the lock.
+        Returns None if the delta cannot be applied safely and a full install is needed: a package to install does not come
+        from an index or depends on environment markers, an installed package is not in the version of the previous lock,
+        or whether a package is needed depends on conditions.
+        """
+        delta = cls()
+        candidates = []
+        for name in sorted(previous_snapshot.keys() | packages.keys()):
+            previous, package = previous_snapshot.get(name), packages.get(name)
+            if previous and package and previous == {"version": package.version, "index_url": package.index_url}:
+                continue
+            if name in installed and previous and installed[name] != previous["version"]:
+                logger.info(f"{name} {installed[name]} is installed instead of the locked {previous['version']}")
+                return None
+            if package is None:
+                if name in installed:
+                    delta.uninstall.append(name)
+            elif name in installed:
+                delta.install.append(package)
+            else:
+                candidates.append(package)
+
+        # A package which is not installed is needed if the lock says so or a package which will be installed depends on it
+        present = {name for name in installed if name not in delta.uninstall} | {package.name for package in delta.install}
+        while True:
+            needed = [package for package in candidates if package.required or any(package.name in packages[name].dependencies for name in present if name in packages)]
+            if not needed:
+                break
+            for package in needed:
+                candidates.remove(package)
+                delta.install.append(package)
+                present.add(package.name)
+        for package in candidates:
+            if any(package.name in packages[name].conditional_dependencies for name in present if name in packages):
+                logger.info(f"Whether {package.name} is needed depends on environment markers")
+                return None
+
+        for package in delta.install:
+            if package.index_url is None or (package.conditional and package.name not in installed):
+                logger.info(f"{package.name} {package.version} cannot be installed from a package index unconditionally")
+                return None
+        return delta
+
+    def get_install_requirements(self) -> Dict[Optional[str], List[str]]:
+        """Return the requirements to install per package index. Packages of the default index (PyPI) are listed under None:
+        they are installed from the index configured for pip or uv (PIP_INDEX_URL, pip.conf, the source in pyproject.toml), which may be a mirror."""
+        requirements: Dict[Optional[str], List[str]] = {}
+        for package in self.install:
+            index_url = None if package.index_url == PYPI_INDEX_URL else package.index_url
+            requirements.setdefault(index_url, []).append(f"{package.name}=={package.version}")
+        return requirements
+
+    def __str__(self) -> str:
+        changes = [f"+{package.name}=={package.version}" for package in self.install] + [f"-{name}" for name in self.uninstall]
+        return ", ".join(changes)
+
+
+class EnvironmentManifest:
+    """Compact description of what is installed in a virtual environment, written after each sync.
+
+    Lists every distribution with its version, dist-info directory, the size and modification time of its RECORD file,
+    the digest of the RECORD and its entry point scripts. Tools read it instead of running ``pip list``. Comparing it with
+    a listing of the site-packages directories finds distributions installed, removed or reinstalled since the sync
+    (drift) without reading any file; verify_records() additionally checks the files listed in the RECORDs.
+    """
+
+    MANIFEST_FILE = ".bootstrap-manifest.json"
+    VERSION = 1
+
+    def __init__(self, distributions: Dict[str, Dict[str, Any]]) -> None:
+        #: Normalized name -> version, dist_info (relative to the environment), record ([size, mtime_ns]), record_digest, entry_points
+        self.distributions = distributions
+
+    @classmethod
+    def create(cls, venv_dir: Path) -> "EnvironmentManifest":
+        distributions = {}
+        for name, dist_info in cls._list_distributions(venv_dir).items():
+            record = dist_info / "RECORD"
+            distributions[name] = {
+                "version": dist_info.name[: -len(".dist-info")].rpartition("-")[2],
+                "dist_info": dist_info.relative_to(venv_dir).as_posix(),
+                "record": Executor.get_file_stat(record),
+                "record_digest": Executor.get_file_hash(record),
+                "entry_points": cls._read_entry_point_scripts(dist_info),
+            }
+        return cls(distributions)
+
+    @classmethod
+    def read(cls, venv_dir: Path) -> Optional["EnvironmentManifest"]:
+        try:
+            with (venv_dir / cls.MANIFEST_FILE).open(encoding="utf-8") as file_handle:
+                data = json.load(file_handle)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != cls.VERSION:
+            return None
+        return cls(data["distributions"])
+
+    def write(self, venv_dir: Path) -> None:
+        manifest_file = venv_dir / self.MANIFEST_FILE
+        tmp_manifest_file = manifest_file.with_name(f"{manifest_file.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with tmp_manifest_file.open("w", encoding="utf-8") as file_handle:
+            json.dump({"version": self.VERSION, "distributions": self.distributions}, file_handle, indent=1, sort_keys=True)
+        os.replace(tmp_manifest_file, manifest_file)
+
+    @staticmethod
+    def _list_distributions(venv_dir: Path) -> Dict[str, Path]:
+        distributions = {}
+        for site_packages_dir in get_site_packages_dirs(venv_dir):
+            try:
+                with os.scandir(site_packages_dir) as iterator:
+                    dist_infos = [Path(entry.path) for entry in iterator if entry.name.endswith(".dist-info") and entry.is_dir()]
+            except OSError:
+                continue
+            for dist_info in dist_infos:
+                name = dist_info.name[: -len(".dist-info")].rpartition("-")[0]
+                if name:
+                    distributions[normalize_distribution_name(name)] = dist_info
+        return dict(sorted(distributions.items()))
+
+    @staticmethod
+    def _read_entry_point_scripts(dist_info: Path) -> List[str]:
+        try:
+            lines = (dist_info / "entry_points.txt").read_text(encoding="utf-8").splitlines()
+        except (OSError, ValueError):
+            return []
+        scripts, section = [], ""
+        for line in lines:
+            line = line.strip()
+            if line.startswith("["):
+                section = line.strip("[]").strip()
+            elif section in ("console_scripts", "gui_scripts") and "=" in line:
+                scripts.append(line.partition("=")[0].strip())
+        return sorted(scripts)
+
+    def check(self, venv_dir: Path) -> List[str]:
+        """Compare the installed distributions with the manifest using only directory listings and stats. Returns the differences."""
+        drift = []
+        installed = self._list_distributions(venv_dir)
+        for name in sorted(installed.keys() | self.distributions.keys()):
+            recorded = self.distributions.get(name)
+            if name not in installed:
+                drift.append(f"{name} was removed")
+            elif recorded is None:
+                drift.append(f"{name} was installed")
+            elif installed[name].relative_to(venv_dir).as_posix() != recorded["dist_info"]:
+                drift.append(f"{name} {recorded['version']} was replaced by {installed[name].name[: -len('.dist-info')].rpartition('-')[2]}")
+            elif Executor.get_file_stat(installed[name] / "RECORD") != recorded["record"]:
+                drift.append(f"{name} {recorded['version']} was reinstalled")
+        return drift
+
+    def verify_records(self, venv_dir: Path, max_workers: Optional[int] = None) -> List[str]:
+        """Check the files listed in the RECORD of every distribution against their recorded sha256 digests, in parallel.
+        Returns the distributions with missing or modified files."""
+        import base64
+        import csv
+        from concurrent.futures import ThreadPoolExecutor
+
+        files: List[Tuple[str, Path, str]] = []
+        for name, distribution in self.distributions.items():
+            dist_info = venv_dir / distribution["dist_info"]
+            try:
+                with (dist_info / "RECORD").open(encoding="utf-8", newline="") as file_handle:
+                    rows = list(csv.reader(file_handle))
+            except (OSError, ValueError):
+                continue
+            for row in rows:
+                if len(row) >= 2 and row[1].startswith("sha256="):
+                    files.append((name, dist_info.parent / row[0], row[1][len("sha256=") :]))
+
+        def is_modified(file: Tuple[str, Path, str]) -> bool:
+            digest = Executor.get_file_hash(file[1])
+            return not digest or base64.urlsafe_b64encode(bytes.fromhex(digest)).rstrip(b"=").decode() != file[2]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            modified = {name for (name, _, _), is_file_modified in zip(files, pool.map(is_modified, files)) if is_file_modified}
+        return [f"{name} {self.distributions[name]['version']} has missing or modified files" for name in sorted(modified)]
+
+
+#: The tables and keys of pyproject.toml which affect what is installed into the project virtual environment
+PYPROJECT_DEPENDENCY_KEYS: Dict[str, Optional[List[str]]] = {
+    "build-system": None,
+    "dependency-groups": None,
+    "project": ["name", "requires-python", "dependencies", "optional-dependencies", "dynamic", "scripts", "gui-scripts", "entry-points"],
+    "tool.poetry": ["name", "dependencies", "dev-dependencies", "group", "extras", "source", "packages", "scripts", "plugins", "requires-plugins"],
+    "tool.uv": ["sources", "index", "dev-dependencies", "default-groups", "constraint-dependencies", "override-dependencies", "workspace", "package"],
+}
+
+
+def get_pyproject_fingerprint(pyproject_file: Path) -> str:
+    """Hash only the dependency-relevant parts of pyproject.toml (see PYPROJECT_DEPENDENCY_KEYS),
+    so editing e.g. [tool.ruff] does not change it. Falls back to the file hash without tomllib (Python < 3.11) or for invalid TOML."""
+    if not pyproject_file.is_file():
+        return ""
+    if sys.version_info >= (3, 11):
+        import tomllib
+
+        try:
+            document = tomllib.loads(pyproject_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            document = None
+        if document is not None:
+            relevant = {}
+            for table_name, keys in PYPROJECT_DEPENDENCY_KEYS.items():
+                table: Any = document
+                for key in table_name.split("."):
+                    table = table.get(key) if isinstance(table, dict) else None
+                if isinstance(table, dict):
+                    relevant[table_name] = table if keys is None else {key: table[key] for key in keys if key in table}
+            return "dependencies " + hashlib.sha256(json.dumps(relevant, sort_keys=True).encode()).hexdigest()
+    return "file " + Executor.get_file_hash(pyproject_file)
+
+
+def get_bootstrap_script_fingerprint(script_file: Path) -> str:
+    """Return the BOOTSTRAP_SCHEMA_VERSION a bootstrap script declares, or its file hash if it declares none (older scripts)."""
+    try:
+        content = script_file.read_text(errors="replace")
+    except OSError:
+        return ""
+    match = re.search(r"^\s*\$?BOOTSTRAP_SCHEMA_VERSION\s*=\s*(\d+)", content, re.MULTILINE | re.IGNORECASE)
+    if match:
+        return f"schema {match.group(1)}"
+    return "file " + Executor.get_file_hash(script_file)
+
+
+def get_poetry_cache_dir() -> Path:
+    """Return Poetry's cache directory: POETRY_CACHE_DIR or the user cache directory of the platform."""
+    if cache_dir := os.environ.get("POETRY_CACHE_DIR"):
+        return Path(cache_dir).expanduser()
+    if sys.platform == "win32":
+        return Path(os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local") / "pypoetry" / "Cache"
+    if sys.platform == "darwin":
+        return Path.home() / "Library" / "Caches" / "pypoetry"
+    return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "pypoetry"
+
+
+def is_compatible_wheel(file_name: str) -> bool:
+    """Tell whether the running interpreter may install a wheel.
+
+    Errs on the side of compatible: all glibc and musl variants of the architecture match on Linux,
+    all macOS versions of the architecture on macOS. Sdists and other archives are not wheels.
+    """
+    import platform
+    import sysconfig
+
+    parts = file_name[: -len(".whl")].split("-")
+    if not file_name.endswith(".whl") or len(parts) < 5:
+        return False
+    python_tags, abi_tags, platform_tags = parts[-3].split("."), parts[-2].split("."), parts[-1].split(".")
+    major, minor = sys.version_info[:2]
+    interpreter = f"cp{major}{minor}"
+
+    def python_matches(tag: str) -> bool:
+        if tag in (f"py{major}", f"py{major}{minor}", interpreter):
+            return True
+        # The stable ABI of an older CPython version
+        return "abi3" in abi_tags and tag.startswith(f"cp{major}") and tag[3:].isdigit() and int(tag[3:]) <= minor
+
+    def platform_matches(tag: str) -> bool:
+        if tag in ("any", host):
+            return True
+        if host.startswith("linux_"):
+            return tag.startswith(("manylinux", "musllinux", "linux_")) and tag.endswith(host[len("linux") :])
+        if host.startswith("macosx_"):
+            return tag.startswith("macosx_") and tag.endswith((f"_{platform.machine()}", "_universal2"))
+        return False
+
+    host = sysconfig.get_platform().replace("-", "_").replace(".", "_")
+    return any(python_matches(tag) for tag in python_tags) and any(abi in ("none", "abi3") or abi.startswith(interpreter) for abi in abi_tags) and any(platform_matches(tag) for tag in platform_tags)
+
+
+class PrefetchDependencies(Runnable):
+    """Downloads the artifacts pinned in poetry.lock into Poetry's artifact cache, so `poetry install` finds them there.
+
+    Runs while the bootstrap environment is built and the network would otherwise be idle. Only the artifacts the running
+    interpreter can install are downloaded (see is_compatible_wheel), an sdist only for packages without such a wheel.
+    Every package is downloaded from the index it is locked to, the project's package source included, and checked
+    against the hash in poetry.lock. Failures are only logged, Poetry downloads whatever is missing.
+    """
+
+    MAX_WORKERS = 8
+    #: Seconds to wait for a response of the package index
+    TIMEOUT = 60.0
+    PYPI_JSON_URL = "https://pypi.org/pypi"
+
+    def __init__(self, project_dir: Path, config: BootstrapConfig) -> None:
+        self.project_dir = project_dir
+        self.config = config
+        self.lock_file = project_dir / "poetry.lock"
+        self.artifacts_dir = get_poetry_cache_dir() / "artifacts"
+        # The run info is kept in the bootstrap cache, one per project
+        self.run_info_dir = config.get_bootstrap_cache_dir() / "prefetch" / hashlib.sha256(str(project_dir.resolve()).encode()).hexdigest()[:12]
+
+    def run(self) -> int:
+        from concurrent.futures import ThreadPoolExecutor
+
+        packages = LockFileParser.parse(self.lock_file)
+        if packages is None:
+            logger.info(f"Nothing to prefetch: {self.lock_file} is missing or cannot be read (requires Python 3.11 or newer)")
+            return 0
+        packages_to_prefetch = [package for package in packages.values() if package.index_url and package.files]
+        with tracer.span("prefetch", packages=len(packages_to_prefetch)), ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as pool:
+            results = list(pool.map(self._prefetch_package, packages_to_prefetch))
+        downloaded, cached, failed = (sum(result[index] for result in results) for index in range(3))
+        logger.info(f"Prefetched {downloaded} artifacts to {self.artifacts_dir}, {cached} were already cached, {failed} packages failed")
+        return 0
+
+    def _prefetch_package(self, package: LockedPackage) -> Tuple[int, int, int]:
+        """Download the artifacts of a package. Returns the number of downloaded and already cached artifacts, and 1 if it failed."""
+        files = {file_name: file_hash for file_name, file_hash in package.files.items() if is_compatible_wheel(file_name)}
+        if not files:
+            files = {file_name: file_hash for file_name, file_hash in package.files.items() if not file_name.endswith(".whl")}
+        downloaded = cached = 0
+        try:
+            links = self.get_links(package) if files else {}
+            for file_name, file_hash in files.items():
+                if file_name not in links:
+                    raise ValueError(f"{file_name} not found on {package.index_url}")
+                if self._download(links[file_name], file_name, file_hash):
+                    downloaded += 1
+                else:
+                    cached += 1
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            # urllib.error.URLError is an OSError, invalid index responses raise the others
+            logger.warning(f"Could not prefetch {package.name} {package.version}: {exc}")
+            return downloaded, cached, 1
+        return downloaded, cached, 0
+
+    def _open(self, url: str, accept: str) -> IO[bytes]:
+        from urllib.request import Request, urlopen
+
+        if not url.startswith(("https://", "http://")):
+            raise ValueError(f"unsupported URL {url}")
+        return urlopen(Request(url, headers={"Accept": accept}), timeout=self.TIMEOUT)  # noqa: S310 (only http and https)
+
+    def get_links(self, package: LockedPackage) -> Dict[str, str]:
+        """Return the links of the artifacts of the pinned version by file name, the way Poetry gets them from the index:
+        from the JSON API for PyPI, from the simple index project page otherwise."""
+        from html.parser import HTMLParser
+        from urllib.parse import unquote, urljoin, urlsplit
+
+        class ProjectPageParser(HTMLParser):
+            def __init__(self) -> None:
+                super().__init__()
+                self.links: List[str] = []
+
+            def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+                href = dict(attrs).get("href")
+                if tag == "a" and href:
+                    self.links.append(href)
+
+        if package.index_url == PYPI_INDEX_URL:
+            with self._open(f"{self.PYPI_JSON_URL}/{package.name}/{package.version}/json", "application/json") as response:
+                release = json.load(response)
+            return {entry["filename"]: f"{entry['url']}#sha256={entry['digests']['sha256']}" for entry in release["urls"]}
+        page_url = f"{str(package.index_url).rstrip('/')}/{package.name}/"
+        with self._open(page_url, "text/html") as response:
+            page = ProjectPageParser()
+            page.feed(response.read().decode(response.headers.get_content_charset() or "utf-8"))
+        links = [urljoin(page_url, href) for href in page.links]
+        return {unquote(urlsplit(link).path.rsplit("/", 1)[-1]): link for link in links}
+
+    def get_artifact_cache_dir(self, link: str) -> Path:
+        """Return the directory of Poetry's artifact cache for a link: named after the hash of its URL and the file hash in its fragment."""
+        url, _, fragment = link.partition("#")
+        key_parts = {"url": url}
+        if match := re.fullmatch(r"(sha1|sha224|sha384|sha256|sha512|md5)=([a-f0-9]+)", fragment):
+            key_parts[match.group(1)] = match.group(2)
+        key = hashlib.sha256(json.dumps(key_parts, sort_keys=True, separators=(",", ":"), ensure_ascii=True).encode("ascii")).hexdigest()
+        return self.artifacts_dir / key[:2] / key[2:4] / key[4:6] / key[6:]
+
+    def _download(self, link: str, file_name: str, file_hash: str) -> bool:
+        """Download an artifact into the cache, unless it is there already. Returns whether it was downloaded."""
+        archive = self.get_artifact_cache_dir(link) / file_name
+        if archive.exists():
+            return False
+        algorithm, _, expected_digest = file_hash.partition(":")
+        digest = hashlib.new(algorithm)
+        archive.parent.mkdir(parents=True, exist_ok=True)
+        # Poetry only looks for archives, the download stays invisible to a concurrent install until it is complete
+        tmp_archive = archive.with_name(f"{file_name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with tracer.span("download", file=file_name), self._open(link.partition("#")[0], "*/*") as response, tmp_archive.open("wb") as file:
+                while chunk := response.read(Executor.HASH_CHUNK_SIZE):
+                    digest.update(chunk)
+                    file.write(chunk)
+            if digest.hexdigest() != expected_digest:
+                raise ValueError(f"the hash of {file_name} does not match {self.lock_file.name}")
+            os.replace(tmp_archive, archive)
+        finally:
+            tmp_archive.unlink(missing_ok=True)
+        return True
+
+    def get_name(self) -> str:
+        return "prefetch-dependencies"
+
+    def get_inputs(self) -> List[Path]:
+        return [self.lock_file]
+
+    def get_outputs(self) -> List[Path]:
+        return []
+
+    def get_config(self) -> Optional[dict[str, Any]]:
+        return {"artifacts_dir": str(self.artifacts_dir)}
+
+
+class VenvSnapshotCache:
+    """Archives of project virtual environments, keyed by everything their content depends on (see CreateVirtualEnvironment.get_snapshot_key).
+
+    Machines installing the same lock file with the same Python and package manager restore the archive instead of installing.
+    The directory may be shared (e.g. a network mount of CI runners): archives are published with an atomic rename and never modified.
+    Each archive holds the environment below ``venv/`` and a ``snapshot.json`` with its key and the location it was created in,
+    which is rewritten to the location it is restored to (see relocate_virtual_environment).
+    """
+
+    ARCHIVE_SUFFIX = ".tar.gz"
+    METADATA_FILE = "snapshot.json"
+    VENV_DIR = "venv"
+
+    def __init__(self, snapshot_dir: Path) -> None:
+        self.snapshot_dir = snapshot_dir
+
+    def get_archive(self, key: str) -> Path:
+        return self.snapshot_dir / f"{key}{self.ARCHIVE_SUFFIX}"
+
+    @staticmethod
+    def create_archive(venv_dir: Path, root_dir: Path, key: str, archive: Path) -> None:
+        """Archive a virtual environment, without the run info files of the Executor and the package store index. The archive is written to a temporary file first."""
+        import io
+        import socket
+        import tarfile
+
+        metadata = json.dumps({"key": key, "venv_dir": str(venv_dir), "root_dir": str(root_dir), "created": time.time()}, indent=4).encode()
+
+        def filter_member(member: "tarfile.TarInfo") -> Optional["tarfile.TarInfo"]:
+            if member.name.count("/") == 1 and (member.name.endswith(Executor.RUN_INFO_FILE_EXTENSION) or member.name.endswith(PackageStore.INDEX_FILE)):
+                return None
+            # Files linked to the package store are read-only, the restored environment has its own copies
+            member.mode |= stat.S_IWUSR
+            return member
+
+        archive.parent.mkdir(parents=True, exist_ok=True)
+        tmp_archive = archive.with_name(f"{archive.name}.{socket.gethostname()}-{os.getpid()}.tmp")
+        try:
+            with tracer.span("create snapshot", venv_dir=venv_dir), tarfile.open(tmp_archive, "w:gz", compresslevel=6) as tar:
+                metadata_info = tarfile.TarInfo(VenvSnapshotCache.METADATA_FILE)
+                metadata_info.size = len(metadata)
+                metadata_info.mtime = int(time.time())
+                tar.addfile(metadata_info, io.BytesIO(metadata))
+                tar.add(venv_dir, arcname=VenvSnapshotCache.VENV_DIR, filter=filter_member)
+            os.replace(tmp_archive, archive)
+        finally:
+            tmp_archive.unlink(missing_ok=True)
+
+    @staticmethod
+    def read_metadata(archive: Path) -> Dict[str, Any]:
+        """Return the snapshot.json of an archive. Raises a UserNotificationException if it is no snapshot."""
+        import tarfile
+
+        try:
+            with tarfile.open(archive, "r:gz") as tar:
+                metadata_file = tar.extractfile(VenvSnapshotCache.METADATA_FILE)
+                if metadata_file is None:
+                    raise KeyError(VenvSnapshotCache.METADATA_FILE)
+                metadata = json.load(metadata_file)
+        except (OSError, EOFError, KeyError, ValueError, tarfile.TarError) as exc:
+            raise UserNotificationException(f"{archive} is not a virtual environment snapshot: {exc}") from exc
+        if not isinstance(metadata, dict) or not {"key", "venv_dir", "root_dir"} <= metadata.keys():
+            raise UserNotificationException(f"{archive} is not a virtual environment snapshot: incomplete {VenvSnapshotCache.METADATA_FILE}")
+        return metadata
+
+    def save(self, venv_dir: Path, root_dir: Path, key: str) -> Optional[Path]:
+        """Store a snapshot of the environment, unless there is one for the key already. Returns the new archive."""
+        archive = self.get_archive(key)
+        if archive.exists():
+            return None
+        self.create_archive(venv_dir, root_dir, key, archive)
+        return archive
+
+    def import_archive(self, archive: Path) -> Path:
+        """Copy a snapshot (e.g. created with ``snapshot export``) into the cache, under the key it was created for."""
+        import shutil
+        import socket
+
+        key = self.read_metadata(archive)["key"]
+        target = self.get_archive(key)
+        tmp_target = target.with_name(f"{target.name}.{socket.gethostname()}-{os.getpid()}.tmp")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            shutil.copyfile(archive, tmp_target)
+            os.replace(tmp_target, target)
+        finally:
+            tmp_target.unlink(missing_ok=True)
+        return target
+
+    def restore(self, key: str, venv_dir: Path, root_dir: Path) -> bool:
+        """Extract the snapshot of the key to venv_dir (which must not exist) and relocate it. Returns False if there is none or it cannot be used."""
+        import shutil
+        import tarfile
+
+        archive = self.get_archive(key)
+        if not archive.is_file():
+            return False
+        staging_dir = venv_dir.with_name(f"{venv_dir.name}.snapshot-{os.getpid()}")
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        try:
+            metadata = self.read_metadata(archive)
+            with tracer.span("restore snapshot", archive=archive), tarfile.open(archive, "r:gz") as tar:
+                # The "tar" filter keeps the symlinks to the base interpreter, but refuses members outside the staging directory
+                if hasattr(tarfile, "tar_filter"):
+                    tar.extractall(staging_dir, filter="tar")
+                else:
+                    tar.extractall(staging_dir)  # noqa: S202 (Python versions without extraction filters)
+            staging_venv_dir = staging_dir / self.VENV_DIR
+            relocate_virtual_environment(staging_venv_dir, venv_dir, Path(metadata["venv_dir"]))
+            self._relocate_path_files(staging_venv_dir, Path(metadata["root_dir"]), root_dir)
+            staging_venv_dir.rename(venv_dir)
+        except (OSError, EOFError, tarfile.TarError, UserNotificationException) as exc:
+            logger.warning(f"Could not restore the snapshot {archive}: {exc}")
+            shutil.rmtree(venv_dir, ignore_errors=True)
+            return False
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        return True
+
+    @staticmethod
+    def _relocate_path_files(venv_dir: Path, origin_root_dir: Path, target_root_dir: Path) -> None:
+        """Point the .pth files of editable installs (the project itself) to the project directory the snapshot is restored for."""
+        if origin_root_dir == target_root_dir:
+            return
+        replacements = dict.fromkeys(
+            [
+                (os.fsencode(str(origin_root_dir)), os.fsencode(str(target_root_dir))),
+                (os.fsencode(origin_root_dir.as_posix()), os.fsencode(target_root_dir.as_posix())),
+            ]
+        )
+        for site_packages_dir in get_site_packages_dirs(venv_dir):
+            for path_file in site_packages_dir.glob("*.pth"):
+                content = path_file.read_bytes()
+                relocated = content
+                for old, new in replacements:
+                    relocated = relocated.replace(old, new)
+                if relocated != content:
+                    path_file.write_bytes(relocated)
+
+
 class CreateVirtualEnvironment(Runnable):
     """Creates the project virtual environment using the bootstrap environment's package manager."""
 
+    BOOTSTRAP_SCRIPTS: ClassVar[List[str]] = [".bootstrap/bootstrap.ps1", ".bootstrap/bootstrap.py", "bootstrap.ps1", "bootstrap.py"]
+
     def __init__(
         self,
         root_dir: Path,
         bootstrap_env: CreateBootstrapEnvironment,
+        prefetch: Optional[PrefetchDependencies] = None,
     ) -> None:
         self.root_dir = root_dir
-        self.venv_dir = self.root_dir / ".venv"
-        self.bootstrap_dir = self.root_dir / ".bootstrap"
-        self.virtual_env = instantiate_os_specific_venv(self.venv_dir)
         self.bootstrap_env = bootstrap_env
+        #: Fills the package manager's cache before the install, see PrefetchDependencies
+        self.prefetch = prefetch
         self.config = bootstrap_env.config
+        #: The .venv tools and IDEs use. In venv_per_python_version mode a link to venv_dir.
+        self.venv_link = self.root_dir / ".venv"
+        if self.config.venv_per_python_version:
+            self.venv_dir = self.root_dir / f".venv-{sys.version_info.major}.{sys.version_info.minor}"
+        else:
+            self.venv_dir = self.venv_link
+        self.bootstrap_dir = self.root_dir / ".bootstrap"
+        self.virtual_env = instantiate_os_specific_venv(self.venv_dir)
         self.python_version_marker = self.venv_dir / VENV_PYTHON_VERSION_MARKER
 
     @property
@@ -582,6 +2812,8 @@ class CreateVirtualEnvironment(Runnable):
         If the Python version has changed (e.g., switching branches), delete the
         existing venv so it can be recreated by the package manager.
         """
+        import shutil
+
         if not self.venv_dir.exists():
             return
 
@@ -600,6 +2832,41 @@ class CreateVirtualEnvironment(Runnable):
         except OSError as exc:
             logger.warning(f"Could not read Python version marker: {exc}")
 
+    def _migrate_legacy_venv(self) -> None:
+        """Turn a .venv directory into the per Python version environment recorded in its marker, so it is not reinstalled."""
+        import shutil
+
+        if is_directory_link(self.venv_link) or not self.venv_link.is_dir():
+            return
+        try:
+            stored_version = (self.venv_link / VENV_PYTHON_VERSION_MARKER).read_text().strip()
+        except OSError:
+            stored_version = ""
+        versioned_venv_dir = self.root_dir / f".venv-{'.'.join(stored_version.split('.')[:2])}"
+        if not stored_version or versioned_venv_dir.exists():
+            logger.info(f"Deleting {self.venv_link}, it is replaced by a link to the environment of the active Python version")
+            shutil.rmtree(self.venv_link)
+            return
+        logger.info(f"Moving {self.venv_link} (Python {stored_version}) to {versioned_venv_dir}")
+        self.venv_link.rename(versioned_venv_dir)
+        relocate_virtual_environment(versioned_venv_dir, versioned_venv_dir, origin_venv_dir=self.venv_link)
+
+    def _activate_venv(self) -> None:
+        """Point the .venv link to the environment of the running Python version."""
+        if self.venv_link.resolve() == self.venv_dir.resolve():
+            return
+        logger.info(f"Activating {self.venv_dir}")
+        replace_directory_link(self.venv_link, self.venv_dir)
+
+    def skip(self) -> None:
+        # Switching back to a Python version whose environment is up to date only swaps the link
+        self._use_python_version_venv()
+
+    def _use_python_version_venv(self) -> None:
+        if self.config.venv_per_python_version:
+            self._migrate_legacy_venv()
+            self._activate_venv()
+
     def _write_python_version_marker(self, version: str) -> None:
         """Write the Python version marker to track the venv's Python version."""
         try:
@@ -607,22 +2874,87 @@ class CreateVirtualEnvironment(Runnable):
         except OSError as exc:
             logger.warning(f"Could not write Python version marker: {exc}")
 
-    def _ensure_in_project_venv(self) -> None:
-        """Configure package managers to create venv in-project (.venv in repository)."""
-        if self.package_manager_name == "poetry":
-            # Set environment variable for poetry to create venv in-project
-            os.environ["POETRY_VIRTUALENVS_IN_PROJECT"] = "true"
-        elif self.package_manager_name == "pipenv":
-            # Set environment variable for pipenv
-            os.environ["PIPENV_VENV_IN_PROJECT"] = "1"
-        # UV creates .venv in-project by default, no configuration needed
+    def get_environment(self) -> Dict[str, str]:
+        """Return the environment variables for the package manager.
 
-    def _ensure_correct_python_version(self) -> None:
-        """Ensure the correct Python version is used in the virtual environment."""
+        They are only set for the package manager's process, so several stages can run in one process
+        without affecting each other (or the caller's os.environ).
+        """
+        env = {}
+        # Configure package managers to create venv in-project (.venv in repository)
         if self.package_manager_name == "poetry":
+            env["POETRY_VIRTUALENVS_IN_PROJECT"] = "true"
             # Make Poetry use the Python interpreter it's being run with
-            os.environ["POETRY_VIRTUALENVS_PREFER_ACTIVE_PYTHON"] = "false"
-            os.environ["POETRY_VIRTUALENVS_USE_POETRY_PYTHON"] = "true"
+            env["POETRY_VIRTUALENVS_PREFER_ACTIVE_PYTHON"] = "false"
+            env["POETRY_VIRTUALENVS_USE_POETRY_PYTHON"] = "true"
+        elif self.package_manager_name == "pipenv":
+            env["PIPENV_VENV_IN_PROJECT"] = "1"
+        elif self.package_manager_name == "uv" and self.config.venv_per_python_version:
+            env["UV_PROJECT_ENVIRONMENT"] = str(self.venv_dir)
+        # Otherwise UV creates .venv in-project by default, no configuration needed
+        return env
+
+    def get_lock_file(self) -> Optional[Path]:
+        """Return the lock file the package manager installs from, None for a custom install command."""
+        if self.config.venv_install_command:
+            return None
+        lock_file_names = {"poetry": "poetry.lock", "uv": "uv.lock", "pipenv": "Pipfile.lock"}
+        lock_file_name = lock_file_names.get(self.package_manager_name)
+        return self.root_dir / lock_file_name if lock_file_name else None
+
+    def get_state(self) -> Optional[Dict[str, Any]]:
+        """Record a snapshot of the lock file, so the next run can install only what has changed."""
+        lock_file = self.get_lock_file()
+        packages = LockFileParser.parse(lock_file) if lock_file else None
+        if packages is None:
+            return None
+        return {"lock": LockDelta.get_snapshot(packages)}
+
+    def update(self, changes: List[str], previous_state: Dict[str, Any]) -> Optional[int]:
+        """If only the lock file has changed, install and uninstall the changed packages without their dependencies,
+        instead of running the package manager's full install."""
+        lock_file = self.get_lock_file()
+        if not lock_file or changes != [str(lock_file)] or "lock" not in previous_state or not self.venv_dir.is_dir():
+            return None
+        self._use_python_version_venv()
+        packages = LockFileParser.parse(lock_file)
+        if packages is None:
+            return None
+        delta = LockDelta.compute(previous_state["lock"], packages, get_installed_distributions(self.venv_dir))
+        if delta is None:
+            logger.info(f"The changes of {lock_file.name} cannot be applied incrementally, running a full install")
+            return None
+        if not delta.install and not delta.uninstall:
+            logger.info(f"No installed package changed in {lock_file.name}")
+            return 0
+        logger.info(f"Applying the changes of {lock_file.name} to {self.venv_dir}: {delta}")
+        self._detach_files()
+        try:
+            self._apply_lock_delta(delta)
+        except UserNotificationException as exc:
+            logger.warning(f"Incremental update failed, running a full install: {exc}")
+            return None
+        self._deduplicate_files()
+        self._write_manifest()
+        return 0
+
+    def _apply_lock_delta(self, delta: LockDelta) -> None:
+        if self.package_manager_name == "uv":
+            # Environments created by uv have no pip
+            uv_executable = self.bootstrap_env.virtual_env.scripts_path() / "uv"
+            for index_url, requirements in delta.get_install_requirements().items():
+                index_args = ["--index-url", index_url] if index_url else []
+                SubprocessExecutor([uv_executable, "pip", "install", "--python", self.virtual_env.python_path(), "--no-deps", *index_args, *requirements], timeout=self.config.command_timeout).execute()
+            if delta.uninstall:
+                SubprocessExecutor([uv_executable, "pip", "uninstall", "--python", self.virtual_env.python_path(), *delta.uninstall], timeout=self.config.command_timeout).execute()
+            return
+        if not self.virtual_env.pip_path().exists():
+            raise UserNotificationException(f"pip not found in {self.venv_dir}")
+        for index_url, requirements in delta.get_install_requirements().items():
+            index_args = ["--index-url", index_url] if index_url else []
+            self.virtual_env.pip(["install", "--no-deps", *index_args, *requirements], timeout=self.config.command_timeout)
+        if delta.uninstall:
+            self.virtual_env.pip(["uninstall", "--yes", *delta.uninstall], timeout=self.config.command_timeout)
 
     def _get_install_argument(self) -> str:
         if self.package_manager_name == "uv":
@@ -631,7 +2963,12 @@ class CreateVirtualEnvironment(Runnable):
 
     def _get_install_command(self) -> List[str]:
         if self.config.venv_install_command:
-            return self.config.venv_install_command.split()
+            import shlex
+
+            # Split like the shell of the platform would, so quoted arguments with spaces stay one argument
+            if sys.platform.startswith("win32"):
+                return [argument[1:-1] if len(argument) > 1 and argument[0] == argument[-1] == '"' else argument for argument in shlex.split(self.config.venv_install_command, posix=False)]
+            return shlex.split(self.config.venv_install_command)
 
         return [
             str(self.bootstrap_env.virtual_env.scripts_path() / self.package_manager_name),
@@ -640,17 +2977,25 @@ class CreateVirtualEnvironment(Runnable):
         ]
 
     def run(self) -> int:
+        if self.config.venv_per_python_version:
+            self._migrate_legacy_venv()
         self._check_python_version_compatibility()
-        self._ensure_in_project_venv()
-        self._ensure_correct_python_version()
+        restored = not self.venv_dir.exists() and self._restore_snapshot(self.get_snapshot_key())
+        if self.config.venv_per_python_version:
+            if not self.venv_dir.exists() and self.package_manager_name != "uv":
+                # Poetry and pipenv install into an existing in-project .venv, so it must resolve to the versioned one
+                self.virtual_env.create(VirtualEnvironmentTemplate(self.config.get_bootstrap_cache_dir()))
+            self._activate_venv()
 
         # Get the PyPi source from pyproject.toml or Pipfile if it is defined
         pypi_source = PyPiSourceParser.from_pyproject(self.root_dir)
 
-        # Use the bootstrap environment's package manager to install dependencies
-        # The package manager will create the .venv if it doesn't exist
-        logger.info(f"Using bootstrap environment at {self.bootstrap_env.venv_dir}")
-        self.bootstrap_env.virtual_env.run(self._get_install_command(), capture_output=True, cwd=self.root_dir)
+        if not restored:
+            # Use the bootstrap environment's package manager to install dependencies
+            # The package manager will create the .venv if it doesn't exist
+            logger.info(f"Using bootstrap environment at {self.bootstrap_env.venv_dir}")
+            self._detach_files()
+            self.bootstrap_env.virtual_env.run(self._get_install_command(), capture_output=True, cwd=self.root_dir, timeout=self.config.command_timeout, env=self.get_environment())
 
         # Write Python version marker after package manager creates/updates venv
         if self.venv_dir.exists():
@@ -661,8 +3006,80 @@ class CreateVirtualEnvironment(Runnable):
         if pypi_source and self.venv_dir.exists():
             self.virtual_env.pip_configure(index_url=pypi_source.url, verify_ssl=True)
 
+        self._deduplicate_files()
+        self._write_manifest()
+        if not restored:
+            # uv sync may have updated the lock file
+            self._save_snapshot(self.get_snapshot_key())
         return 0
 
+    def get_snapshot_key(self) -> Optional[str]:
+        """Return the key of the snapshot of this environment: a hash of the lock file, the dependencies of pyproject.toml,
+        the Python interpreter, the platform and the package manager. None without a lock file."""
+        import platform
+        import sysconfig
+
+        lock_file = self.get_lock_file()
+        if not lock_file or not lock_file.is_file():
+            return None
+        components = [
+            f"lock={Executor.get_file_hash(lock_file)}",
+            f"pyproject={get_pyproject_fingerprint(self.root_dir / 'pyproject.toml')}",
+            # The environment links to the base interpreter, it must be the same on the machines sharing a snapshot
+            f"python={sys.implementation.name}-{platform.python_version()}|{getattr(sys, '_base_executable', sys.executable)}",
+            f"platform={sysconfig.get_platform()}",
+            f"manager={self.config.package_manager}",
+            f"manager_args={self.config.package_manager_args}",
+        ]
+        return hashlib.sha256("|".join(components).encode()).hexdigest()[:16]
+
+    def _restore_snapshot(self, snapshot_key: Optional[str]) -> bool:
+        if not self.config.venv_snapshot_dir or not snapshot_key:
+            return False
+        if not VenvSnapshotCache(self.config.venv_snapshot_dir).restore(snapshot_key, self.venv_dir, self.root_dir):
+            return False
+        logger.info(f"Restored {self.venv_dir} from the snapshot {snapshot_key} in {self.config.venv_snapshot_dir}")
+        return True
+
+    def _save_snapshot(self, snapshot_key: Optional[str]) -> None:
+        """Store a snapshot of the installed environment. A snapshot which cannot be stored only costs the next machine the install."""
+        if not self.config.venv_snapshot_dir or not snapshot_key or not self.venv_dir.is_dir():
+            return
+        try:
+            archive = VenvSnapshotCache(self.config.venv_snapshot_dir).save(self.venv_dir, self.root_dir, snapshot_key)
+        except OSError as exc:
+            logger.warning(f"Could not store a snapshot of {self.venv_dir}: {exc}")
+            return
+        if archive:
+            logger.info(f"Stored a snapshot of {self.venv_dir} in {archive}")
+
+    def _detach_files(self) -> None:
+        """Give the environment private copies of its package store files before the package manager writes into it."""
+        if self.venv_dir.is_dir():
+            PackageStore(self.config.get_package_store_dir()).detach(self.venv_dir)
+
+    def _deduplicate_files(self) -> None:
+        if self.config.package_store and self.virtual_env.lib_path().is_dir():
+            linked, copied = PackageStore(self.config.get_package_store_dir()).deduplicate(self.virtual_env.lib_path(), self.venv_dir)
+            logger.info(f"Linked {linked} files of {self.venv_dir} to the package store, {copied} files kept as copies")
+
+    def _write_manifest(self) -> None:
+        if self.venv_dir.is_dir():
+            with tracer.span("write manifest"):
+                EnvironmentManifest.create(self.venv_dir).write(self.venv_dir)
+
+    def get_drift(self) -> List[str]:
+        """Compare the environment with the manifest written after the last sync. Environments without a manifest have no known drift."""
+        if self.config.venv_drift_check == "off":
+            return []
+        manifest = EnvironmentManifest.read(self.venv_dir)
+        if manifest is None:
+            return []
+        drift = manifest.check(self.venv_dir)
+        if not drift and self.config.venv_drift_check == "records":
+            drift = manifest.verify_records(self.venv_dir)
+        return drift
+
     def get_name(self) -> str:
         return "create-virtual-environment"
 
@@ -682,8 +3099,27 @@ class CreateVirtualEnvironment(Runnable):
             "bootstrap.py",
             str(self.bootstrap_env.marker_file),
         ]
+        if self.get_fingerprint_scheme() == "semantic":
+            venv_relevant_files = [file for file in venv_relevant_files if file != "pyproject.toml" and file not in self.BOOTSTRAP_SCRIPTS]
         return [self.root_dir / file for file in venv_relevant_files]
 
+    def get_fingerprint_scheme(self) -> str:
+        return "semantic" if self.config.input_fingerprint == "semantic" else "file"
+
+    def get_fingerprints(self) -> Dict[str, str]:
+        """In the semantic scheme, pyproject.toml is fingerprinted by its dependencies and the bootstrap scripts by their schema version."""
+        if self.get_fingerprint_scheme() != "semantic":
+            return {}
+        fingerprints = {str(self.root_dir / "pyproject.toml"): get_pyproject_fingerprint(self.root_dir / "pyproject.toml")}
+        for script in self.BOOTSTRAP_SCRIPTS:
+            fingerprints[str(self.root_dir / script)] = get_bootstrap_script_fingerprint(self.root_dir / script)
+        return fingerprints
+
+    def get_dependencies(self) -> List[Runnable]:
+        if self.prefetch:
+            return [self.bootstrap_env, self.prefetch]
+        return [self.bootstrap_env]
+
     def get_outputs(self) -> List[Path]:
         """Return the Scripts/bin directories for both bootstrap and project environments.
 
@@ -705,24 +3141,405 @@ def print_environment_info() -> None:
     logger.info(str_bar)
 
 
-def main() -> int:
+def create_project_stages(project_dir: Path) -> List[Tuple[Runnable, Executor]]:
+    """Create the stages bootstrapping the project, with the executors keeping track of their run info."""
+    config = BootstrapConfig.from_json_file(project_dir / "bootstrap.json")
+    # Step 1: Create the bootstrap environment (shared cache)
+    bootstrap_env = CreateBootstrapEnvironment(config, project_dir)
+    stages: List[Tuple[Runnable, Executor]] = [(bootstrap_env, Executor(bootstrap_env.bootstrap_env_dir))]
+    # Optional: Download the project dependencies while the bootstrap env is built
+    prefetch = None
+    if config.prefetch_dependencies:
+        if extract_package_manager_name(config.package_manager) == "poetry" and not config.venv_install_command:
+            prefetch = PrefetchDependencies(project_dir, config)
+            stages.append((prefetch, Executor(prefetch.run_info_dir)))
+        else:
+            logger.info("Skipping the prefetch of the project dependencies, it is only supported for Poetry")
+    # Step 2: Create the project virtual environment using the bootstrap env
+    project_venv = CreateVirtualEnvironment(project_dir, bootstrap_env, prefetch)
+    stages.append((project_venv, Executor(project_venv.venv_dir)))
+    return stages
+
+
+def check_environments(stages: List[Tuple[Runnable, Executor]]) -> int:
+    """Report whether the stages are up to date without running them.
+
+    Prints the status of every stage, what has changed and where the package manager and the project tools live,
+    as recorded in the outputs of the project environment's run info. Only reads files, nothing is created, deleted or installed.
+    Returns the exit code of the first stage which is not up to date, 0 if all are.
+    """
+    exit_code = 0
+    for runnable, executor in stages:
+        run_info_check = executor.check_run_info(runnable)
+        write_output(f"{runnable.get_name()}: {run_info_check.status.name} - {run_info_check.status.message}")
+        for change in run_info_check.changes:
+            write_output(f"  changed: {change}")
+        # Whether the prefetch is up to date says nothing about the environments
+        if not exit_code and not isinstance(runnable, PrefetchDependencies):
+            exit_code = run_info_check.status.check_exit_code
+
+    for runnable, executor in stages:
+        if isinstance(runnable, CreateVirtualEnvironment) and (run_info := executor.get_run_info(runnable)):
+            # The outputs are the project's and the bootstrap environment's scripts directories, see CreateVirtualEnvironment.get_outputs()
+            outputs = list(run_info["outputs"])
+            if len(outputs) >= 2:
+                write_output(f"Package manager: {Path(outputs[1]) / runnable.package_manager_name}")
+                write_output(f"Project tools: {outputs[0]}")
+    return exit_code
+
+
+def check_workspace(project_dirs: List[Path]) -> int:
+    """Run check_environments() for every project. Returns the first non-zero exit code."""
+    exit_code = 0
+    for project_dir in project_dirs:
+        write_output(f"{project_dir}:")
+        project_exit_code = check_environments(create_project_stages(project_dir))
+        exit_code = exit_code or project_exit_code
+    return exit_code
+
+
+@dataclass
+class WorkspaceProjectResult:
+    project_dir: Path
+    #: "up to date", "updated" or "failed"
+    status: str
+    duration: float
+    error: str = ""
+    #: Trace events recorded in the worker process, merged into the trace of the main process
+    trace_events: List[dict[str, Any]] = field(default_factory=list)
+
+
+def find_workspace_projects(patterns: List[str], root_dir: Path) -> List[Path]:
+    """Resolve directories and glob patterns (relative to root_dir) to project directories.
+
+    Only directories with a pyproject.toml or a Pipfile are projects. Each project is returned once, in the order found.
+    """
+    projects: Dict[Path, None] = {}
+    for pattern in patterns:
+        is_glob = any(wildcard in pattern for wildcard in "*?[")
+        if is_glob:
+            pattern_path = Path(pattern)
+            if pattern_path.is_absolute():
+                candidates = sorted(Path(pattern_path.anchor).glob(str(pattern_path.relative_to(pattern_path.anchor))))
+            else:
+                candidates = sorted(root_dir.glob(pattern))
+        else:
+            candidates = [root_dir / pattern]
+        for candidate in candidates:
+            if (candidate / "pyproject.toml").exists() or (candidate / "Pipfile").exists():
+                projects[candidate.resolve()] = None
+            elif not is_glob:
+                logger.warning(f"Skipping {candidate}: no pyproject.toml or Pipfile found")
+    return list(projects)
+
+
+def create_workspace_project_environment(project_dir: Path, log_file: Optional[Path] = None, trace_origin_ns: Optional[int] = None) -> WorkspaceProjectResult:
+    """Create the virtual environment of one workspace project. Runs in a worker process, its bootstrap environment must already exist.
+    With ``trace_origin_ns`` (the origin of the main process' tracer), the spans of the worker are returned in the result."""
+    SubprocessExecutor.default_log_file = log_file
+    if trace_origin_ns is None:
+        return _create_workspace_project_environment(project_dir)
+    tracer.start_worker(trace_origin_ns)
+    with tracer.span("project environment", project=project_dir):
+        result = _create_workspace_project_environment(project_dir)
+    result.trace_events = tracer.events
+    return result
+
+
+def _create_workspace_project_environment(project_dir: Path) -> WorkspaceProjectResult:
+    start = time.perf_counter()
+    bootstrap_env = CreateBootstrapEnvironment(BootstrapConfig.from_json_file(project_dir / "bootstrap.json"), project_dir)
+    project_venv = CreateVirtualEnvironment(project_dir, bootstrap_env)
+    executor = Executor(project_venv.venv_dir)
     try:
-        project_dir = Path.cwd()
-        config = BootstrapConfig.from_json_file(project_dir / "bootstrap.json")
+        exit_code = executor.execute(project_venv)
+    except UserNotificationException as exc:
+        return WorkspaceProjectResult(project_dir, "failed", time.perf_counter() - start, str(exc))
+    if exit_code:
+        return WorkspaceProjectResult(project_dir, "failed", time.perf_counter() - start, f"Exit code {exit_code}")
+    status = executor.last_run_info_status
+    return WorkspaceProjectResult(project_dir, "updated" if status and status.should_run else "up to date", time.perf_counter() - start)
+
+
+def bootstrap_workspace(project_dirs: List[Path], jobs: Optional[int] = None) -> int:
+    """Bootstrap several projects in one run.
+
+    Projects with the same configuration share a bootstrap environment (see compute_bootstrap_env_hash),
+    so each distinct bootstrap environment is built once, concurrently. Then the project environments are created
+    on a pool of at most ``jobs`` processes. Ends with a summary per project. Returns 1 if any project failed.
+    """
+    bootstrap_envs = {project_dir: CreateBootstrapEnvironment(BootstrapConfig.from_json_file(project_dir / "bootstrap.json"), project_dir) for project_dir in project_dirs}
+    toolchains: Dict[Path, CreateBootstrapEnvironment] = {}
+    for bootstrap_env in bootstrap_envs.values():
+        toolchains.setdefault(bootstrap_env.bootstrap_env_dir, bootstrap_env)
+    logger.info(f"Bootstrapping {len(project_dirs)} projects with {len(toolchains)} distinct bootstrap environments")
+
+    with ExitStack() as leases:
+        # Keep the garbage collection away from the bootstrap environments until all projects are done
+        for bootstrap_env in toolchains.values():
+            leases.enter_context(BootstrapCache(bootstrap_env.bootstrap_env_dir.parent).use(bootstrap_env.env_hash))
+        results = _bootstrap_workspace_projects(bootstrap_envs, toolchains, jobs)
+        for config in {bootstrap_env.config.get_bootstrap_cache_dir(): bootstrap_env.config for bootstrap_env in toolchains.values()}.values():
+            collect_garbage_if_due(config)
+
+    logger.info("Workspace summary:")
+    for project_dir in project_dirs:
+        result = results[project_dir]
+        error = f"  {result.error.splitlines()[0]}" if result.error else ""
+        logger.info(f"  {project_dir}: {result.status} ({result.duration:.1f} s){error}")
+    return 1 if any(result.status == "failed" for result in results.values()) else 0
+
+
+def _bootstrap_workspace_projects(bootstrap_envs: Dict[Path, CreateBootstrapEnvironment], toolchains: Dict[Path, CreateBootstrapEnvironment], jobs: Optional[int]) -> Dict[Path, WorkspaceProjectResult]:
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    toolchain_errors: Dict[Path, str] = {}
+    with tracer.span("bootstrap environments", count=len(toolchains)), ThreadPoolExecutor(max_workers=jobs) as thread_pool:
+        toolchain_futures = {env_dir: thread_pool.submit(Executor(env_dir).execute, bootstrap_env) for env_dir, bootstrap_env in toolchains.items()}
+        for env_dir, toolchain_future in toolchain_futures.items():
+            try:
+                if exit_code := toolchain_future.result():
+                    toolchain_errors[env_dir] = f"Bootstrap environment failed with exit code {exit_code}"
+            except UserNotificationException as exc:
+                logger.error(exc)
+                toolchain_errors[env_dir] = f"Bootstrap environment failed: {exc}"
+
+    results: Dict[Path, WorkspaceProjectResult] = {}
+    with tracer.span("project environments", count=len(bootstrap_envs)), ProcessPoolExecutor(max_workers=jobs) as process_pool:
+        project_futures = {}
+        for project_dir, bootstrap_env in bootstrap_envs.items():
+            if bootstrap_env.bootstrap_env_dir in toolchain_errors:
+                results[project_dir] = WorkspaceProjectResult(project_dir, "failed", 0.0, toolchain_errors[bootstrap_env.bootstrap_env_dir])
+            else:
+                project_futures[project_dir] = process_pool.submit(create_workspace_project_environment, project_dir, SubprocessExecutor.default_log_file, tracer.get_origin_ns() if tracer.enabled else None)
+        for project_dir, project_future in project_futures.items():
+            try:
+                results[project_dir] = project_future.result()
+                tracer.merge(results[project_dir].trace_events)
+            except Exception as exc:
+                results[project_dir] = WorkspaceProjectResult(project_dir, "failed", 0.0, f"{type(exc).__name__}: {exc}")
+    return results
+
+
+def export_snapshot(project_dir: Path, output: Optional[Path], snapshot_dir: Optional[Path]) -> int:
+    """Archive the project environment, which must be up to date: to output, or into the snapshot directory under its key."""
+    project_venv, executor = next((runnable, executor) for runnable, executor in create_project_stages(project_dir) if isinstance(runnable, CreateVirtualEnvironment))
+    status = executor.check_run_info(project_venv).status
+    if status is not RunInfoStatus.MATCH:
+        raise UserNotificationException(f"Cannot export {project_venv.venv_dir}: {status.message}. Run bootstrap first.")
+    snapshot_key = project_venv.get_snapshot_key()
+    if not snapshot_key:
+        raise UserNotificationException(f"Cannot export {project_venv.venv_dir}: snapshots are keyed by the lock file, but the project has none.")
+    if output:
+        VenvSnapshotCache.create_archive(project_venv.venv_dir, project_dir, snapshot_key, output)
+        write_output(f"Exported the snapshot {snapshot_key} to {output}")
+        return 0
+    if not snapshot_dir:
+        raise UserNotificationException("No snapshot directory: configure venv_snapshot_dir in bootstrap.json or use --snapshot-dir or --output.")
+    snapshot_cache = VenvSnapshotCache(snapshot_dir)
+    if snapshot_cache.save(project_venv.venv_dir, project_dir, snapshot_key):
+        write_output(f"Exported the snapshot {snapshot_key} to {snapshot_cache.get_archive(snapshot_key)}")
+    else:
+        write_output(f"The snapshot {snapshot_key} already exists in {snapshot_dir}")
+    return 0
+
+
+def import_snapshot(archive: Path, snapshot_dir: Optional[Path]) -> int:
+    """Copy an exported snapshot into the snapshot directory, where the cold runs of every project with its key restore it."""
+    if not snapshot_dir:
+        raise UserNotificationException("No snapshot directory: configure venv_snapshot_dir in bootstrap.json or use --snapshot-dir.")
+    target = VenvSnapshotCache(snapshot_dir).import_archive(archive)
+    write_output(f"Imported {archive} as {target}")
+    return 0
 
-        # Step 1: Create the bootstrap environment (shared cache)
-        bootstrap_env = CreateBootstrapEnvironment(config, project_dir)
-        bootstrap_executor = Executor(bootstrap_env.bootstrap_env_dir)
-        bootstrap_executor.execute(bootstrap_env)
 
-        # Step 2: Create the project virtual environment using the bootstrap env
-        project_venv = CreateVirtualEnvironment(project_dir, bootstrap_env)
-        project_executor = Executor(project_venv.venv_dir)
-        project_executor.execute(project_venv)
+def collect_garbage(cache_dir: Path, max_size: Optional[int], max_age: Optional[float]) -> int:
+    """Remove the least recently used bootstrap environments exceeding the budget and report what is left."""
+    if max_size is None and max_age is None:
+        raise UserNotificationException("No garbage collection budget given. Use --max-size and/or --max-age, or set bootstrap_cache_max_size and/or bootstrap_cache_max_age_days in bootstrap.json.")
+    cache = BootstrapCache(cache_dir)
+    evicted = cache.collect_garbage(max_size, max_age)
+    remaining = cache.get_environments()
+    logger.info(
+        f"Removed {len(evicted)} bootstrap environments ({format_size(sum(environment.size for environment in evicted))}), "
+        f"{len(remaining)} left in {cache_dir} ({format_size(sum(environment.size for environment in remaining))})"
+    )
+    return 0
+
+
+def format_time(timestamp: float) -> str:
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp))
+
+
+def list_environments(cache_dir: Path) -> int:
+    """Print the registered bootstrap environments, most recently used first."""
+    environments = sorted(BootstrapCache(cache_dir).get_environments(), key=lambda environment: environment.last_used, reverse=True)
+    for environment in environments:
+        package_manager = environment.package_manager or "unknown package manager"
+        if version := environment.get_package_manager_version():
+            package_manager += f" ({version})"
+        write_output(
+            f"{environment.env_hash}  Python {environment.python_version or '?'}  {package_manager}  {format_size(environment.size)}  "
+            f"created {format_time(environment.created)}  last used {format_time(environment.last_used)}"
+        )
+    return 0
+
+
+def print_cache_statistics(cache_dir: Path) -> int:
+    """Print the number and size of the bootstrap environments, in total and per Python version."""
+    environments = BootstrapCache(cache_dir).get_environments()
+    write_output(f"Bootstrap cache: {cache_dir}")
+    write_output(f"Environments: {len(environments)} ({format_size(sum(environment.size for environment in environments))})")
+    python_versions: Dict[str, List[CachedEnvironment]] = {}
+    for environment in environments:
+        python_version = ".".join(environment.python_version.split(".")[:2]) or "unknown"
+        python_versions.setdefault(python_version, []).append(environment)
+    for python_version, version_environments in sorted(python_versions.items()):
+        write_output(f"  Python {python_version}: {len(version_environments)} ({format_size(sum(environment.size for environment in version_environments))})")
+    if environments:
+        least_recently_used = min(environments, key=lambda environment: environment.last_used)
+        write_output(f"Least recently used: {least_recently_used.env_hash} (last used {format_time(least_recently_used.last_used)})")
+    return 0
+
+
+def collect_garbage_if_due(config: BootstrapConfig) -> None:
+    """Automatic garbage collection at the end of a run, only if a budget is configured. Never fails the run."""
+    max_size, max_age = config.get_cache_budget()
+    if max_size is None and max_age is None:
+        return
+    try:
+        BootstrapCache(config.get_bootstrap_cache_dir()).collect_garbage_if_due(max_size, max_age)
+    except OSError as exc:
+        logger.warning(f"Garbage collection of the bootstrap cache failed: {exc}")
+
+
+def parse_arguments(args: Optional[List[str]] = None) -> "Namespace":
+    if not (sys.argv[1:] if args is None else args):
+        # Plain runs have no arguments: skip argparse, importing and building the parser takes longer than the up-to-date check
+        from types import SimpleNamespace
+
+        return SimpleNamespace(  # type: ignore[return-value]
+            trace=Path(trace) if (trace := os.environ.get(TRACE_FILE_ENV_VAR)) else None,
+            log_file=Path(log_file) if (log_file := os.environ.get(LOG_FILE_ENV_VAR)) else None,
+            workspace=None,
+            jobs=None,
+            check=False,
+            command=None,
+        )
+    return create_argument_parser().parse_args(args)
+
+
+def create_argument_parser() -> "ArgumentParser":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(prog="bootstrap.py", description="Create the bootstrap environment and the project virtual environment.")
+    parser.add_argument(
+        "--trace",
+        type=Path,
+        default=os.environ.get(TRACE_FILE_ENV_VAR) or None,
+        help=f"Write a Chrome trace-event (Perfetto) timeline of the run to this file. Can also be set with the {TRACE_FILE_ENV_VAR} environment variable.",
+    )
+    parser.add_argument(
+        "--log-file",
+        type=Path,
+        default=os.environ.get(LOG_FILE_ENV_VAR) or None,
+        help=f"Append the full output of all commands run by bootstrap to this file. Can also be set with the {LOG_FILE_ENV_VAR} environment variable.",
+    )
+    parser.add_argument(
+        "--workspace",
+        nargs="+",
+        metavar="PROJECT",
+        help="Bootstrap several projects in one run: project directories or glob patterns (e.g. 'packages/*'), relative to the current directory.",
+    )
+    parser.add_argument("--jobs", type=int, default=None, help="Number of projects installed in parallel in workspace mode (default: number of CPUs).")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Only report whether the environments are up to date, without creating or installing anything. "
+        + "Exit codes: "
+        + ", ".join(f"{status.check_exit_code} = {status.name}" for status in RunInfoStatus)
+        + ", 1 = error.",
+    )
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+    gc_parser = subparsers.add_parser(
+        "gc",
+        help="Remove the least recently used bootstrap environments from the cache directory.",
+        description="Remove the least recently used bootstrap environments until the cache directory fits the budget. "
+        + "Environments used or built by a running bootstrap are never removed. The budget defaults to the one configured in bootstrap.json.",
+    )
+    gc_parser.add_argument("--max-size", type=parse_size, default=None, help="Maximum total size of the bootstrap environments, e.g. 500M or 10G.")
+    gc_parser.add_argument("--max-age", type=float, default=None, metavar="DAYS", help="Remove bootstrap environments not used for more days.")
+    subparsers.add_parser("list", help="List the bootstrap environments in the cache directory, most recently used first.")
+    subparsers.add_parser("stats", help="Show statistics of the bootstrap cache directory.")
+    for subparser in subparsers.choices.values():
+        subparser.add_argument("--cache-dir", type=Path, default=None, help="The bootstrap cache directory (default: from bootstrap.json, or ~/.bootstrap).")
+    snapshot_parser = subparsers.add_parser(
+        "snapshot",
+        help="Export or import snapshots of the project environment.",
+        description="Snapshots are archives of project environments, keyed by the lock file, the Python interpreter, the platform and the package manager. "
+        + "A cold run restores the snapshot of its key from the snapshot directory (venv_snapshot_dir in bootstrap.json) instead of installing.",
+    )
+    snapshot_subparsers = snapshot_parser.add_subparsers(dest="snapshot_command", metavar="SNAPSHOT_COMMAND", required=True)
+    export_parser = snapshot_subparsers.add_parser("export", help="Archive the up-to-date project environment into the snapshot directory or a file.")
+    export_parser.add_argument("--output", type=Path, default=None, help="Write the archive to this file instead of the snapshot directory.")
+    import_parser = snapshot_subparsers.add_parser("import", help="Copy an exported archive into the snapshot directory.")
+    import_parser.add_argument("archive", type=Path, help="The archive written by 'snapshot export --output'.")
+    for subparser in snapshot_subparsers.choices.values():
+        subparser.add_argument("--snapshot-dir", type=Path, default=None, help="The snapshot directory (default: venv_snapshot_dir from bootstrap.json).")
+    return parser
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    arguments = parse_arguments(args)
+    if arguments.trace:
+        tracer.enable()
+    SubprocessExecutor.default_log_file = arguments.log_file
+    try:
+        with tracer.span("main"):
+            if arguments.workspace:
+                project_dirs = find_workspace_projects(arguments.workspace, Path.cwd())
+                if arguments.check:
+                    return check_workspace(project_dirs)
+                return bootstrap_workspace(project_dirs, arguments.jobs)
+
+            if arguments.command:
+                config = BootstrapConfig.from_json_file(Path.cwd() / "bootstrap.json")
+                if arguments.command == "snapshot":
+                    snapshot_dir = arguments.snapshot_dir or config.venv_snapshot_dir
+                    if arguments.snapshot_command == "export":
+                        return export_snapshot(Path.cwd(), arguments.output, snapshot_dir)
+                    return import_snapshot(arguments.archive, snapshot_dir)
+                cache_dir = arguments.cache_dir or config.get_bootstrap_cache_dir()
+                if arguments.command == "list":
+                    return list_environments(cache_dir)
+                if arguments.command == "stats":
+                    return print_cache_statistics(cache_dir)
+                max_size, max_age = config.get_cache_budget()
+                return collect_garbage(
+                    cache_dir,
+                    arguments.max_size if arguments.max_size is not None else max_size,
+                    arguments.max_age * 24 * 60 * 60 if arguments.max_age is not None else max_age,
+                )
+
+            stages = create_project_stages(Path.cwd())
+            if arguments.check:
+                return check_environments(stages)
+
+            bootstrap_env = next(runnable for runnable, _ in stages if isinstance(runnable, CreateBootstrapEnvironment))
+            with BootstrapCache(bootstrap_env.bootstrap_env_dir.parent).use(bootstrap_env.env_hash):
+                scheduler = Scheduler()
+                for runnable, executor in stages:
+                    scheduler.add(runnable, executor)
+                if scheduler.run():
+                    return 1
+                collect_garbage_if_due(bootstrap_env.config)
 
     except UserNotificationException as exc:
         logger.error(exc)
         return 1
+    finally:
+        if arguments.trace:
+            tracer.write(arguments.trace)
     return 0
 
 
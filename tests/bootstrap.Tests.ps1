@@ -183,7 +183,7 @@ Describe "Install-PythonEnvironment" {
         Install-PythonEnvironment
 
         Should -Invoke -CommandName Invoke-CommandLine -Exactly 1
-        Should -Invoke -CommandName Invoke-CommandLine -Exactly 1 -ParameterFilter { $CommandLine -like "python311 *\bootstrap.py" }
+        Should -Invoke -CommandName Invoke-CommandLine -Exactly 1 -ParameterFilter { $CommandLine -like "python311 -c *import bootstrap; sys.exit(bootstrap.main())*" }
         Should -Invoke -CommandName New-Item -Exactly 1
     }
 
@@ -194,8 +194,10 @@ Describe "Install-PythonEnvironment" {
         Install-PythonEnvironment
 
         Should -Invoke -CommandName Invoke-CommandLine -Exactly 1
-        Should -Invoke -CommandName Invoke-CommandLine -Exactly 1 -ParameterFilter { $CommandLine -like "python311 *\bootstrap.py" }
+        Should -Invoke -CommandName Invoke-CommandLine -Exactly 1 -ParameterFilter { $CommandLine -like "python311 -c *import bootstrap; sys.exit(bootstrap.main())*" }
         Should -Invoke -CommandName New-Item -Exactly 1
+        $env:BOOTSTRAP_SCRIPT_DIR | Should -Not -BeNullOrEmpty
+        $env:BOOTSTRAP_PYCACHE_DIR | Should -BeLike "*.bootstrap*pycache"
     }
 }
 
@@ -242,6 +244,32 @@ Describe "Install-Python" {
 }
 
 
+Describe "Get-BootstrapCacheDir" {
+    It "should default to .bootstrap in the home directory" {
+        # Act
+        $cache_dir = Get-BootstrapCacheDir -cacheDir ""
+
+        # Assert
+        $cache_dir | Should -Be (Join-Path $HOME ".bootstrap")
+    }
+
+    It "should expand ~ to the home directory" {
+        # Act
+        $cache_dir = Get-BootstrapCacheDir -cacheDir "~/.bootstrap-cache"
+
+        # Assert
+        $cache_dir | Should -Be (Join-Path $HOME ".bootstrap-cache")
+    }
+
+    It "should resolve relative paths in the project directory" {
+        # Act
+        $cache_dir = Get-BootstrapCacheDir -cacheDir "cache"
+
+        # Assert
+        $cache_dir | Should -Be (Join-Path (Get-Location).Path "cache")
+    }
+}
+
 Describe "Get-PythonExecutableName" {
     It "should only consider major and minor version" {
         # Act
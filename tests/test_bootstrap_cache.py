@@ -0,0 +1,264 @@
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+import pytest
+
+from bootstrap import BOOTSTRAP_COMPLETE_MARKER, BootstrapCache, BootstrapConfig, FileLock, UserNotificationException, main, parse_size
+
+DAY = 24 * 60 * 60
+
+
+def create_environment(cache_dir: Path, env_hash: str, size: int, days_unused: float) -> Path:
+    env_dir = cache_dir / env_hash
+    env_dir.mkdir(parents=True)
+    (env_dir / "payload").write_bytes(b"x" * size)
+    (env_dir / BOOTSTRAP_COMPLETE_MARKER).write_text(env_hash)
+    last_used = time.time() - days_unused * DAY
+    os.utime(env_dir / BOOTSTRAP_COMPLETE_MARKER, (last_used, last_used))
+    return env_dir
+
+
+@pytest.mark.parametrize(
+    "size, expected",
+    [("1024", 1024), ("500M", 500 * 1024**2), ("1.5g", int(1.5 * 1024**3)), ("10GiB", 10 * 1024**3), ("2 KB", 2048)],
+)
+def test_parse_size(size: str, expected: int) -> None:
+    assert parse_size(size) == expected
+
+
+def test_parse_size_rejects_invalid_sizes() -> None:
+    with pytest.raises(ValueError, match="Invalid size"):
+        parse_size("ten gigabytes")
+
+
+def test_gc_evicts_least_recently_used_environments_over_max_size(tmp_path: Path) -> None:
+    # Arrange
+    cache = BootstrapCache(tmp_path)
+    oldest = create_environment(tmp_path, "aaaaaaaaaaaa", 1000, days_unused=3)
+    older = create_environment(tmp_path, "bbbbbbbbbbbb", 1000, days_unused=2)
+    recent = create_environment(tmp_path, "cccccccccccc", 1000, days_unused=1)
+    (tmp_path / "wheelhouse").mkdir()
+
+    # Act
+    evicted = cache.collect_garbage(max_size=2500)
+
+    # Assert
+    assert [environment.path for environment in evicted] == [oldest]
+    assert not oldest.exists()
+    assert older.exists() and recent.exists()
+    assert (tmp_path / "wheelhouse").exists()
+
+
+def test_gc_evicts_environments_older_than_max_age(tmp_path: Path) -> None:
+    # Arrange
+    cache = BootstrapCache(tmp_path)
+    unused = create_environment(tmp_path, "aaaaaaaaaaaa", 10, days_unused=40)
+    used = create_environment(tmp_path, "bbbbbbbbbbbb", 10, days_unused=40)
+    with cache.use("bbbbbbbbbbbb"):
+        pass
+
+    # Act
+    cache.collect_garbage(max_age=30 * DAY)
+
+    # Assert
+    assert not unused.exists()
+    assert used.exists()
+
+
+def test_gc_keeps_environments_in_use_or_being_built(tmp_path: Path) -> None:
+    # Arrange
+    cache = BootstrapCache(tmp_path)
+    leased = create_environment(tmp_path, "aaaaaaaaaaaa", 1000, days_unused=10)
+    building = create_environment(tmp_path, "bbbbbbbbbbbb", 1000, days_unused=10)
+    free = create_environment(tmp_path, "cccccccccccc", 1000, days_unused=10)
+
+    # Act
+    with cache.use("aaaaaaaaaaaa"), cache.get_build_lock("bbbbbbbbbbbb"):
+        evicted = cache.collect_garbage(max_size=0)
+
+    # Assert
+    assert [environment.path for environment in evicted] == [free]
+    assert leased.exists() and building.exists()
+    assert list(tmp_path.glob("*.use-*.lock")) == []
+
+
+def test_gc_removes_leases_of_dead_processes(tmp_path: Path) -> None:
+    # Arrange
+    cache = BootstrapCache(tmp_path)
+    env_dir = create_environment(tmp_path, "aaaaaaaaaaaa", 10, days_unused=10)
+    stale_lease = tmp_path / "aaaaaaaaaaaa.use-99999.lock"
+    stale_lease.touch()
+    held_lease = FileLock(tmp_path / "aaaaaaaaaaaa.use-12345.lock")
+    held_lease.acquire()
+
+    # Act
+    try:
+        in_use = cache.is_in_use("aaaaaaaaaaaa")
+        cache.collect_garbage(max_size=0)
+    finally:
+        held_lease.release()
+
+    # Assert
+    assert in_use
+    assert not stale_lease.exists()
+    assert env_dir.exists()
+
+
+def test_automatic_gc_is_rate_limited(tmp_path: Path) -> None:
+    # Arrange
+    cache = BootstrapCache(tmp_path)
+    create_environment(tmp_path, "aaaaaaaaaaaa", 10, days_unused=10)
+
+    # Act
+    first = cache.collect_garbage_if_due(max_age=DAY)
+    create_environment(tmp_path, "bbbbbbbbbbbb", 10, days_unused=10)
+    second = cache.collect_garbage_if_due(max_age=DAY)
+
+    # Assert
+    assert [environment.env_hash for environment in first] == ["aaaaaaaaaaaa"]
+    assert second == []
+    assert (tmp_path / "bbbbbbbbbbbb").exists()
+
+
+def test_gc_command_uses_budget_from_bootstrap_json(tmp_path: Path, project_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    # Arrange
+    cache_dir = tmp_path / "cache"
+    (project_dir / "bootstrap.json").write_text(json.dumps({"bootstrap_cache_dir": str(cache_dir), "bootstrap_cache_max_age_days": 7}))
+    old = create_environment(cache_dir, "aaaaaaaaaaaa", 10, days_unused=8)
+    recent = create_environment(cache_dir, "bbbbbbbbbbbb", 10, days_unused=6)
+    monkeypatch.chdir(project_dir)
+
+    # Act
+    exit_code = main(["gc"])
+
+    # Assert
+    assert exit_code == 0
+    assert not old.exists()
+    assert recent.exists()
+
+
+def test_gc_command_requires_a_budget(tmp_path: Path, project_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    # Arrange
+    monkeypatch.chdir(project_dir)
+
+    # Act
+    exit_code = main(["gc", "--cache-dir", str(tmp_path / "cache")])
+
+    # Assert
+    assert exit_code == 1
+
+
+def test_invalid_configured_max_size() -> None:
+    with pytest.raises(UserNotificationException, match="bootstrap_cache_max_size"):
+        BootstrapConfig(bootstrap_cache_max_size="lots").get_cache_budget()
+
+
+def create_registered_environment(cache_dir: Path, env_hash: str, python_version: str) -> Path:
+    env_dir = create_environment(cache_dir, env_hash, 100, days_unused=0)
+    (env_dir / ".venv" / "lib" / f"python{python_version}" / "site-packages" / "poetry-2.1.3.dist-info").mkdir(parents=True)
+    (env_dir / ".venv" / "lib" / f"python{python_version}" / "site-packages" / "Pip_System.Certs-4.0.dist-info").mkdir(parents=True)
+    (env_dir / ".venv" / "pyvenv.cfg").write_text(f"home = /usr/bin\nversion_info = {python_version}.7\n")
+    BootstrapCache(cache_dir).register(env_hash, "poetry>=2.0")
+    return env_dir
+
+
+def test_registry_records_environment(tmp_path: Path) -> None:
+    # Act
+    create_registered_environment(tmp_path, "aaaaaaaaaaaa", "3.11")
+
+    # Assert
+    environment = BootstrapCache(tmp_path).get_environment("aaaaaaaaaaaa")
+    assert environment is not None
+    assert environment.python_version == "3.11.7"
+    assert environment.package_manager == "poetry>=2.0"
+    assert environment.packages == {"pip-system-certs": "4.0", "poetry": "2.1.3"}
+    assert environment.get_package_manager_version() == "2.1.3"
+    assert environment.size >= 100
+    assert environment.created == environment.last_used
+
+
+def test_registry_is_read_instead_of_walking_environments(tmp_path: Path) -> None:
+    # Arrange
+    env_dir = create_registered_environment(tmp_path, "aaaaaaaaaaaa", "3.11")
+    (env_dir / "payload").write_bytes(b"x" * 5000)
+
+    # Act
+    environments = BootstrapCache(tmp_path).get_environments()
+
+    # Assert
+    assert [environment.env_hash for environment in environments] == ["aaaaaaaaaaaa"]
+    assert environments[0].size < 5000
+
+
+def test_use_does_not_touch_the_registry(tmp_path: Path) -> None:
+    # Arrange
+    cache = BootstrapCache(tmp_path)
+    create_registered_environment(tmp_path, "aaaaaaaaaaaa", "3.11")
+    registry = cache.registry_file.read_text()
+    os.utime(cache.registry_file, (0, 0))
+
+    # Act
+    with cache.use("aaaaaaaaaaaa"):
+        pass
+
+    # Assert
+    assert cache.registry_file.read_text() == registry
+    assert cache.registry_file.stat().st_mtime == 0
+    assert (tmp_path / "aaaaaaaaaaaa" / BootstrapCache.LAST_USED_FILE).exists()
+
+
+def test_last_use_is_taken_over_into_the_registry(tmp_path: Path) -> None:
+    # Arrange
+    cache = BootstrapCache(tmp_path)
+    env_dir = create_registered_environment(tmp_path, "aaaaaaaaaaaa", "3.11")
+    environment = cache.get_environment("aaaaaaaaaaaa")
+    assert environment is not None
+    last_used = environment.last_used + DAY
+    (env_dir / BootstrapCache.LAST_USED_FILE).touch()
+    os.utime(env_dir / BootstrapCache.LAST_USED_FILE, (last_used, last_used))
+
+    # Act
+    environments = cache.get_environments()
+
+    # Assert
+    assert environments[0].last_used == last_used
+    registered = cache.get_environment("aaaaaaaaaaaa")
+    assert registered is not None
+    assert registered.last_used == last_used
+    assert registered.created == environment.created
+
+
+def test_registry_is_synchronized_with_cache_directory(tmp_path: Path) -> None:
+    # Arrange
+    cache = BootstrapCache(tmp_path)
+    removed = create_registered_environment(tmp_path, "aaaaaaaaaaaa", "3.11")
+    create_environment(tmp_path, "bbbbbbbbbbbb", 10, days_unused=5)
+    shutil.rmtree(removed)
+
+    # Act
+    environments = cache.sync_registry()
+
+    # Assert
+    assert sorted(environments) == ["bbbbbbbbbbbb"]
+    assert sorted(cache.read_registry()) == ["bbbbbbbbbbbb"]
+
+
+def test_list_and_stats_commands(tmp_path: Path, project_dir: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]) -> None:
+    # Arrange
+    create_registered_environment(tmp_path / "cache", "aaaaaaaaaaaa", "3.11")
+    create_registered_environment(tmp_path / "cache", "bbbbbbbbbbbb", "3.12")
+    monkeypatch.chdir(project_dir)
+
+    # Act
+    list_exit_code = main(["list", "--cache-dir", str(tmp_path / "cache")])
+    stats_exit_code = main(["stats", "--cache-dir", str(tmp_path / "cache")])
+
+    # Assert
+    output = capsys.readouterr().out
+    assert list_exit_code == stats_exit_code == 0
+    assert "aaaaaaaaaaaa  Python 3.11.7  poetry>=2.0 (2.1.3)" in output
+    assert "Environments: 2" in output
+    assert "  Python 3.12: 1" in output
@@ -1,6 +1,8 @@
 import json
+import sys
 from pathlib import Path
-from typing import Any
+from typing import Any, List, Optional
+from unittest.mock import Mock, call, patch
 
 import pytest
 
@@ -8,11 +10,14 @@ from bootstrap import (
     BOOTSTRAP_COMPLETE_MARKER,
     DEFAULT_BOOTSTRAP_PACKAGES,
     DEFAULT_PACKAGE_MANAGER,
+    BootstrapCache,
     BootstrapConfig,
     CreateBootstrapEnvironment,
     CreateVirtualEnvironment,
     UserNotificationException,
     extract_package_manager_name,
+    instantiate_os_specific_venv,
+    relocate_virtual_environment,
 )
 
 
@@ -27,6 +32,8 @@ def test_bootstrap_config_defaults():
     assert config.bootstrap_packages == list(DEFAULT_BOOTSTRAP_PACKAGES)
     assert config.bootstrap_cache_dir is None
     assert config.venv_install_command is None
+    assert config.bootstrap_wheelhouse is False
+    assert config.venv_drift_check == "off"
 
 
 def test_bootstrap_config_from_json_file(tmp_path: Path):
@@ -260,6 +267,10 @@ def test_create_virtual_environment_with_bootstrap_env(bootstrap_env: CreateBoot
             {"package_manager": "poetry==2.1.0", "venv_install_command": "poetry install --no-interaction --no-dev"},
             ["poetry", "install", "--no-interaction", "--no-dev"],
         ),
+        (
+            {"package_manager": "poetry==2.1.0", "venv_install_command": 'poetry install --directory "my project"'},
+            ["poetry", "install", "--directory", "my project"],
+        ),
         (
             {"package_manager": "pipenv", "package_manager_args": ["--clean"]},
             ["pipenv", "install", "--clean"],
@@ -297,3 +308,159 @@ def test_create_virtual_environment_inputs_include_bootstrap_marker(bootstrap_en
 
     # Assert
     assert any(str(bootstrap_env.marker_file) in str(inp) for inp in inputs)
+
+
+def test_create_virtual_environment_depends_on_bootstrap_env(bootstrap_env: CreateBootstrapEnvironment, project_dir: Path):
+    # Act
+    project_venv = CreateVirtualEnvironment(project_dir, bootstrap_env)
+
+    # Assert
+    assert project_venv.get_dependencies() == [bootstrap_env]
+    assert bootstrap_env.get_dependencies() == []
+
+
+def _fake_build_environment(bootstrap_env: CreateBootstrapEnvironment, calls: List[Path]):
+    def build(env_dir: Path, uv_executable: Optional[Path] = None) -> None:
+        calls.append(env_dir)
+        venv_dir = env_dir / ".venv"
+        staged_venv = instantiate_os_specific_venv(venv_dir)
+        staged_venv.scripts_path().mkdir(parents=True)
+        staged_venv.pip_path().write_text(f"#!{staged_venv.python_path()}\n")
+        (venv_dir / "pyvenv.cfg").write_text(f"command = python -m venv {venv_dir}\n")
+        relocate_virtual_environment(venv_dir, bootstrap_env.venv_dir)
+        (env_dir / BOOTSTRAP_COMPLETE_MARKER).write_text(bootstrap_env.env_hash)
+
+    return build
+
+
+def test_create_bootstrap_environment_publishes_staged_environment(bootstrap_env: CreateBootstrapEnvironment):
+    # Arrange - an invalid leftover environment
+    bootstrap_env.bootstrap_env_dir.mkdir(parents=True)
+    (bootstrap_env.bootstrap_env_dir / "leftover").write_text("leftover")
+    calls: List[Path] = []
+
+    # Act
+    with patch.object(bootstrap_env, "_build_environment", side_effect=_fake_build_environment(bootstrap_env, calls)):
+        bootstrap_env.run()
+
+    # Assert
+    assert len(calls) == 1
+    assert calls[0] != bootstrap_env.bootstrap_env_dir
+    assert not calls[0].exists()
+    assert bootstrap_env._is_valid_environment()
+    assert not (bootstrap_env.bootstrap_env_dir / "leftover").exists()
+    assert bootstrap_env.virtual_env.pip_path().read_text() == f"#!{bootstrap_env.virtual_env.python_path()}\n"
+    assert sorted(path.name for path in bootstrap_env.bootstrap_env_dir.parent.iterdir()) == sorted([bootstrap_env.env_hash, f"{bootstrap_env.env_hash}.lock", "registry.json", "registry.lock"])
+    assert BootstrapCache(bootstrap_env.bootstrap_env_dir.parent).get_environment(bootstrap_env.env_hash) is not None
+
+
+def test_create_bootstrap_environment_reuses_environment_built_concurrently(bootstrap_env: CreateBootstrapEnvironment, project_dir: Path):
+    # Arrange - another process published the environment while this one was waiting
+    calls: List[Path] = []
+    with patch.object(bootstrap_env, "_build_environment", side_effect=_fake_build_environment(bootstrap_env, calls)):
+        bootstrap_env.run()
+    other_bootstrap_env = CreateBootstrapEnvironment(bootstrap_env.config, project_dir)
+
+    # Act
+    with patch.object(other_bootstrap_env, "_build_environment", side_effect=AssertionError("must not build again")):
+        other_bootstrap_env.run()
+
+    # Assert
+    assert len(calls) == 1
+
+
+def test_create_bootstrap_environment_failure_removes_staging(bootstrap_env: CreateBootstrapEnvironment):
+    # Arrange
+    def fail(env_dir: Path, uv_executable: Optional[Path] = None) -> None:
+        env_dir.mkdir(parents=True)
+        raise RuntimeError("pip failed")
+
+    # Act
+    with patch.object(bootstrap_env, "_build_environment", side_effect=fail), pytest.raises(UserNotificationException, match="pip failed"):
+        bootstrap_env.run()
+
+    # Assert
+    assert [path.name for path in bootstrap_env.bootstrap_env_dir.parent.iterdir()] == [f"{bootstrap_env.env_hash}.lock"]
+
+
+def test_relocate_virtual_environment(tmp_path: Path):
+    # Arrange
+    venv_dir = tmp_path / "staging" / ".venv"
+    target_venv_dir = tmp_path / "final" / ".venv"
+    staged_venv = instantiate_os_specific_venv(venv_dir)
+    staged_venv.scripts_path().mkdir(parents=True)
+    (staged_venv.scripts_path() / "tool").write_bytes(b"#!" + str(staged_venv.python_path()).encode() + b"\nimport tool\n")
+    (venv_dir / "pyvenv.cfg").write_text(f"home = /usr/bin\ncommand = /usr/bin/python -m venv {venv_dir}\n")
+
+    # Act
+    relocate_virtual_environment(venv_dir, target_venv_dir)
+
+    # Assert
+    target_venv = instantiate_os_specific_venv(target_venv_dir)
+    assert (staged_venv.scripts_path() / "tool").read_bytes() == b"#!" + str(target_venv.python_path()).encode() + b"\nimport tool\n"
+    assert (venv_dir / "pyvenv.cfg").read_text() == f"home = /usr/bin\ncommand = /usr/bin/python -m venv {target_venv_dir}\n"
+
+
+def test_install_from_wheelhouse_offline_when_satisfied(bootstrap_env: CreateBootstrapEnvironment):
+    # Arrange
+    wheelhouse_dir = bootstrap_env.config.get_wheelhouse_dir()
+    wheelhouse_dir.mkdir(parents=True)
+    bootstrap_venv = Mock()
+
+    # Act
+    bootstrap_env._install_from_wheelhouse(bootstrap_venv, ["poetry>=2.1.0"], [])
+
+    # Assert
+    bootstrap_venv.pip.assert_called_once_with(["install", "--no-index", "--find-links", wheelhouse_dir.as_posix(), "poetry>=2.1.0"], timeout=None)
+
+
+def test_install_from_wheelhouse_fetches_missing_wheels(bootstrap_env: CreateBootstrapEnvironment):
+    # Arrange
+    wheelhouse_dir = bootstrap_env.config.get_wheelhouse_dir()
+    wheelhouse_dir.mkdir(parents=True)
+    bootstrap_venv = Mock()
+    bootstrap_venv.pip.side_effect = [UserNotificationException("No matching distribution found"), None, None]
+
+    # Act
+    bootstrap_env._install_from_wheelhouse(bootstrap_venv, ["poetry>=2.1.0"], ["--trusted-host", "pypi.org"])
+
+    # Assert
+    offline_install = call(["install", "--no-index", "--find-links", wheelhouse_dir.as_posix(), "poetry>=2.1.0"], timeout=None)
+    fetch = call(["wheel", "--wheel-dir", wheelhouse_dir.as_posix(), "--find-links", wheelhouse_dir.as_posix(), "poetry>=2.1.0", "--trusted-host", "pypi.org"], timeout=None)
+    assert bootstrap_venv.pip.call_args_list == [offline_install, fetch, offline_install]
+
+
+def test_find_uv_executable_in_cache(bootstrap_env: CreateBootstrapEnvironment):
+    # Arrange
+    cached_uv = bootstrap_env.config.get_bootstrap_cache_dir() / "bin" / ("uv.exe" if sys.platform.startswith("win32") else "uv")
+    cached_uv.parent.mkdir(parents=True)
+    cached_uv.write_text("")
+
+    # Act & Assert
+    with patch("shutil.which", return_value=None):
+        assert bootstrap_env._find_uv_executable() == cached_uv
+    with patch("shutil.which", return_value="/usr/local/bin/uv"):
+        assert bootstrap_env._find_uv_executable() == Path("/usr/local/bin/uv")
+
+
+def test_build_environment_with_uv(bootstrap_env: CreateBootstrapEnvironment, tmp_path: Path):
+    # Arrange
+    env_dir = tmp_path / "staging"
+    uv_executable = tmp_path / "uv"
+    staged_venv = instantiate_os_specific_venv(env_dir / ".venv")
+
+    def create_venv(*args: Any, **kwargs: Any) -> Mock:
+        staged_venv.venv_dir.mkdir(parents=True, exist_ok=True)
+        return Mock()
+
+    # Act
+    with patch("bootstrap.SubprocessExecutor", side_effect=create_venv) as executor_mock:
+        bootstrap_env._build_environment(env_dir, uv_executable)
+
+    # Assert
+    commands = [call_args.args[0] for call_args in executor_mock.call_args_list]
+    assert commands == [
+        [uv_executable, "venv", "--seed", "--python", sys.executable, staged_venv.venv_dir],
+        [uv_executable, "pip", "install", "--python", staged_venv.python_path(), bootstrap_env.config.package_manager, *bootstrap_env.config.bootstrap_packages],
+    ]
+    assert (env_dir / BOOTSTRAP_COMPLETE_MARKER).read_text() == bootstrap_env.env_hash
@@ -0,0 +1,66 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from bootstrap import BootstrapConfig, CreateBootstrapEnvironment, CreateVirtualEnvironment, Executor, RunInfoStatus, main
+
+
+@pytest.fixture
+def checked_project(tmp_path: Path, project_dir: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    (project_dir / "bootstrap.json").write_text(json.dumps({"bootstrap_cache_dir": str(tmp_path / "cache")}))
+    (project_dir / "pyproject.toml").write_text('[tool.poetry]\nname = "project"\n')
+    monkeypatch.chdir(project_dir)
+    return project_dir
+
+
+def store_run_infos(project_dir: Path) -> CreateVirtualEnvironment:
+    """Record run infos as if both stages had run successfully."""
+    bootstrap_env = CreateBootstrapEnvironment(BootstrapConfig.from_json_file(project_dir / "bootstrap.json"), project_dir)
+    bootstrap_env.marker_file.parent.mkdir(parents=True)
+    bootstrap_env.marker_file.write_text(bootstrap_env.env_hash)
+    Executor(bootstrap_env.bootstrap_env_dir).store_run_info(bootstrap_env)
+    project_venv = CreateVirtualEnvironment(project_dir, bootstrap_env)
+    Executor(project_venv.venv_dir).store_run_info(project_venv)
+    return project_venv
+
+
+def test_check_without_run_info_has_no_side_effects(tmp_path: Path, checked_project: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    # Act
+    exit_code = main(["--check"])
+
+    # Assert
+    assert exit_code == RunInfoStatus.NO_INFO.check_exit_code
+    assert "create-bootstrap-environment: NO_INFO" in capsys.readouterr().out
+    assert not (tmp_path / "cache").exists()
+    assert not (checked_project / ".venv").exists()
+
+
+def test_check_reports_up_to_date_environments(checked_project: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    # Arrange
+    project_venv = store_run_infos(checked_project)
+
+    # Act
+    exit_code = main(["--check"])
+
+    # Assert
+    output = capsys.readouterr().out
+    assert exit_code == RunInfoStatus.MATCH.check_exit_code
+    assert "create-virtual-environment: MATCH" in output
+    assert f"Package manager: {project_venv.bootstrap_env.virtual_env.scripts_path() / 'poetry'}" in output
+    assert f"Project tools: {project_venv.virtual_env.scripts_path()}" in output
+
+
+def test_check_reports_changed_input(checked_project: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    # Arrange
+    store_run_infos(checked_project)
+    run_info_files = sorted(path.stat().st_mtime_ns for path in checked_project.parent.rglob("*.deps.json"))
+
+    # Act
+    (checked_project / "pyproject.toml").write_text('[tool.poetry]\nname = "changed"\n')
+    exit_code = main(["--check"])
+
+    # Assert
+    assert exit_code == RunInfoStatus.FILE_CHANGED.check_exit_code
+    assert f"changed: {checked_project / 'pyproject.toml'}" in capsys.readouterr().out
+    assert sorted(path.stat().st_mtime_ns for path in checked_project.parent.rglob("*.deps.json")) == run_info_files
@@ -1,14 +1,22 @@
+import subprocess
 import sys
 from pathlib import Path
+from typing import Optional
 from unittest.mock import patch
 
 import pytest
 
 from bootstrap import (
     VENV_PYTHON_VERSION_MARKER,
+    BootstrapConfig,
     CreateBootstrapEnvironment,
     CreateVirtualEnvironment,
+    Executor,
+    VirtualEnvironment,
+    VirtualEnvironmentTemplate,
     instantiate_os_specific_venv,
+    is_directory_link,
+    replace_directory_link,
 )
 
 
@@ -203,3 +211,96 @@ def test_venv_preserved_when_python_version_matches(tmp_path: Path, bootstrap_en
     assert venv_dir.exists()
     assert dummy_file.exists()
     assert marker_file.read_text().strip() == current_version
+
+
+def test_create_from_template(tmp_path: Path) -> None:
+    # Arrange
+    template = VirtualEnvironmentTemplate(tmp_path / ".bootstrap")
+    first_venv = instantiate_os_specific_venv(tmp_path / "first" / ".venv")
+    second_venv = instantiate_os_specific_venv(tmp_path / "second" / ".venv")
+
+    # Act
+    first_venv.create(template)
+    second_venv.create(template)
+
+    # Assert
+    assert template.is_valid()
+    for my_venv in [first_venv, second_venv]:
+        assert (my_venv.venv_dir / ".gitignore").exists()
+        assert str(my_venv.python_path()) in my_venv.pip_path().read_text(errors="replace")
+        assert str(template.venv_dir) not in (my_venv.venv_dir / "pyvenv.cfg").read_text()
+        result = subprocess.run([str(my_venv.python_path()), "-c", "import pip, sys; print(sys.prefix)"], capture_output=True, text=True, check=True)
+        assert Path(result.stdout.strip()) == my_venv.venv_dir
+
+
+@pytest.fixture
+def versioned_bootstrap_env(tmp_path: Path, project_dir: Path) -> CreateBootstrapEnvironment:
+    return CreateBootstrapEnvironment(BootstrapConfig(bootstrap_cache_dir=tmp_path / ".bootstrap", venv_per_python_version=True), project_dir)
+
+
+def fake_create(virtual_env: VirtualEnvironment, template: Optional[VirtualEnvironmentTemplate] = None) -> None:
+    virtual_env.venv_dir.mkdir(parents=True)
+    (virtual_env.venv_dir / "pyvenv.cfg").write_text(f"command = python -m venv {virtual_env.venv_dir}\n")
+
+
+def test_venv_per_python_version_links_venv_to_active_version(project_dir: Path, versioned_bootstrap_env: CreateBootstrapEnvironment) -> None:
+    # Arrange
+    creator = CreateVirtualEnvironment(project_dir, versioned_bootstrap_env)
+
+    # Act
+    with patch.object(VirtualEnvironment, "create", autospec=True, side_effect=fake_create), patch.object(versioned_bootstrap_env.virtual_env, "run"):
+        creator.run()
+
+    # Assert
+    assert creator.venv_dir == project_dir / f".venv-{sys.version_info.major}.{sys.version_info.minor}"
+    assert is_directory_link(project_dir / ".venv")
+    assert (project_dir / ".venv").resolve() == creator.venv_dir.resolve()
+    assert (creator.venv_dir / VENV_PYTHON_VERSION_MARKER).exists()
+
+
+def test_venv_per_python_version_switches_up_to_date_venv_without_install(project_dir: Path, versioned_bootstrap_env: CreateBootstrapEnvironment) -> None:
+    # Arrange - the environment of the running Python was built before, .venv points to another version
+    creator = CreateVirtualEnvironment(project_dir, versioned_bootstrap_env)
+    with patch.object(VirtualEnvironment, "create", autospec=True, side_effect=fake_create), patch.object(versioned_bootstrap_env.virtual_env, "run"):
+        Executor(creator.venv_dir).execute(creator)
+    other_venv_dir = project_dir / ".venv-3.0"
+    other_venv_dir.mkdir()
+    replace_directory_link(project_dir / ".venv", other_venv_dir)
+
+    # Act
+    with patch.object(versioned_bootstrap_env.virtual_env, "run") as package_manager_run:
+        Executor(creator.venv_dir).execute(creator)
+
+    # Assert
+    package_manager_run.assert_not_called()
+    assert (project_dir / ".venv").resolve() == creator.venv_dir.resolve()
+    assert other_venv_dir.is_dir()
+
+
+def test_venv_per_python_version_migrates_legacy_venv(project_dir: Path, versioned_bootstrap_env: CreateBootstrapEnvironment) -> None:
+    # Arrange
+    legacy_venv_dir = project_dir / ".venv"
+    legacy_venv_dir.mkdir()
+    (legacy_venv_dir / VENV_PYTHON_VERSION_MARKER).write_text("3.0.1")
+    (legacy_venv_dir / "pyvenv.cfg").write_text(f"command = python -m venv {legacy_venv_dir}\n")
+    creator = CreateVirtualEnvironment(project_dir, versioned_bootstrap_env)
+
+    # Act
+    creator.skip()
+
+    # Assert
+    assert (project_dir / ".venv-3.0" / "pyvenv.cfg").read_text() == f"command = python -m venv {project_dir / '.venv-3.0'}\n"
+    assert is_directory_link(project_dir / ".venv")
+    assert (project_dir / ".venv").resolve() == creator.venv_dir.resolve()
+
+
+def test_venv_per_python_version_uv_project_environment(project_dir: Path, tmp_path: Path) -> None:
+    # Arrange
+    config = BootstrapConfig(bootstrap_cache_dir=tmp_path / ".bootstrap", package_manager="uv", venv_per_python_version=True)
+    creator = CreateVirtualEnvironment(project_dir, CreateBootstrapEnvironment(config, project_dir))
+
+    # Act
+    env = creator.get_environment()
+
+    # Assert
+    assert env["UV_PROJECT_ENVIRONMENT"] == str(creator.venv_dir)
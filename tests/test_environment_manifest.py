@@ -0,0 +1,97 @@
+import base64
+import hashlib
+from pathlib import Path
+
+import pytest
+
+from bootstrap import BootstrapConfig, CreateBootstrapEnvironment, CreateVirtualEnvironment, EnvironmentManifest, Executor, RunInfoStatus
+
+
+def install_distribution(venv_dir: Path, name: str, version: str, files: dict) -> Path:
+    """Install a distribution as an installer would: its files and a dist-info directory with a RECORD."""
+    site_packages = venv_dir / "lib" / "python3.11" / "site-packages"
+    dist_info = site_packages / f"{name}-{version}.dist-info"
+    dist_info.mkdir(parents=True)
+    (dist_info / "entry_points.txt").write_text(f"[console_scripts]\n{name}-cli = {name}:main\n\n[other]\nplugin = {name}:plugin\n")
+    record_lines = []
+    for file_name, content in files.items():
+        (site_packages / file_name).parent.mkdir(parents=True, exist_ok=True)
+        (site_packages / file_name).write_text(content)
+        digest = base64.urlsafe_b64encode(hashlib.sha256(content.encode()).digest()).rstrip(b"=").decode()
+        record_lines.append(f"{file_name},sha256={digest},{len(content)}")
+    record_lines.append(f"{dist_info.name}/RECORD,,")
+    (dist_info / "RECORD").write_text("\n".join(record_lines) + "\n")
+    return dist_info
+
+
+@pytest.fixture
+def venv_dir(tmp_path: Path) -> Path:
+    venv_dir = tmp_path / ".venv"
+    install_distribution(venv_dir, "requests", "2.31.0", {"requests/__init__.py": "# requests\n"})
+    install_distribution(venv_dir, "certifi", "2024.2.2", {"certifi/__init__.py": "# certifi\n"})
+    return venv_dir
+
+
+def test_manifest_lists_installed_distributions(venv_dir: Path) -> None:
+    # Act
+    EnvironmentManifest.create(venv_dir).write(venv_dir)
+
+    # Assert
+    manifest = EnvironmentManifest.read(venv_dir)
+    assert manifest is not None
+    assert sorted(manifest.distributions) == ["certifi", "requests"]
+    requests = manifest.distributions["requests"]
+    assert requests["version"] == "2.31.0"
+    assert requests["dist_info"] == "lib/python3.11/site-packages/requests-2.31.0.dist-info"
+    assert requests["entry_points"] == ["requests-cli"]
+    assert requests["record_digest"] == Executor.get_file_hash(venv_dir / requests["dist_info"] / "RECORD")
+
+
+def test_check_finds_drift(venv_dir: Path) -> None:
+    # Arrange
+    manifest = EnvironmentManifest.create(venv_dir)
+    site_packages = venv_dir / "lib" / "python3.11" / "site-packages"
+
+    # Act
+    install_distribution(venv_dir, "idna", "3.7", {"idna/__init__.py": "# idna\n"})
+    (site_packages / "certifi-2024.2.2.dist-info").rename(site_packages / "certifi-2024.7.4.dist-info")
+    (site_packages / "requests-2.31.0.dist-info" / "RECORD").write_text("requests/__init__.py,,\n")
+    drift = manifest.check(venv_dir)
+
+    # Assert
+    assert drift == ["certifi 2024.2.2 was replaced by 2024.7.4", "idna was installed", "requests 2.31.0 was reinstalled"]
+
+
+def test_verify_records_finds_modified_files(venv_dir: Path) -> None:
+    # Arrange
+    manifest = EnvironmentManifest.create(venv_dir)
+    intact = manifest.verify_records(venv_dir)
+
+    # Act
+    (venv_dir / "lib" / "python3.11" / "site-packages" / "requests" / "__init__.py").write_text("# patched by hand\n")
+    modified = manifest.verify_records(venv_dir)
+
+    # Assert
+    assert intact == []
+    assert modified == ["requests 2.31.0 has missing or modified files"]
+
+
+@pytest.mark.parametrize("drift_check, expected_status", [("stat", RunInfoStatus.ENVIRONMENT_DRIFT), ("off", RunInfoStatus.MATCH)])
+def test_drift_marks_the_stage_stale(project_dir: Path, tmp_path: Path, drift_check: str, expected_status: RunInfoStatus) -> None:
+    # Arrange
+    config = BootstrapConfig(bootstrap_cache_dir=tmp_path / "cache", venv_drift_check=drift_check)
+    project_venv = CreateVirtualEnvironment(project_dir, CreateBootstrapEnvironment(config, project_dir))
+    install_distribution(project_venv.venv_dir, "requests", "2.31.0", {"requests/__init__.py": "# requests\n"})
+    project_venv._write_manifest()
+    executor = Executor(project_venv.venv_dir)
+    executor.store_run_info(project_venv)
+    up_to_date = executor.check_run_info(project_venv)
+
+    # Act
+    install_distribution(project_venv.venv_dir, "six", "1.16.0", {"six.py": "# six\n"})
+    run_info_check = executor.check_run_info(project_venv)
+
+    # Assert
+    assert up_to_date.status == RunInfoStatus.MATCH
+    assert run_info_check.status == expected_status
+    assert run_info_check.changes == (["six was installed"] if drift_check == "stat" else [])
@@ -1,9 +1,14 @@
 import hashlib
+import json
+import os
+import shutil
 from pathlib import Path
+from typing import List
+from unittest.mock import patch
 
 import pytest
 
-from bootstrap import Executor
+from bootstrap import DirectoryFingerprint, Executor, RunInfoCheck, RunInfoStatus, Runnable, UserNotificationException
 
 
 @pytest.mark.parametrize(
@@ -34,3 +39,271 @@ def test_get_file_hash(tmp_path: Path, file_content: str):
 
     # check result
     assert file_hash == hashlib.sha256(file_content.encode()).hexdigest()
+
+
+class _FileRunnable(Runnable):
+    def __init__(self, inputs: List[Path], outputs: List[Path]) -> None:
+        self.inputs = inputs
+        self.outputs = outputs
+
+    def run(self) -> int:
+        return 0
+
+    def get_name(self) -> str:
+        return "file-runnable"
+
+    def get_inputs(self) -> List[Path]:
+        return self.inputs
+
+    def get_outputs(self) -> List[Path]:
+        return self.outputs
+
+
+def test_store_run_info_records_file_stats(tmp_path: Path):
+    # Arrange
+    input_file = tmp_path / "input.txt"
+    input_file.write_text("content")
+    missing_file = tmp_path / "missing.txt"
+    executor = Executor(tmp_path / "cache")
+    runnable = _FileRunnable([input_file, missing_file], [])
+
+    # Act
+    executor.store_run_info(runnable)
+
+    # Assert
+    run_info = json.loads(executor.get_runnable_run_info_file(runnable).read_text())
+    file_stat = input_file.stat()
+    assert run_info["stats"] == {str(input_file): [file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino]}
+    assert run_info["inputs"][str(missing_file)] == ""
+
+
+def test_previous_run_info_matches_skips_hashing_unchanged_files(tmp_path: Path):
+    # Arrange
+    input_file = tmp_path / "input.txt"
+    input_file.write_text("content")
+    executor = Executor(tmp_path / "cache")
+    runnable = _FileRunnable([input_file], [])
+    executor.store_run_info(runnable)
+
+    # Act
+    with patch.object(Executor, "get_file_hash", side_effect=AssertionError("file should not be hashed")):
+        status = executor.previous_run_info_matches(runnable)
+
+    # Assert
+    assert status == RunInfoStatus.MATCH
+
+
+def test_previous_run_info_matches_rehashes_files_with_changed_stat(tmp_path: Path):
+    # Arrange
+    input_file = tmp_path / "input.txt"
+    input_file.write_text("content")
+    executor = Executor(tmp_path / "cache")
+    runnable = _FileRunnable([input_file], [])
+    executor.store_run_info(runnable)
+
+    # Act & Assert - touching the file alone does not change its content
+    file_stat = input_file.stat()
+    os.utime(input_file, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 1_000_000_000))
+    assert executor.previous_run_info_matches(runnable) == RunInfoStatus.MATCH
+
+    # Act & Assert - changed content is detected
+    input_file.write_text("other content")
+    assert executor.previous_run_info_matches(runnable) == RunInfoStatus.FILE_CHANGED
+
+
+def test_get_file_hash_with_algorithm(tmp_path: Path):
+    # Arrange
+    file = tmp_path / "some_file"
+    file.write_bytes(b"x" * (Executor.HASH_CHUNK_SIZE * 2 + 1))
+
+    # Act
+    file_hash = Executor.get_file_hash(file, "blake2b")
+
+    # Assert
+    assert file_hash == hashlib.blake2b(file.read_bytes()).hexdigest()
+
+
+def test_get_file_hashes(tmp_path: Path):
+    # Arrange
+    files = [tmp_path / f"file_{index}" for index in range(10)]
+    for index, file in enumerate(files):
+        file.write_text(f"content {index}")
+    executor = Executor(tmp_path / "cache", hash_algorithm="blake2b")
+
+    # Act
+    file_hashes = executor.get_file_hashes([*files, tmp_path / "missing"])
+
+    # Assert
+    assert file_hashes[tmp_path / "missing"] == ""
+    for file in files:
+        assert file_hashes[file] == hashlib.blake2b(file.read_bytes()).hexdigest()
+
+
+def test_unsupported_hash_algorithm_raises(tmp_path: Path):
+    with pytest.raises(UserNotificationException):
+        Executor(tmp_path, hash_algorithm="not-an-algorithm")
+
+
+def test_previous_run_info_without_algorithm_still_validates(tmp_path: Path):
+    # Arrange - run info written by an older version: sha256 hashes, no stats and no algorithm entry
+    input_file = tmp_path / "input.txt"
+    input_file.write_text("content")
+    executor = Executor(tmp_path / "cache", hash_algorithm="blake2b")
+    runnable = _FileRunnable([input_file], [])
+    run_info_file = executor.get_runnable_run_info_file(runnable)
+    run_info_file.parent.mkdir(parents=True)
+    run_info_file.write_text(json.dumps({"inputs": {str(input_file): hashlib.sha256(b"content").hexdigest()}, "outputs": {}, "config": {}}))
+
+    # Act
+    status = executor.previous_run_info_matches(runnable)
+
+    # Assert
+    assert status == RunInfoStatus.MATCH
+
+
+def test_store_run_info_records_hash_algorithm(tmp_path: Path):
+    # Arrange
+    input_file = tmp_path / "input.txt"
+    input_file.write_text("content")
+    executor = Executor(tmp_path / "cache", hash_algorithm="blake2b")
+    runnable = _FileRunnable([input_file], [])
+
+    # Act
+    executor.store_run_info(runnable)
+
+    # Assert
+    run_info = json.loads(executor.get_runnable_run_info_file(runnable).read_text())
+    assert run_info["hash_algorithm"] == "blake2b"
+    assert run_info["inputs"][str(input_file)] == hashlib.blake2b(b"content").hexdigest()
+    assert executor.previous_run_info_matches(runnable) == RunInfoStatus.MATCH
+
+
+def test_directory_fingerprint_detects_changes(tmp_path: Path):
+    # Arrange
+    directory = tmp_path / "bin"
+    (directory / "sub").mkdir(parents=True)
+    (directory / "tool").write_text("tool")
+    (directory / "sub" / "nested").write_text("nested")
+
+    # Act
+    original_hash = DirectoryFingerprint().get_hash(directory)
+    unchanged_hash = DirectoryFingerprint().get_hash(directory)
+    (directory / "sub" / "nested").write_text("changed nested content")
+    nested_changed_hash = DirectoryFingerprint().get_hash(directory)
+    shutil.rmtree(directory)
+    removed_hash = DirectoryFingerprint().get_hash(directory)
+
+    # Assert
+    assert original_hash
+    assert original_hash == unchanged_hash
+    assert nested_changed_hash != original_hash
+    assert removed_hash == ""
+
+
+def test_directory_fingerprint_reuses_entries_of_unchanged_directories(tmp_path: Path):
+    # Arrange
+    directory = tmp_path / "bin"
+    (directory / "sub").mkdir(parents=True)
+    (directory / "tool").write_text("tool")
+    previous = DirectoryFingerprint()
+    original_hash = previous.get_hash(directory)
+
+    # Act
+    (directory / "sub" / "added").write_text("added")
+    with patch.object(DirectoryFingerprint, "_list_entries", autospec=True, side_effect=DirectoryFingerprint._list_entries) as list_entries:
+        changed_hash = DirectoryFingerprint(previous_directories=json.loads(json.dumps(previous.directories))).get_hash(directory)
+
+    # Assert
+    assert changed_hash != original_hash
+    assert changed_hash == DirectoryFingerprint().get_hash(directory)
+    assert [call.args[1] for call in list_entries.call_args_list] == [str(directory / "sub")]
+
+
+def test_previous_run_info_detects_file_rewritten_in_place(tmp_path: Path):
+    # Arrange
+    output_dir = tmp_path / ".venv" / "bin"
+    output_dir.mkdir(parents=True)
+    python = output_dir / "python"
+    python.write_text("python")
+    executor = Executor(tmp_path / "cache")
+    runnable = _FileRunnable([], [output_dir])
+    executor.store_run_info(runnable)
+    assert executor.get_run_info(runnable)["directories"]
+    directory_stat = output_dir.stat()
+
+    # Act
+    python.write_text("truncated")
+    os.utime(output_dir, ns=(directory_stat.st_atime_ns, directory_stat.st_mtime_ns))
+
+    # Assert
+    assert executor.previous_run_info_matches(runnable) == RunInfoStatus.FILE_CHANGED
+
+
+def test_directory_fingerprint_content_mode_ignores_touch(tmp_path: Path):
+    # Arrange
+    directory = tmp_path / "bin"
+    directory.mkdir()
+    tool = directory / "tool"
+    tool.write_text("tool")
+    content_hashes: dict = {}
+    original_hash = DirectoryFingerprint(include_content=True, content_hashes=content_hashes).get_hash(directory)
+
+    # Act
+    file_stat = tool.stat()
+    os.utime(tool, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 1_000_000_000))
+    touched_hash = DirectoryFingerprint(include_content=True, content_hashes=content_hashes).get_hash(directory)
+
+    # Assert
+    assert touched_hash == original_hash
+    assert len(content_hashes) == 2
+
+
+def test_previous_run_info_detects_removed_output_directory(tmp_path: Path):
+    # Arrange
+    output_dir = tmp_path / ".venv" / "bin"
+    output_dir.mkdir(parents=True)
+    (output_dir / "python").write_text("python")
+    executor = Executor(tmp_path / "cache")
+    runnable = _FileRunnable([], [output_dir])
+    executor.store_run_info(runnable)
+    assert executor.previous_run_info_matches(runnable) == RunInfoStatus.MATCH
+
+    # Act
+    (output_dir / "python").unlink()
+
+    # Assert
+    assert executor.previous_run_info_matches(runnable) == RunInfoStatus.FILE_CHANGED
+
+
+def test_check_run_info_reports_changed_files(tmp_path: Path):
+    # Arrange
+    changed_file = tmp_path / "changed.txt"
+    changed_file.write_text("content")
+    unchanged_file = tmp_path / "unchanged.txt"
+    unchanged_file.write_text("content")
+    executor = Executor(tmp_path / "cache")
+    runnable = _FileRunnable([changed_file, unchanged_file], [])
+    assert executor.check_run_info(runnable) == RunInfoCheck(RunInfoStatus.NO_INFO)
+    executor.store_run_info(runnable)
+
+    # Act
+    changed_file.write_text("other content")
+    run_info_check = executor.check_run_info(runnable)
+
+    # Assert
+    assert run_info_check == RunInfoCheck(RunInfoStatus.FILE_CHANGED, [str(changed_file)])
+
+
+def test_check_run_info_reports_changed_config_keys(tmp_path: Path):
+    # Arrange
+    executor = Executor(tmp_path / "cache")
+    runnable = _FileRunnable([], [])
+    with patch.object(runnable, "get_config", return_value={"package_manager": "poetry", "python_version": "3.11"}):
+        executor.store_run_info(runnable)
+
+    # Act
+    with patch.object(runnable, "get_config", return_value={"package_manager": "uv", "python_version": "3.11"}):
+        run_info_check = executor.check_run_info(runnable)
+
+    # Assert
+    assert run_info_check == RunInfoCheck(RunInfoStatus.CONFIG_CHANGED, ["package_manager"])
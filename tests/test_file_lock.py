@@ -0,0 +1,52 @@
+import threading
+from pathlib import Path
+
+import pytest
+
+from bootstrap import FileLock, UserNotificationException
+
+
+def test_file_lock_is_exclusive(tmp_path: Path):
+    # Arrange
+    lock_path = tmp_path / "env.lock"
+    first = FileLock(lock_path)
+    second = FileLock(lock_path)
+
+    # Act & Assert
+    assert first.acquire()
+    assert not second.acquire(blocking=False)
+    first.release()
+    assert second.acquire(blocking=False)
+    second.release()
+
+
+def test_file_lock_timeout_raises(tmp_path: Path):
+    # Arrange
+    lock_path = tmp_path / "env.lock"
+
+    # Act & Assert
+    with FileLock(lock_path), pytest.raises(UserNotificationException, match="Timed out"), FileLock(lock_path, timeout=0.2):
+        pass
+
+
+def test_file_lock_waits_for_release(tmp_path: Path):
+    # Arrange
+    lock_path = tmp_path / "env.lock"
+    holder = FileLock(lock_path)
+    holder.acquire()
+    acquired = threading.Event()
+
+    def wait_for_lock() -> None:
+        with FileLock(lock_path, timeout=10):
+            acquired.set()
+
+    waiter = threading.Thread(target=wait_for_lock)
+
+    # Act
+    waiter.start()
+    assert not acquired.wait(0.3)
+    holder.release()
+    waiter.join()
+
+    # Assert
+    assert acquired.is_set()
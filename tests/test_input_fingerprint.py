@@ -0,0 +1,119 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+from bootstrap import (
+    BOOTSTRAP_SCHEMA_VERSION,
+    BootstrapConfig,
+    CreateBootstrapEnvironment,
+    CreateVirtualEnvironment,
+    Executor,
+    RunInfoStatus,
+    get_bootstrap_script_fingerprint,
+    get_pyproject_fingerprint,
+)
+
+ROOT_DIR = Path(__file__).parent.parent
+
+requires_tomllib = pytest.mark.skipif(sys.version_info < (3, 11), reason="pyproject.toml is only parsed with tomllib")
+
+PYPROJECT = """
+[tool.poetry]
+name = "project"
+version = "1.0.0"
+
+[tool.poetry.dependencies]
+python = ">=3.10"
+requests = "^2.31"
+
+[tool.ruff]
+line-length = 120
+"""
+
+
+@requires_tomllib
+def test_pyproject_fingerprint_ignores_tool_settings(tmp_path: Path) -> None:
+    # Arrange
+    pyproject = tmp_path / "pyproject.toml"
+    pyproject.write_text(PYPROJECT)
+    fingerprint = get_pyproject_fingerprint(pyproject)
+
+    # Act
+    pyproject.write_text(PYPROJECT.replace("line-length = 120", "line-length = 180").replace('version = "1.0.0"', 'version = "1.1.0"'))
+    tool_change_fingerprint = get_pyproject_fingerprint(pyproject)
+    pyproject.write_text(PYPROJECT.replace('requests = "^2.31"', 'requests = "^2.32"'))
+    dependency_change_fingerprint = get_pyproject_fingerprint(pyproject)
+
+    # Assert
+    assert tool_change_fingerprint == fingerprint
+    assert dependency_change_fingerprint != fingerprint
+
+
+def test_pyproject_fingerprint_of_invalid_toml_is_file_hash(tmp_path: Path) -> None:
+    # Arrange
+    pyproject = tmp_path / "pyproject.toml"
+    pyproject.write_text("[tool.poetry\n")
+
+    # Act & Assert
+    assert get_pyproject_fingerprint(pyproject) == "file " + Executor.get_file_hash(pyproject)
+    assert get_pyproject_fingerprint(tmp_path / "missing.toml") == ""
+
+
+def test_bootstrap_scripts_declare_the_schema_version() -> None:
+    # Act & Assert
+    assert get_bootstrap_script_fingerprint(ROOT_DIR / "bootstrap.py") == f"schema {BOOTSTRAP_SCHEMA_VERSION}"
+    assert get_bootstrap_script_fingerprint(ROOT_DIR / "bootstrap.ps1") == f"schema {BOOTSTRAP_SCHEMA_VERSION}"
+
+
+def test_bootstrap_script_without_schema_version_is_hashed(tmp_path: Path) -> None:
+    # Arrange
+    script = tmp_path / "bootstrap.py"
+    script.write_text("print('old bootstrap')\n")
+
+    # Act & Assert
+    assert get_bootstrap_script_fingerprint(script) == "file " + Executor.get_file_hash(script)
+
+
+def create_project_venv(project_dir: Path, input_fingerprint: str) -> CreateVirtualEnvironment:
+    config = BootstrapConfig(bootstrap_cache_dir=project_dir.parent / "cache", input_fingerprint=input_fingerprint)
+    return CreateVirtualEnvironment(project_dir, CreateBootstrapEnvironment(config, project_dir))
+
+
+@requires_tomllib
+def test_semantic_fingerprint_skips_irrelevant_changes(project_dir: Path) -> None:
+    # Arrange
+    (project_dir / "pyproject.toml").write_text(PYPROJECT)
+    (project_dir / "bootstrap.py").write_text(f"BOOTSTRAP_SCHEMA_VERSION = {BOOTSTRAP_SCHEMA_VERSION}\n")
+    project_venv = create_project_venv(project_dir, "semantic")
+    executor = Executor(project_venv.venv_dir)
+    executor.store_run_info(project_venv)
+
+    # Act
+    (project_dir / "pyproject.toml").write_text(PYPROJECT.replace("line-length = 120", "line-length = 180"))
+    (project_dir / "bootstrap.py").write_text(f"# new feature\nBOOTSTRAP_SCHEMA_VERSION = {BOOTSTRAP_SCHEMA_VERSION}\n")
+    irrelevant_change = executor.check_run_info(project_venv)
+    (project_dir / "bootstrap.py").write_text(f"BOOTSTRAP_SCHEMA_VERSION = {BOOTSTRAP_SCHEMA_VERSION + 1}\n")
+    schema_change = executor.check_run_info(project_venv)
+
+    # Assert
+    assert irrelevant_change.status == RunInfoStatus.MATCH
+    assert schema_change.status == RunInfoStatus.FILE_CHANGED
+    assert schema_change.changes == [str(project_dir / "bootstrap.py")]
+
+
+def test_fingerprint_scheme_is_recorded_in_run_info(project_dir: Path) -> None:
+    # Arrange
+    (project_dir / "pyproject.toml").write_text(PYPROJECT)
+    executor = Executor(project_dir / ".venv")
+    executor.store_run_info(create_project_venv(project_dir, "file"))
+    project_venv = create_project_venv(project_dir, "semantic")
+
+    # Act
+    run_info_check = executor.check_run_info(project_venv)
+
+    # Assert
+    run_info = executor.get_run_info(project_venv)
+    assert run_info is not None and run_info["fingerprint_scheme"] == "file"
+    assert run_info_check.status == RunInfoStatus.CONFIG_CHANGED
+    assert run_info_check.changes == ["fingerprint_scheme"]
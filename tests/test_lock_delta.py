@@ -0,0 +1,282 @@
+import json
+import sys
+from pathlib import Path
+from typing import Dict
+from unittest.mock import patch
+
+import pytest
+
+from bootstrap import BootstrapConfig, CreateBootstrapEnvironment, CreateVirtualEnvironment, Executor, LockDelta, LockedPackage, LockFileParser, PackageStore
+
+requires_tomllib = pytest.mark.skipif(sys.version_info < (3, 11), reason="TOML lock files are read with tomllib")
+
+POETRY_LOCK = """
+[[package]]
+name = "Requests"
+version = "2.31.0"
+optional = false
+
+[package.dependencies]
+certifi = ">=2017.4.17"
+urllib3 = {version = ">=1.21.1,<3", optional = false}
+PySocks = {version = ">=1.5.6", optional = true}
+
+[[package]]
+name = "certifi"
+version = "2024.2.2"
+
+[[package]]
+name = "urllib3"
+version = "2.2.1"
+
+[[package]]
+name = "colorama"
+version = "0.4.6"
+markers = {main = "sys_platform == 'win32'"}
+
+[[package]]
+name = "internal-lib"
+version = "1.0.0"
+
+[package.source]
+type = "legacy"
+url = "https://my.pypi.org/simple"
+reference = "internal"
+
+[[package]]
+name = "tool"
+version = "0.1.0"
+
+[package.source]
+type = "git"
+url = "https://github.com/org/tool.git"
+reference = "main"
+"""
+
+UV_LOCK = """
+version = 1
+
+[[package]]
+name = "project"
+version = "0.1.0"
+source = { editable = "." }
+dependencies = [
+    { name = "requests" },
+    { name = "colorama", marker = "sys_platform == 'win32'" },
+]
+
+[[package]]
+name = "requests"
+version = "2.31.0"
+source = { registry = "https://pypi.org/simple" }
+dependencies = [{ name = "certifi" }]
+
+[[package]]
+name = "certifi"
+version = "2024.2.2"
+source = { registry = "https://pypi.org/simple" }
+"""
+
+
+@requires_tomllib
+def test_parse_poetry_lock(tmp_path: Path) -> None:
+    # Arrange
+    lock_file = tmp_path / "poetry.lock"
+    lock_file.write_text(POETRY_LOCK)
+
+    # Act
+    packages = LockFileParser.parse(lock_file)
+
+    # Assert
+    assert packages is not None
+    assert packages["requests"] == LockedPackage("requests", "2.31.0", "https://pypi.org/simple", dependencies=["certifi", "urllib3"], conditional_dependencies=["pysocks"])
+    assert packages["colorama"].conditional
+    assert packages["internal-lib"].index_url == "https://my.pypi.org/simple"
+    assert packages["tool"].index_url is None
+
+
+@requires_tomllib
+def test_parse_uv_lock(tmp_path: Path) -> None:
+    # Arrange
+    lock_file = tmp_path / "uv.lock"
+    lock_file.write_text(UV_LOCK)
+
+    # Act
+    packages = LockFileParser.parse(lock_file)
+
+    # Assert
+    assert packages is not None
+    assert packages["project"] == LockedPackage("project", "0.1.0", None, dependencies=["requests"], conditional_dependencies=["colorama"])
+    assert packages["certifi"].index_url == "https://pypi.org/simple"
+
+
+def test_parse_pipfile_lock(tmp_path: Path) -> None:
+    # Arrange
+    lock_file = tmp_path / "Pipfile.lock"
+    lock_file.write_text(
+        json.dumps(
+            {
+                "_meta": {"sources": [{"name": "internal", "url": "https://my.pypi.org/simple"}]},
+                "default": {"requests": {"version": "==2.31.0", "index": "internal"}, "tool": {"git": "https://github.com/org/tool.git"}},
+                "develop": {"colorama": {"version": "==0.4.6", "markers": "sys_platform == 'win32'"}},
+            }
+        )
+    )
+
+    # Act
+    packages = LockFileParser.parse(lock_file)
+
+    # Assert
+    assert packages is not None
+    assert packages["requests"] == LockedPackage("requests", "2.31.0", "https://my.pypi.org/simple", required=True)
+    assert packages["tool"].index_url is None
+    assert packages["colorama"].conditional and not packages["colorama"].required
+
+
+def test_parse_invalid_lock_file(tmp_path: Path) -> None:
+    # Arrange
+    lock_file = tmp_path / "Pipfile.lock"
+    lock_file.write_text("{ not json")
+
+    # Act & Assert
+    assert LockFileParser.parse(lock_file) is None
+    assert LockFileParser.parse(tmp_path / "poetry.lock") is None
+
+
+def lock(*packages: LockedPackage) -> Dict[str, LockedPackage]:
+    return {package.name: package for package in packages}
+
+
+PYPI = "https://pypi.org/simple"
+OLD_LOCK = lock(
+    LockedPackage("requests", "2.31.0", PYPI, dependencies=["certifi"], conditional_dependencies=["colorama"]),
+    LockedPackage("certifi", "2024.2.2", PYPI),
+    LockedPackage("six", "1.16.0", PYPI),
+)
+INSTALLED = {"requests": "2.31.0", "certifi": "2024.2.2", "six": "1.16.0", "project": "0.1.0"}
+
+
+def test_delta_of_bumped_added_and_removed_packages() -> None:
+    # Arrange
+    new_lock = lock(
+        LockedPackage("requests", "2.32.0", PYPI, dependencies=["certifi", "idna"]),
+        LockedPackage("certifi", "2024.2.2", PYPI),
+        LockedPackage("idna", "3.7", PYPI),
+        LockedPackage("docs-theme", "1.0", PYPI),
+    )
+
+    # Act
+    delta = LockDelta.compute(LockDelta.get_snapshot(OLD_LOCK), new_lock, INSTALLED)
+
+    # Assert
+    assert delta is not None
+    assert delta.get_install_requirements() == {None: ["requests==2.32.0", "idna==3.7"]}
+    assert delta.uninstall == ["six"]
+
+
+def test_packages_of_an_explicit_index_are_installed_from_it() -> None:
+    # Arrange
+    new_lock = {**OLD_LOCK, "certifi": LockedPackage("certifi", "2024.7.4", "https://my.pypi.org/simple"), "six": LockedPackage("six", "1.17.0", PYPI)}
+
+    # Act
+    delta = LockDelta.compute(LockDelta.get_snapshot(OLD_LOCK), new_lock, INSTALLED)
+
+    # Assert
+    assert delta is not None
+    assert delta.get_install_requirements() == {"https://my.pypi.org/simple": ["certifi==2024.7.4"], None: ["six==1.17.0"]}
+
+
+def test_delta_is_not_applied_to_drifted_environment() -> None:
+    # Arrange
+    new_lock = {**OLD_LOCK, "certifi": LockedPackage("certifi", "2024.7.4", PYPI)}
+
+    # Act & Assert
+    assert LockDelta.compute(LockDelta.get_snapshot(OLD_LOCK), new_lock, {**INSTALLED, "certifi": "2023.1.1"}) is None
+
+
+def test_delta_is_not_applied_for_conditionally_needed_package() -> None:
+    # Arrange
+    new_lock = {**OLD_LOCK, "colorama": LockedPackage("colorama", "0.4.6", PYPI)}
+
+    # Act & Assert
+    assert LockDelta.compute(LockDelta.get_snapshot(OLD_LOCK), new_lock, INSTALLED) is None
+
+
+def test_delta_is_not_applied_for_package_not_from_an_index() -> None:
+    # Arrange
+    new_lock = {**OLD_LOCK, "certifi": LockedPackage("certifi", "2024.7.4", None)}
+
+    # Act & Assert
+    assert LockDelta.compute(LockDelta.get_snapshot(OLD_LOCK), new_lock, INSTALLED) is None
+
+
+def write_pipfile_lock(project_dir: Path, requests_version: str) -> None:
+    default = {"requests": {"version": f"=={requests_version}"}, "certifi": {"version": "==2024.2.2"}}
+    (project_dir / "Pipfile.lock").write_text(json.dumps({"_meta": {"sources": []}, "default": default}))
+
+
+def install(venv_dir: Path, distributions: Dict[str, str]) -> None:
+    site_packages = venv_dir / "lib" / "python3.11" / "site-packages"
+    for name, version in distributions.items():
+        (site_packages / f"{name}-{version}.dist-info").mkdir(parents=True)
+
+
+@pytest.fixture
+def pipenv_project(project_dir: Path, tmp_path: Path) -> CreateVirtualEnvironment:
+    bootstrap_env = CreateBootstrapEnvironment(BootstrapConfig(bootstrap_cache_dir=tmp_path / "cache", package_manager="pipenv"), project_dir)
+    project_venv = CreateVirtualEnvironment(project_dir, bootstrap_env)
+    write_pipfile_lock(project_dir, "2.31.0")
+    install(project_venv.venv_dir, {"requests": "2.31.0", "certifi": "2024.2.2"})
+    project_venv.virtual_env.pip_path().parent.mkdir(parents=True)
+    project_venv.virtual_env.pip_path().touch()
+    Executor(project_venv.venv_dir).store_run_info(project_venv)
+    return project_venv
+
+
+def test_changed_lock_file_is_applied_incrementally(pipenv_project: CreateVirtualEnvironment) -> None:
+    # Arrange
+    write_pipfile_lock(pipenv_project.root_dir, "2.32.0")
+
+    # Act
+    with patch.object(pipenv_project.virtual_env, "pip") as pip, patch.object(pipenv_project.bootstrap_env.virtual_env, "run") as package_manager_run:
+        exit_code = Executor(pipenv_project.venv_dir).execute(pipenv_project)
+
+    # Assert
+    assert exit_code == 0
+    package_manager_run.assert_not_called()
+    pip.assert_called_once_with(["install", "--no-deps", "requests==2.32.0"], timeout=None)
+    run_info = Executor(pipenv_project.venv_dir).get_run_info(pipenv_project)
+    assert run_info is not None
+    assert run_info["state"]["lock"]["requests"]["version"] == "2.32.0"
+
+
+def test_incremental_update_detaches_and_links_the_files_of_the_package_store(pipenv_project: CreateVirtualEnvironment) -> None:
+    # Arrange
+    pipenv_project.config.package_store = True
+    write_pipfile_lock(pipenv_project.root_dir, "2.32.0")
+    calls = []
+
+    # Act
+    with patch.object(pipenv_project.virtual_env, "pip", side_effect=lambda *args, **kwargs: calls.append("pip")), patch.object(PackageStore, "detach", side_effect=lambda index_dir: calls.append("detach")) as detach:
+        with patch.object(PackageStore, "deduplicate", return_value=(0, 0)) as deduplicate:
+            exit_code = Executor(pipenv_project.venv_dir).execute(pipenv_project)
+
+    # Assert
+    assert exit_code == 0
+    assert calls == ["detach", "pip"]
+    detach.assert_called_once_with(pipenv_project.venv_dir)
+    deduplicate.assert_called_once_with(pipenv_project.virtual_env.lib_path(), pipenv_project.venv_dir)
+
+
+def test_other_changes_run_the_full_install(pipenv_project: CreateVirtualEnvironment) -> None:
+    # Arrange
+    write_pipfile_lock(pipenv_project.root_dir, "2.32.0")
+    (pipenv_project.root_dir / "Pipfile").write_text("[packages]\nrequests = '*'\n")
+
+    # Act
+    with patch.object(pipenv_project.virtual_env, "pip") as pip, patch.object(pipenv_project.bootstrap_env.virtual_env, "run") as package_manager_run:
+        Executor(pipenv_project.venv_dir).execute(pipenv_project)
+
+    # Assert
+    pip.assert_not_called()
+    package_manager_run.assert_called_once()
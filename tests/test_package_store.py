@@ -0,0 +1,147 @@
+import errno
+import os
+import shutil
+import stat
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from bootstrap import BootstrapCache, Executor, PackageStore
+
+
+def _create_site_packages(venv_dir: Path) -> Path:
+    package_dir = venv_dir / "lib" / "site-packages" / "package"
+    package_dir.mkdir(parents=True)
+    (package_dir / "__init__.py").write_text("VALUE = 1\n")
+    (package_dir / "module.py").write_text("def function(): pass\n")
+    return venv_dir / "lib"
+
+
+def test_deduplicate_links_identical_files(tmp_path: Path):
+    # Arrange
+    store = PackageStore(tmp_path / "store")
+    first_lib = _create_site_packages(tmp_path / "first")
+    second_lib = _create_site_packages(tmp_path / "second")
+
+    # Act
+    assert store.deduplicate(first_lib, tmp_path / "first") == (2, 0)
+    assert store.deduplicate(second_lib, tmp_path / "second") == (2, 0)
+
+    # Assert
+    for relative_path in ["site-packages/package/__init__.py", "site-packages/package/module.py"]:
+        first_file = first_lib / relative_path
+        assert os.path.samefile(first_file, second_lib / relative_path)
+        assert os.path.samefile(first_file, store.get_object_path(store.get_digest(first_file)))
+    assert (first_lib / "site-packages/package/__init__.py").read_text() == "VALUE = 1\n"
+
+
+def test_deduplicate_skips_unchanged_files(tmp_path: Path):
+    # Arrange
+    store = PackageStore(tmp_path / "store")
+    lib = _create_site_packages(tmp_path / "venv")
+    store.deduplicate(lib, tmp_path / "venv")
+
+    # Act
+    with patch.object(Executor, "get_file_hash", side_effect=AssertionError("must not hash unchanged files")):
+        result = store.deduplicate(lib, tmp_path / "venv")
+
+    # Assert
+    assert result == (2, 0)
+
+
+def test_deduplicate_replaces_inconsistent_store_object(tmp_path: Path):
+    # Arrange
+    store = PackageStore(tmp_path / "store")
+    lib = _create_site_packages(tmp_path / "venv")
+    module = lib / "site-packages/package/module.py"
+    object_path = store.get_object_path(store.get_digest(module))
+    object_path.parent.mkdir(parents=True)
+    object_path.write_text("truncated")
+
+    # Act
+    store.deduplicate(lib, tmp_path / "venv")
+
+    # Assert
+    assert os.path.samefile(module, object_path)
+    assert object_path.read_text() == "def function(): pass\n"
+
+
+def test_deduplicate_keeps_copies_across_filesystems(tmp_path: Path):
+    # Arrange
+    store = PackageStore(tmp_path / "store")
+    lib = _create_site_packages(tmp_path / "venv")
+
+    # Act
+    with patch("os.link", side_effect=OSError(errno.EXDEV, "Invalid cross-device link")):
+        result = store.deduplicate(lib, tmp_path / "venv")
+
+    # Assert
+    assert result == (0, 2)
+    assert (lib / "site-packages/package/module.py").read_text() == "def function(): pass\n"
+
+
+def test_deduplicate_replaces_store_object_with_wrong_content(tmp_path: Path):
+    # Arrange
+    store = PackageStore(tmp_path / "store")
+    lib = _create_site_packages(tmp_path / "venv")
+    module = lib / "site-packages/package/module.py"
+    object_path = store.get_object_path(store.get_digest(module))
+    object_path.parent.mkdir(parents=True)
+    object_path.write_text("def corrupted(): 0\n")
+
+    # Act
+    store.deduplicate(lib, tmp_path / "venv")
+
+    # Assert
+    assert os.path.samefile(module, object_path)
+    assert module.read_text() == "def function(): pass\n"
+
+
+@pytest.mark.skipif(sys.platform.startswith("win32"), reason="store objects stay writable on Windows")
+def test_deduplicated_files_are_read_only_until_detached(tmp_path: Path):
+    # Arrange
+    store = PackageStore(tmp_path / "store")
+    first_lib = _create_site_packages(tmp_path / "first")
+    second_lib = _create_site_packages(tmp_path / "second")
+    store.deduplicate(first_lib, tmp_path / "first")
+    store.deduplicate(second_lib, tmp_path / "second")
+    module = first_lib / "site-packages/package/module.py"
+    object_path = store.get_object_path(store.get_digest(module))
+    assert not module.stat().st_mode & stat.S_IWUSR
+
+    # Act
+    copied = store.detach(tmp_path / "first")
+    assert module.stat().st_mode & stat.S_IWUSR
+    module.write_text("def edited(): pass\n")
+
+    # Assert
+    assert copied == 2
+    assert not (tmp_path / "first" / PackageStore.INDEX_FILE).exists()
+    assert not object_path.stat().st_mode & stat.S_IWUSR
+    assert object_path.read_text() == (second_lib / "site-packages/package/module.py").read_text() == "def function(): pass\n"
+    assert store.deduplicate(first_lib, tmp_path / "first") == (2, 0)
+    assert not os.path.samefile(module, object_path)
+
+
+def test_garbage_collection_removes_objects_of_deleted_environments(tmp_path: Path):
+    # Arrange
+    cache_dir = tmp_path / "cache"
+    store = PackageStore(cache_dir / PackageStore.STORE_DIR)
+    kept_lib = _create_site_packages(tmp_path / "kept")
+    removed_lib = _create_site_packages(tmp_path / "removed")
+    (removed_lib / "site-packages/package/extra.py").write_text("EXTRA = 1\n")
+    store.deduplicate(kept_lib, tmp_path / "kept")
+    store.deduplicate(removed_lib, tmp_path / "removed")
+    extra_object = store.get_object_path(store.get_digest(removed_lib / "site-packages/package/extra.py"))
+    shutil.rmtree(tmp_path / "removed")
+
+    # Act
+    BootstrapCache(cache_dir).collect_garbage()
+
+    # Assert
+    assert not extra_object.exists()
+    for relative_path in ["site-packages/package/__init__.py", "site-packages/package/module.py"]:
+        path = kept_lib / relative_path
+        assert os.path.samefile(path, store.get_object_path(store.get_digest(path)))
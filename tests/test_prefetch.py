@@ -0,0 +1,134 @@
+import hashlib
+import json
+import sys
+import sysconfig
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from bootstrap import BootstrapConfig, CreateVirtualEnvironment, Executor, LockFileParser, PrefetchDependencies, create_project_stages, is_compatible_wheel
+
+requires_tomllib = pytest.mark.skipif(sys.version_info < (3, 11), reason="poetry.lock is read with tomllib")
+
+PYTHON_TAG = f"cp{sys.version_info.major}{sys.version_info.minor}"
+HOST_PLATFORM = sysconfig.get_platform().replace("-", "_").replace(".", "_")
+
+
+@pytest.mark.parametrize(
+    "file_name, expected",
+    [
+        ("requests-2.31.0-py3-none-any.whl", True),
+        ("six-1.16.0-py2.py3-none-any.whl", True),
+        (f"native-1.0-{PYTHON_TAG}-{PYTHON_TAG}-{HOST_PLATFORM}.whl", True),
+        (f"stable-1.0-cp37-abi3-{HOST_PLATFORM}.whl", True),
+        (f"native-1.0-cp27-cp27m-{HOST_PLATFORM}.whl", False),
+        (f"native-1.0-{PYTHON_TAG}-{PYTHON_TAG}-{'win_amd64' if HOST_PLATFORM.startswith('linux') else 'manylinux2014_x86_64'}.whl", False),
+        ("legacy-1.0-py2-none-any.whl", False),
+        ("requests-2.31.0.tar.gz", False),
+    ],
+)
+def test_is_compatible_wheel(file_name: str, expected: bool) -> None:
+    assert is_compatible_wheel(file_name) == expected
+
+
+@pytest.fixture
+def index_dir(tmp_path: Path) -> Path:
+    return tmp_path / "index"
+
+
+@pytest.fixture
+def index_url(index_dir: Path) -> Iterator[str]:
+    """A PEP 503 simple index served from index_dir/simple."""
+    index_dir.mkdir()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(SimpleHTTPRequestHandler, directory=str(index_dir)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/simple"
+    server.shutdown()
+    server.server_close()
+
+
+def publish(index_dir: Path, name: str, artifacts: dict) -> dict:
+    """Publish artifacts of a package to the index. Returns the poetry.lock files entries."""
+    package_dir = index_dir / "simple" / name
+    package_dir.mkdir(parents=True)
+    files = []
+    links = []
+    for file_name, content in artifacts.items():
+        (package_dir / file_name).write_bytes(content)
+        digest = hashlib.sha256(content).hexdigest()
+        files.append({"file": file_name, "hash": f"sha256:{digest}"})
+        links.append(f'<a href="{file_name}#sha256={digest}">{file_name}</a>')
+    (package_dir / "index.html").write_text(f"<html><body>{''.join(links)}</body></html>\n")
+    return {"files": files}
+
+
+def write_poetry_lock(project_dir: Path, index_url: str, packages: dict) -> None:
+    lines = []
+    for name, entry in packages.items():
+        files = ", ".join(f'{{file = "{file["file"]}", hash = "{file["hash"]}"}}' for file in entry["files"])
+        lines += ["[[package]]", f'name = "{name}"', 'version = "1.0"', f"files = [{files}]", "", "[package.source]", 'type = "legacy"', f'url = "{index_url}"', 'reference = "internal"', ""]
+    (project_dir / "poetry.lock").write_text("\n".join(lines))
+
+
+@pytest.fixture
+def prefetch(project_dir: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> PrefetchDependencies:
+    monkeypatch.setenv("POETRY_CACHE_DIR", str(tmp_path / "poetry-cache"))
+    return PrefetchDependencies(project_dir, BootstrapConfig(bootstrap_cache_dir=tmp_path / "cache", prefetch_dependencies=True))
+
+
+@requires_tomllib
+def test_prefetch_downloads_compatible_artifacts_into_poetry_cache(prefetch: PrefetchDependencies, project_dir: Path, index_dir: Path, index_url: str) -> None:
+    # Arrange
+    wheel, foreign_wheel = "pure-1.0-py3-none-any.whl", "native-1.0-cp27-cp27m-win32.whl"
+    packages = {
+        "pure": publish(index_dir, "pure", {wheel: b"wheel", "pure-1.0.tar.gz": b"sdist"}),
+        "native": publish(index_dir, "native", {foreign_wheel: b"foreign", "native-1.0.tar.gz": b"native sdist"}),
+    }
+    write_poetry_lock(project_dir, index_url, packages)
+
+    # Act
+    exit_code = Executor(prefetch.run_info_dir).execute(prefetch)
+
+    # Assert
+    assert exit_code == 0
+    locked_packages = LockFileParser.parse(project_dir / "poetry.lock")
+    assert locked_packages is not None
+    links = prefetch.get_links(locked_packages["pure"])
+    assert (prefetch.get_artifact_cache_dir(links[wheel]) / wheel).read_bytes() == b"wheel"
+    archives = sorted(path.name for path in prefetch.artifacts_dir.rglob("*") if path.is_file())
+    assert archives == ["native-1.0.tar.gz", wheel]
+
+
+@requires_tomllib
+def test_prefetch_failures_are_not_fatal(prefetch: PrefetchDependencies, project_dir: Path, index_dir: Path, index_url: str) -> None:
+    # Arrange
+    packages = {"pure": publish(index_dir, "pure", {"pure-1.0-py3-none-any.whl": b"wheel"}), "missing": {"files": [{"file": "missing-1.0-py3-none-any.whl", "hash": "sha256:00"}]}}
+    packages["pure"]["files"][0]["hash"] = "sha256:" + hashlib.sha256(b"tampered").hexdigest()
+    write_poetry_lock(project_dir, index_url, packages)
+
+    # Act
+    exit_code = prefetch.run()
+
+    # Assert
+    assert exit_code == 0
+    assert [path for path in prefetch.artifacts_dir.rglob("*") if path.is_file()] == []
+
+
+def test_prefetch_stage_runs_before_the_install(project_dir: Path, tmp_path: Path) -> None:
+    # Arrange
+    (project_dir / "bootstrap.json").write_text(json.dumps({"bootstrap_cache_dir": str(tmp_path / "cache"), "prefetch_dependencies": True}))
+
+    # Act
+    stages = [runnable for runnable, _ in create_project_stages(project_dir)]
+
+    # Assert
+    assert [runnable.get_name() for runnable in stages] == ["create-bootstrap-environment", "prefetch-dependencies", "create-virtual-environment"]
+    project_venv = stages[2]
+    assert isinstance(project_venv, CreateVirtualEnvironment)
+    assert project_venv.get_dependencies() == [stages[0], stages[1]]
+    assert stages[1].get_dependencies() == []
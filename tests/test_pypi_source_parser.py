@@ -1,8 +1,9 @@
 from pathlib import Path
+from unittest.mock import patch
 
 import pytest
 
-from bootstrap import PyPiSourceParser
+from bootstrap import PyPiSource, PyPiSourceParser, TomlSection, UserNotificationException
 
 
 @pytest.mark.parametrize(
@@ -77,3 +78,104 @@ url = "https://anotherpypi.org/wherever"
     assert pypi_source
     assert pypi_source.name == "another_pypi"
     assert pypi_source.url == "https://anotherpypi.org/wherever"
+
+
+MULTIPLE_SOURCES = """
+[tool.poetry]
+name = "project"
+classifiers = ["Programming Language :: Python"]
+
+[[tool.poetry.source]]
+name = "internal"
+url = "https://pypi.example.com/simple"
+priority = "primary"
+
+[tool.poetry.dependencies]
+python = "^3.10"
+
+[[tool.poetry.source]]
+name = "mirror"
+url = "https://mirror.example.com/simple"
+"""
+
+
+def test_sources_from_toml_content_returns_all_entries():
+    # Act
+    sources = PyPiSourceParser.sources_from_toml_content(MULTIPLE_SOURCES, "tool.poetry.source")
+
+    # Assert
+    assert sources == [PyPiSource("internal", "https://pypi.example.com/simple"), PyPiSource("mirror", "https://mirror.example.com/simple")]
+    assert PyPiSourceParser.from_toml_content(MULTIPLE_SOURCES, "tool.poetry.source") == sources[0]
+
+
+def test_source_sections_fallback_returns_all_entries():
+    # Act
+    entries = PyPiSourceParser._parse_source_sections(MULTIPLE_SOURCES, "tool.poetry.source")
+
+    # Assert
+    assert [(entry["name"], entry["url"]) for entry in entries] == [("internal", "https://pypi.example.com/simple"), ("mirror", "https://mirror.example.com/simple")]
+
+
+def test_source_without_url_raises():
+    # Arrange
+    toml_content = '[[source]]\nname = "incomplete"\n'
+
+    # Act & Assert
+    with pytest.raises(UserNotificationException, match="Could not parse PyPi source from section source"):
+        PyPiSourceParser.from_toml_content(toml_content, "source")
+
+
+@pytest.mark.parametrize("pypi_entry", ['name = "PyPI"\npriority = "supplemental"', 'name = "pypi"'])
+def test_source_without_url_for_pypi_is_skipped(pypi_entry: str):
+    # Arrange
+    toml_content = f'[[tool.poetry.source]]\nname = "internal"\nurl = "https://pypi.example.com/simple"\n\n[[tool.poetry.source]]\n{pypi_entry}\n'
+
+    # Act
+    sources = PyPiSourceParser.sources_from_toml_content(toml_content, "tool.poetry.source")
+    entries = PyPiSourceParser._parse_source_sections(toml_content, "tool.poetry.source")
+
+    # Assert
+    assert sources == [PyPiSource("internal", "https://pypi.example.com/simple")]
+    assert PyPiSourceParser.from_toml_content(toml_content, "tool.poetry.source") == sources[0]
+    assert [PyPiSourceParser._is_implicit_pypi(entry) for entry in entries] == [False, True]
+
+
+def test_sources_are_parsed_once_per_content():
+    # Arrange
+    toml_content = '[[source]]\nname = "cached"\nurl = "https://cached.example.com/simple"\n'
+
+    # Act
+    with patch.object(PyPiSourceParser, "_parse_source_entries", wraps=PyPiSourceParser._parse_source_entries) as parse:
+        first = PyPiSourceParser.from_toml_content(toml_content, "source")
+        second = PyPiSourceParser.from_toml_content(toml_content, "source")
+        changed = PyPiSourceParser.from_toml_content(toml_content.replace("cached", "changed"), "source")
+
+    # Assert
+    assert first == second == PyPiSource("cached", "https://cached.example.com/simple")
+    assert changed == PyPiSource("changed", "https://changed.example.com/simple")
+    assert parse.call_count == 2
+
+
+def test_get_toml_sections_keeps_lines_with_brackets():
+    # Arrange
+    toml_content = '[tool.poetry]\nname = "project"\npackages = [{ include = "src" }]\n\n[[tool.poetry.source]]\nname = "internal"'
+
+    # Act
+    sections = PyPiSourceParser.get_toml_sections(toml_content)
+
+    # Assert
+    assert sections == [
+        TomlSection("tool.poetry", 'name = "project"\npackages = [{ include = "src" }]'),
+        TomlSection("tool.poetry.source", 'name = "internal"'),
+    ]
+
+
+def test_get_toml_sections_on_large_content_without_trailing_newline():
+    # Arrange
+    toml_content = "[section]\n" + "key = value\n" * 100_000 + "[unterminated"
+
+    # Act
+    sections = PyPiSourceParser.get_toml_sections(toml_content)
+
+    # Assert
+    assert [section.name for section in sections] == ["section"]
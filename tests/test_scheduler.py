@@ -0,0 +1,180 @@
+import os
+import signal
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import pytest
+
+from bootstrap import Executor, Runnable, Scheduler, SubprocessExecutor, UserNotificationException
+
+
+class _Stage(Runnable):
+    def __init__(self, name: str, action: Optional[Callable[[], int]] = None, dependencies: Optional[List[Runnable]] = None) -> None:
+        self.name = name
+        self.action = action
+        self.dependencies = dependencies or []
+        self.executed = False
+
+    def run(self) -> int:
+        self.executed = True
+        return self.action() if self.action else 0
+
+    def get_name(self) -> str:
+        return self.name
+
+    def get_inputs(self) -> List[Path]:
+        return []
+
+    def get_outputs(self) -> List[Path]:
+        return []
+
+    def get_dependencies(self) -> List[Runnable]:
+        return self.dependencies
+
+
+def test_independent_stages_run_concurrently(tmp_path: Path):
+    # Arrange - both stages can only pass the barrier if they run at the same time
+    barrier = threading.Barrier(2, timeout=10)
+    first = _Stage("first", lambda: barrier.wait() and 0)
+    second = _Stage("second", lambda: barrier.wait() and 0)
+    scheduler = Scheduler(max_workers=2)
+    scheduler.add(first, Executor(tmp_path))
+    scheduler.add(second, Executor(tmp_path))
+
+    # Act
+    exit_code = scheduler.run()
+
+    # Assert
+    assert exit_code == 0
+    assert first.executed
+    assert second.executed
+
+
+def test_dependent_stage_runs_after_dependency(tmp_path: Path):
+    # Arrange
+    order: List[str] = []
+    toolchain = _Stage("toolchain", lambda: order.append("toolchain") or 0)
+    project = _Stage("project", lambda: order.append("project") or 0, dependencies=[toolchain])
+    scheduler = Scheduler()
+    scheduler.add(project, Executor(tmp_path))
+    scheduler.add(toolchain, Executor(tmp_path))
+
+    # Act
+    scheduler.run()
+
+    # Assert
+    assert order == ["toolchain", "project"]
+
+
+def test_stages_without_concurrency_run_in_the_calling_thread(tmp_path: Path):
+    # Arrange
+    threads: List[threading.Thread] = []
+    toolchain = _Stage("toolchain", lambda: threads.append(threading.current_thread()) or 0)
+    project = _Stage("project", lambda: threads.append(threading.current_thread()) or 0, dependencies=[toolchain])
+    scheduler = Scheduler()
+    scheduler.add(toolchain, Executor(tmp_path))
+    scheduler.add(project, Executor(tmp_path))
+
+    # Act
+    scheduler.run()
+
+    # Assert
+    assert threads == [threading.current_thread()] * 2
+
+
+def test_dependents_of_failed_stage_are_not_run(tmp_path: Path):
+    # Arrange
+    def fail() -> int:
+        raise UserNotificationException("toolchain failed")
+
+    toolchain = _Stage("toolchain", fail)
+    project = _Stage("project", dependencies=[toolchain])
+    scheduler = Scheduler()
+    scheduler.add(toolchain, Executor(tmp_path))
+    scheduler.add(project, Executor(tmp_path))
+
+    # Act & Assert
+    with pytest.raises(UserNotificationException, match="toolchain failed"):
+        scheduler.run()
+    assert not project.executed
+
+
+def test_dependents_of_stage_with_exit_code_are_not_run(tmp_path: Path):
+    # Arrange
+    toolchain = _Stage("toolchain", lambda: 3)
+    project = _Stage("project", dependencies=[toolchain])
+    scheduler = Scheduler()
+    scheduler.add(toolchain, Executor(tmp_path))
+    scheduler.add(project, Executor(tmp_path))
+
+    # Act
+    exit_code = scheduler.run()
+
+    # Assert
+    assert exit_code == 3
+    assert not project.executed
+
+
+def test_circular_dependencies_raise(tmp_path: Path):
+    # Arrange
+    first = _Stage("first")
+    second = _Stage("second", dependencies=[first])
+    first.dependencies = [second]
+    scheduler = Scheduler()
+    scheduler.add(first, Executor(tmp_path))
+    scheduler.add(second, Executor(tmp_path))
+
+    # Act & Assert
+    with pytest.raises(UserNotificationException, match="circular"):
+        scheduler.run()
+
+
+def test_unscheduled_dependency_raises(tmp_path: Path):
+    # Arrange
+    scheduler = Scheduler()
+    scheduler.add(_Stage("project", dependencies=[_Stage("toolchain")]), Executor(tmp_path))
+
+    # Act & Assert
+    with pytest.raises(UserNotificationException, match="not scheduled"):
+        scheduler.run()
+
+
+@pytest.mark.skipif(sys.platform.startswith("win32"), reason="interrupts the main thread with POSIX signals")
+@pytest.mark.parametrize("concurrent_stages", [1, 2])
+def test_interrupt_stops_the_running_stages(tmp_path: Path, concurrent_stages: int):
+    # Arrange - the commands run in their own process group because of the timeout, so Ctrl+C does not reach them
+    pid_files = [tmp_path / f"stage{index}.pid" for index in range(concurrent_stages)]
+
+    def hang(pid_file: Path) -> int:
+        SubprocessExecutor([sys.executable, "-c", f"import os, time\nopen({str(pid_file)!r}, 'w').write(str(os.getpid()))\ntime.sleep(60)"], timeout=60).execute()
+        return 0
+
+    def interrupt_when_started() -> None:
+        while not all(pid_file.exists() and pid_file.read_text() for pid_file in pid_files):
+            time.sleep(0.1)
+        signal.pthread_kill(main_thread_id, signal.SIGINT)
+
+    stages = [_Stage(f"stage{index}", lambda pid_file=pid_file: hang(pid_file)) for index, pid_file in enumerate(pid_files)]
+    project = _Stage("project", dependencies=stages)
+    scheduler = Scheduler()
+    for stage in [*stages, project]:
+        scheduler.add(stage, Executor(tmp_path))
+    main_thread_id = threading.get_ident()
+    interrupter = threading.Thread(target=interrupt_when_started, daemon=True)
+
+    # Act
+    start = time.perf_counter()
+    interrupter.start()
+    with pytest.raises(KeyboardInterrupt):
+        scheduler.run()
+
+    # Assert
+    assert time.perf_counter() - start < 30
+    assert not project.executed
+    for pid_file in pid_files:
+        pid = int(pid_file.read_text())
+        with pytest.raises(ProcessLookupError):
+            os.kill(pid, 0)
@@ -0,0 +1,116 @@
+import json
+import os
+import subprocess  # nosec
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+from bootstrap import LOG_FILE_ENV_VAR, TRACE_FILE_ENV_VAR, create_argument_parser, parse_arguments
+
+ROOT_DIR = Path(__file__).parent.parent
+
+# Modules which are only needed when a stage actually has to run
+DEFERRED_MODULES = ["argparse", "asyncio", "concurrent.futures", "configparser", "ensurepip", "html.parser", "shutil", "subprocess", "venv"]
+
+# Cumulative import time of the bootstrap module (with all modules it imports) from cached bytecode, as reported by -X importtime
+IMPORT_BUDGET_US = 100_000
+
+# Duration of main() on an up-to-date project, in a fresh interpreter with the bootstrap module loaded from cached bytecode
+NOOP_RUN_BUDGET_US = 50_000
+
+# Marks all stages of the project in the current directory as up to date, without installing anything
+CREATE_UP_TO_DATE_PROJECT = """
+import bootstrap
+
+def create_bootstrap_environment(self):
+    self.marker_file.parent.mkdir(parents=True, exist_ok=True)
+    self.marker_file.touch()
+    return 0
+
+def create_virtual_environment(self):
+    for scripts_dir in self.get_outputs():
+        scripts_dir.mkdir(parents=True, exist_ok=True)
+        (scripts_dir / "tool").write_text("tool")
+    return 0
+
+bootstrap.CreateBootstrapEnvironment.run = create_bootstrap_environment
+bootstrap.CreateVirtualEnvironment.run = create_virtual_environment
+assert bootstrap.main([]) == 0
+"""
+
+TIME_NOOP_RUN = f"""
+import json, sys, time
+import bootstrap
+
+start = time.perf_counter()
+exit_code = bootstrap.main([])
+duration_us = int((time.perf_counter() - start) * 1_000_000)
+print(json.dumps({{"exit_code": exit_code, "duration_us": duration_us, "deferred_modules": [module for module in {DEFERRED_MODULES!r} if module in sys.modules]}}))
+"""
+
+
+def run_python(arguments: List[str], cwd: Path, pycache_dir: Path) -> "subprocess.CompletedProcess[str]":
+    """Run Python in a fresh interpreter which imports bootstrap from this repository and caches its bytecode in pycache_dir."""
+    env = {key: value for key, value in os.environ.items() if key not in ["PYTHONDONTWRITEBYTECODE", "BOOTSTRAP_TRACE", "BOOTSTRAP_LOG_FILE"]}
+    env["PYTHONPYCACHEPREFIX"] = str(pycache_dir)
+    env["PYTHONPATH"] = str(ROOT_DIR)
+    return subprocess.run([sys.executable, *arguments], cwd=cwd, env=env, capture_output=True, text=True, check=True)
+
+
+def import_times(pycache_dir: Path) -> Dict[str, int]:
+    """Import bootstrap in a fresh interpreter and return the cumulative import time in microseconds per module."""
+    result = run_python(["-X", "importtime", "-c", "import bootstrap"], ROOT_DIR, pycache_dir)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        times[module.strip()] = int(cumulative)
+    return times
+
+
+def test_heavy_modules_are_not_imported_at_startup(tmp_path: Path) -> None:
+    # Arrange - the first import writes the bytecode cache
+    import_times(tmp_path)
+
+    # Act
+    runs = [import_times(tmp_path) for _ in range(3)]
+
+    # Assert
+    imported_modules = runs[0]
+    assert [module for module in DEFERRED_MODULES if module in imported_modules] == []
+    import_time = min(run["bootstrap"] for run in runs)
+    assert import_time < IMPORT_BUDGET_US, f"Importing bootstrap took {import_time / 1000:.1f} ms, budget is {IMPORT_BUDGET_US / 1000:.0f} ms"
+
+
+def test_arguments_of_plain_run_match_the_parser_defaults(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    # Arrange
+    monkeypatch.setenv(TRACE_FILE_ENV_VAR, str(tmp_path / "trace.json"))
+    monkeypatch.delenv(LOG_FILE_ENV_VAR, raising=False)
+
+    # Act
+    arguments = parse_arguments([])
+
+    # Assert
+    assert vars(arguments) == vars(create_argument_parser().parse_args([]))
+
+
+def test_noop_run_budget(tmp_path: Path) -> None:
+    # Arrange
+    project_dir = tmp_path / "project"
+    project_dir.mkdir()
+    (project_dir / "pyproject.toml").write_text('[tool.poetry]\nname = "project"\nversion = "0.1.0"\n')
+    (project_dir / "bootstrap.json").write_text(json.dumps({"bootstrap_cache_dir": str(tmp_path / "cache")}))
+    pycache_dir = tmp_path / "pycache"
+    run_python(["-c", CREATE_UP_TO_DATE_PROJECT], project_dir, pycache_dir)
+
+    # Act
+    runs = [json.loads(run_python(["-c", TIME_NOOP_RUN], project_dir, pycache_dir).stdout.splitlines()[-1]) for _ in range(3)]
+
+    # Assert
+    assert [run["exit_code"] for run in runs] == [0, 0, 0]
+    assert runs[0]["deferred_modules"] == []
+    noop_run_time = min(run["duration_us"] for run in runs)
+    assert noop_run_time < NOOP_RUN_BUDGET_US, f"The no-op run took {noop_run_time / 1000:.1f} ms, budget is {NOOP_RUN_BUDGET_US / 1000:.0f} ms"
@@ -0,0 +1,158 @@
+import asyncio
+import os
+import signal
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from bootstrap import LOG_FILE_ENV_VAR, SubprocessExecutor, UserNotificationException, parse_arguments
+
+
+def create_script(tmp_path: Path, lines: int, exit_code: int) -> Path:
+    script = tmp_path / "print_lines.py"
+    script.write_text(f"import sys\nfor index in range({lines}):\n    print(f'line {{index}}', file=sys.stderr if index % 2 else sys.stdout)\nsys.exit({exit_code})\n")
+    return script
+
+
+def test_output_is_streamed_to_the_logger(tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+    # Arrange
+    script = create_script(tmp_path, 3, 0)
+
+    # Act
+    with caplog.at_level("INFO", logger="bootstrap"):
+        SubprocessExecutor([sys.executable, script]).execute()
+
+    # Assert
+    assert {"line 0", "line 1", "line 2"} <= set(caplog.messages)
+
+
+def test_failure_reports_the_last_lines_only(tmp_path: Path) -> None:
+    # Arrange
+    script = create_script(tmp_path, SubprocessExecutor.MAX_OUTPUT_LINES + 100, 3)
+
+    # Act
+    with pytest.raises(UserNotificationException) as exc_info:
+        SubprocessExecutor([sys.executable, script]).execute()
+
+    # Assert
+    message_lines = str(exc_info.value).splitlines()
+    assert message_lines[0].endswith("failed with exit code 3:")
+    assert len(message_lines) == SubprocessExecutor.MAX_OUTPUT_LINES + 1
+    assert message_lines[-1] == f"line {SubprocessExecutor.MAX_OUTPUT_LINES + 99}"
+    assert "line 99" not in message_lines
+
+
+def test_full_output_is_appended_to_the_log_file(tmp_path: Path) -> None:
+    # Arrange
+    script = create_script(tmp_path, SubprocessExecutor.MAX_OUTPUT_LINES + 100, 0)
+    log_file = tmp_path / "logs" / "bootstrap.log"
+
+    # Act
+    SubprocessExecutor([sys.executable, script], log_file=log_file).execute()
+    SubprocessExecutor([sys.executable, script], log_file=log_file).execute()
+
+    # Assert
+    log_lines = log_file.read_text().splitlines()
+    assert log_lines[0].startswith(f"$ {sys.executable} {script}")
+    assert log_lines.count("line 0") == 2
+    assert len(log_lines) == 2 * (SubprocessExecutor.MAX_OUTPUT_LINES + 101)
+
+
+def test_log_file_from_environment(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    # Arrange
+    monkeypatch.setenv(LOG_FILE_ENV_VAR, str(tmp_path / "bootstrap.log"))
+
+    # Act
+    arguments = parse_arguments([])
+
+    # Assert
+    assert arguments.log_file == tmp_path / "bootstrap.log"
+
+
+def test_arguments_with_spaces_are_kept(tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+    # Arrange
+    script_dir = tmp_path / "dir with spaces"
+    script_dir.mkdir()
+    script = script_dir / "echo.py"
+    script.write_text("import sys\nprint(sys.argv[1])\n")
+
+    # Act
+    with caplog.at_level("INFO", logger="bootstrap"):
+        SubprocessExecutor([sys.executable, script, "hello world"]).execute()
+
+    # Assert
+    assert "hello world" in caplog.messages
+
+
+def wait_for_file(path: Path) -> None:
+    for _ in range(100):
+        if path.exists() and path.read_text():
+            return
+        time.sleep(0.1)
+    pytest.fail(f"{path} was not written")
+
+
+def assert_process_exits(pid: int) -> None:
+    for _ in range(50):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return
+        time.sleep(0.1)
+    pytest.fail(f"Process {pid} is still running")
+
+
+@pytest.mark.skipif(sys.platform.startswith("win32"), reason="checks the process state with POSIX signals")
+def test_timeout_kills_the_process_group(tmp_path: Path) -> None:
+    # Arrange
+    child_pid_file = tmp_path / "child.pid"
+    script = tmp_path / "hang.py"
+    script.write_text(f"import subprocess, sys, time\nchild = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\nopen({str(child_pid_file)!r}, 'w').write(str(child.pid))\ntime.sleep(60)\n")
+
+    # Act
+    start = time.perf_counter()
+    with pytest.raises(UserNotificationException, match="timed out after 1 seconds"):
+        SubprocessExecutor([sys.executable, script], timeout=1).execute()
+
+    # Assert
+    assert time.perf_counter() - start < 30
+    assert_process_exits(int(child_pid_file.read_text()))
+
+
+@pytest.mark.skipif(sys.platform.startswith("win32"), reason="interrupts the main thread with POSIX signals")
+def test_interrupt_kills_the_process_group(tmp_path: Path) -> None:
+    # Arrange - the command runs in its own process group because of the timeout, so Ctrl+C does not reach it
+    pid_file = tmp_path / "command.pid"
+    script = tmp_path / "hang.py"
+    script.write_text(f"import os, time\nopen({str(pid_file)!r}, 'w').write(str(os.getpid()))\ntime.sleep(60)\n")
+    main_thread_id = threading.get_ident()
+    interrupter = threading.Thread(target=lambda: (wait_for_file(pid_file), signal.pthread_kill(main_thread_id, signal.SIGINT)))
+
+    # Act
+    start = time.perf_counter()
+    interrupter.start()
+    with pytest.raises(KeyboardInterrupt):
+        SubprocessExecutor([sys.executable, script], timeout=60).execute()
+    interrupter.join()
+
+    # Assert
+    assert time.perf_counter() - start < 30
+    assert_process_exits(int(pid_file.read_text()))
+
+
+def test_execute_works_inside_a_running_event_loop(tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+    # Arrange
+    script = create_script(tmp_path, 1, 0)
+
+    async def execute_in_loop() -> None:
+        SubprocessExecutor([sys.executable, script]).execute()
+
+    # Act
+    with caplog.at_level("INFO", logger="bootstrap"):
+        asyncio.run(execute_in_loop())
+
+    # Assert
+    assert "line 0" in caplog.messages
@@ -0,0 +1,73 @@
+import json
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from bootstrap import TRACE_FILE_ENV_VAR, Executor, Runnable, SubprocessExecutor, Tracer, parse_arguments, tracer
+
+
+class _TracedRunnable(Runnable):
+    def __init__(self, input_file: Path) -> None:
+        self.input_file = input_file
+
+    def run(self) -> int:
+        SubprocessExecutor(["python", "--version"]).execute()
+        return 0
+
+    def get_name(self) -> str:
+        return "traced"
+
+    def get_inputs(self) -> List[Path]:
+        return [self.input_file]
+
+    def get_outputs(self) -> List[Path]:
+        return []
+
+
+@pytest.fixture
+def enabled_tracer():
+    tracer.enable()
+    yield tracer
+    tracer.enabled = False
+    tracer.events.clear()
+
+
+def test_disabled_tracer_records_nothing():
+    # Arrange
+    my_tracer = Tracer()
+
+    # Act
+    with my_tracer.span("something"):
+        pass
+
+    # Assert
+    assert my_tracer.events == []
+
+
+def test_executor_spans_are_written(tmp_path: Path, enabled_tracer: Tracer):
+    # Arrange
+    input_file = tmp_path / "input.txt"
+    input_file.write_text("content")
+    trace_file = tmp_path / "trace.json"
+
+    # Act
+    Executor(tmp_path / "cache").execute(_TracedRunnable(input_file))
+    enabled_tracer.write(trace_file)
+
+    # Assert
+    events = json.loads(trace_file.read_text())["traceEvents"]
+    span_names = [event["name"] for event in events if event["ph"] == "X"]
+    assert {"execute traced", "status check", "run", "store_run_info", "subprocess", "hash file"} <= set(span_names)
+    subprocess_event = next(event for event in events if event["name"] == "subprocess")
+    assert subprocess_event["args"]["command"] == "python --version"
+    assert all(event["dur"] >= 0 for event in events if event["ph"] == "X")
+    assert any(event["ph"] == "M" and event["name"] == "thread_name" for event in events)
+
+
+def test_trace_argument(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    # Act & Assert
+    assert parse_arguments([]).trace is None
+    assert parse_arguments(["--trace", "trace.json"]).trace == Path("trace.json")
+    monkeypatch.setenv(TRACE_FILE_ENV_VAR, str(tmp_path / "env-trace.json"))
+    assert parse_arguments([]).trace == tmp_path / "env-trace.json"
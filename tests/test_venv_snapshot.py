@@ -0,0 +1,138 @@
+import json
+import subprocess  # nosec
+import venv
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from bootstrap import BootstrapConfig, CreateBootstrapEnvironment, CreateVirtualEnvironment, Executor, VenvSnapshotCache, get_site_packages_dirs, instantiate_os_specific_venv, main
+
+
+def create_project_venv(project_dir: Path, snapshot_dir: Path) -> CreateVirtualEnvironment:
+    config = BootstrapConfig(bootstrap_cache_dir=project_dir.parent / "cache", venv_snapshot_dir=snapshot_dir)
+    (project_dir / "poetry.lock").write_text('[[package]]\nname = "requests"\nversion = "2.31.0"\n')
+    return CreateVirtualEnvironment(project_dir, CreateBootstrapEnvironment(config, project_dir))
+
+
+def install_project(venv_dir: Path, project_dir: Path) -> None:
+    """Create a real virtual environment with an editable install of the project and an entry point script."""
+    venv.create(venv_dir, with_pip=False)
+    site_packages = get_site_packages_dirs(venv_dir)[0]
+    (site_packages / "project.pth").write_text(f"{project_dir}\n")
+    scripts_dir = instantiate_os_specific_venv(venv_dir).scripts_path()
+    (scripts_dir / "project-cli").write_text(f"#!{scripts_dir / 'python'}\nimport project\n")
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path: Path) -> Path:
+    return tmp_path / "snapshots"
+
+
+def test_snapshot_is_restored_to_another_location(tmp_path: Path, snapshot_dir: Path) -> None:
+    # Arrange
+    origin_project, target_project = tmp_path / "origin", tmp_path / "target"
+    install_project(origin_project / ".venv", origin_project)
+    (origin_project / ".venv" / "create-virtual-environment.deps.json").write_text("{}")
+    cache = VenvSnapshotCache(snapshot_dir)
+    cache.save(origin_project / ".venv", origin_project, "0123456789abcdef")
+
+    # Act
+    target_project.mkdir()
+    restored = cache.restore("0123456789abcdef", target_project / ".venv", target_project)
+
+    # Assert
+    assert restored
+    venv_dir = target_project / ".venv"
+    assert str(origin_project) not in (venv_dir / "pyvenv.cfg").read_text()
+    assert (get_site_packages_dirs(venv_dir)[0] / "project.pth").read_text() == f"{target_project}\n"
+    scripts_dir = instantiate_os_specific_venv(venv_dir).scripts_path()
+    assert (scripts_dir / "project-cli").read_text().startswith(f"#!{scripts_dir / 'python'}\n")
+    assert not (venv_dir / "create-virtual-environment.deps.json").exists()
+    prefix = subprocess.run([str(instantiate_os_specific_venv(venv_dir).python_path()), "-c", "import sys; print(sys.prefix)"], capture_output=True, text=True, check=True)  # nosec
+    assert Path(prefix.stdout.strip()) == venv_dir
+    assert [path.name for path in target_project.iterdir()] == [".venv"]
+
+
+def test_restore_of_a_missing_or_corrupt_snapshot(tmp_path: Path, snapshot_dir: Path) -> None:
+    # Arrange
+    cache = VenvSnapshotCache(snapshot_dir)
+    snapshot_dir.mkdir()
+    cache.get_archive("corrupt").write_bytes(b"not a tar.gz")
+
+    # Act & Assert
+    assert not cache.restore("missing", tmp_path / ".venv", tmp_path)
+    assert not cache.restore("corrupt", tmp_path / ".venv", tmp_path)
+    assert not (tmp_path / ".venv").exists()
+
+
+def test_snapshot_key_depends_on_the_lock_file_and_package_manager(project_dir: Path, snapshot_dir: Path) -> None:
+    # Arrange
+    project_venv = create_project_venv(project_dir, snapshot_dir)
+    key = project_venv.get_snapshot_key()
+
+    # Act
+    project_venv.config.package_manager = "poetry==2.1.3"
+    package_manager_key = project_venv.get_snapshot_key()
+    (project_dir / "poetry.lock").write_text('[[package]]\nname = "requests"\nversion = "2.32.0"\n')
+    lock_key = project_venv.get_snapshot_key()
+
+    # Assert
+    assert key and package_manager_key and lock_key
+    assert len({key, package_manager_key, lock_key}) == 3
+
+
+def test_cold_run_restores_the_snapshot_instead_of_installing(project_dir: Path, tmp_path: Path, snapshot_dir: Path) -> None:
+    # Arrange
+    other_project = tmp_path / "other"
+    install_project(other_project / ".venv", other_project)
+    project_venv = create_project_venv(project_dir, snapshot_dir)
+    key = project_venv.get_snapshot_key()
+    assert key
+    VenvSnapshotCache(snapshot_dir).save(other_project / ".venv", other_project, key)
+
+    # Act
+    with patch.object(project_venv.bootstrap_env.virtual_env, "run") as package_manager_run:
+        exit_code = project_venv.run()
+
+    # Assert
+    assert exit_code == 0
+    package_manager_run.assert_not_called()
+    assert (get_site_packages_dirs(project_venv.venv_dir)[0] / "project.pth").read_text() == f"{project_dir}\n"
+
+
+def test_installed_environment_is_stored_as_snapshot(project_dir: Path, snapshot_dir: Path) -> None:
+    # Arrange
+    project_venv = create_project_venv(project_dir, snapshot_dir)
+
+    # Act
+    with patch.object(project_venv.bootstrap_env.virtual_env, "run", side_effect=lambda *args, **kwargs: install_project(project_venv.venv_dir, project_dir)):
+        exit_code = project_venv.run()
+
+    # Assert
+    assert exit_code == 0
+    key = project_venv.get_snapshot_key()
+    assert key
+    metadata = VenvSnapshotCache.read_metadata(VenvSnapshotCache(snapshot_dir).get_archive(key))
+    assert metadata["key"] == key
+    assert metadata["venv_dir"] == str(project_venv.venv_dir)
+
+
+def test_export_and_import_commands(project_dir: Path, tmp_path: Path, snapshot_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    # Arrange
+    (project_dir / "bootstrap.json").write_text(json.dumps({"bootstrap_cache_dir": str(tmp_path / "cache")}))
+    project_venv = create_project_venv(project_dir, snapshot_dir)
+    install_project(project_venv.venv_dir, project_dir)
+    monkeypatch.chdir(project_dir)
+    archive = tmp_path / "export.tar.gz"
+    stale_exit_code = main(["snapshot", "export", "--output", str(archive)])
+    Executor(project_venv.venv_dir).store_run_info(project_venv)
+
+    # Act
+    export_exit_code = main(["snapshot", "export", "--output", str(archive)])
+    import_exit_code = main(["snapshot", "import", str(archive), "--snapshot-dir", str(snapshot_dir)])
+
+    # Assert
+    assert stale_exit_code == 1
+    assert export_exit_code == import_exit_code == 0
+    assert [path.name for path in snapshot_dir.iterdir()] == [f"{project_venv.get_snapshot_key()}.tar.gz"]
@@ -0,0 +1,141 @@
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+from unittest.mock import patch
+
+import pytest
+
+from bootstrap import (
+    BootstrapConfig,
+    CreateBootstrapEnvironment,
+    CreateVirtualEnvironment,
+    Executor,
+    Tracer,
+    UserNotificationException,
+    bootstrap_workspace,
+    find_workspace_projects,
+)
+
+
+def create_projects(workspace_dir: Path, cache_dirs: List[Path]) -> List[Path]:
+    project_dirs = []
+    for index, cache_dir in enumerate(cache_dirs):
+        project_dir = workspace_dir / "packages" / f"project-{index}"
+        project_dir.mkdir(parents=True)
+        (project_dir / "pyproject.toml").write_text(f'[tool.poetry]\nname = "project-{index}"\n')
+        (project_dir / "bootstrap.json").write_text(json.dumps({"bootstrap_cache_dir": str(cache_dir)}))
+        project_dirs.append(project_dir.resolve())
+    return project_dirs
+
+
+def test_find_workspace_projects(tmp_path: Path) -> None:
+    # Arrange
+    project_dirs = create_projects(tmp_path, [tmp_path / "cache"] * 2)
+    (tmp_path / "packages" / "docs").mkdir()
+    (tmp_path / "tools").mkdir()
+    (tmp_path / "tools" / "Pipfile").write_text("")
+
+    # Act
+    projects = find_workspace_projects(["packages/*", "tools", "packages/project-0"], tmp_path)
+
+    # Assert
+    assert projects == [*project_dirs, (tmp_path / "tools").resolve()]
+
+
+@pytest.fixture
+def process_pool_in_threads():
+    # Patches do not reach worker processes, run the project stages in threads instead
+    with patch("concurrent.futures.ProcessPoolExecutor", ThreadPoolExecutor):
+        yield
+
+
+def create_marker(bootstrap_env: CreateBootstrapEnvironment) -> int:
+    bootstrap_env.marker_file.parent.mkdir(parents=True, exist_ok=True)
+    bootstrap_env.marker_file.write_text(bootstrap_env.env_hash)
+    return 0
+
+
+def test_workspace_builds_each_bootstrap_environment_once(tmp_path: Path, process_pool_in_threads: None, caplog: pytest.LogCaptureFixture) -> None:
+    # Arrange
+    project_dirs = create_projects(tmp_path, [tmp_path / "cache", tmp_path / "cache", tmp_path / "other-cache"])
+
+    # Act
+    with patch.object(CreateBootstrapEnvironment, "run", autospec=True, side_effect=create_marker) as bootstrap_run, patch.object(
+        CreateVirtualEnvironment, "run", autospec=True, return_value=0
+    ) as venv_run, caplog.at_level(logging.INFO, logger="bootstrap"):
+        with patch.object(Executor, "check_run_info", autospec=True, side_effect=Executor.check_run_info) as check_run_info:
+            first_exit_code = bootstrap_workspace(project_dirs, jobs=2)
+            second_exit_code = bootstrap_workspace(project_dirs, jobs=2)
+
+    # Assert
+    assert first_exit_code == second_exit_code == 0
+    assert sorted(str(call.args[0].bootstrap_env_dir.parent) for call in bootstrap_run.call_args_list) == [str(tmp_path / "cache"), str(tmp_path / "other-cache")]
+    assert sorted(call.args[0].root_dir for call in venv_run.call_args_list) == project_dirs
+    assert f"  {project_dirs[0]}: updated" in " ".join(caplog.messages)
+    assert f"  {project_dirs[0]}: up to date" in " ".join(caplog.messages)
+    # Each project environment is checked once per run
+    assert len([call for call in check_run_info.call_args_list if isinstance(call.args[1], CreateVirtualEnvironment)]) == 2 * len(project_dirs)
+
+
+def test_workspace_reports_projects_of_failed_bootstrap_environment(tmp_path: Path, process_pool_in_threads: None, caplog: pytest.LogCaptureFixture) -> None:
+    # Arrange
+    project_dirs = create_projects(tmp_path, [tmp_path / "broken-cache", tmp_path / "cache"])
+
+    def fail_in_broken_cache(bootstrap_env: CreateBootstrapEnvironment) -> int:
+        if bootstrap_env.bootstrap_env_dir.parent.name == "broken-cache":
+            raise UserNotificationException("No matching distribution found")
+        return create_marker(bootstrap_env)
+
+    # Act
+    with patch.object(CreateBootstrapEnvironment, "run", autospec=True, side_effect=fail_in_broken_cache), patch.object(CreateVirtualEnvironment, "run", autospec=True, return_value=0) as venv_run, caplog.at_level(
+        logging.INFO, logger="bootstrap"
+    ):
+        exit_code = bootstrap_workspace(project_dirs)
+
+    # Assert
+    assert exit_code == 1
+    assert [call.args[0].root_dir for call in venv_run.call_args_list] == [project_dirs[1]]
+    assert f"  {project_dirs[0]}: failed (0.0 s)  Bootstrap environment failed: No matching distribution found" in caplog.messages
+    assert any(message.startswith(f"  {project_dirs[1]}: updated") for message in caplog.messages)
+
+
+def test_workspace_projects_run_in_worker_processes_and_are_traced(tmp_path: Path) -> None:
+    # Arrange - the environments are marked up to date in this process, the workers only check them
+    project_dirs = create_projects(tmp_path, [tmp_path / "cache"] * 2)
+    for project_dir in project_dirs:
+        bootstrap_env = CreateBootstrapEnvironment(BootstrapConfig.from_json_file(project_dir / "bootstrap.json"), project_dir)
+        project_venv = CreateVirtualEnvironment(project_dir, bootstrap_env)
+        with patch.object(CreateBootstrapEnvironment, "run", autospec=True, side_effect=create_marker), patch.object(CreateVirtualEnvironment, "run", return_value=0):
+            Executor(bootstrap_env.bootstrap_env_dir).execute(bootstrap_env)
+            Executor(project_venv.venv_dir).execute(project_venv)
+
+    # Act
+    with patch("bootstrap.tracer", Tracer()) as workspace_tracer:
+        workspace_tracer.enable()
+        exit_code = bootstrap_workspace(project_dirs, jobs=2)
+    events = workspace_tracer.events
+
+    # Assert
+    assert exit_code == 0
+    project_spans = [event for event in events if event["name"] == "project environment"]
+    assert sorted(event["args"]["project"] for event in project_spans) == [str(project_dir) for project_dir in project_dirs]
+    assert all(event["pid"] != os.getpid() for event in project_spans)
+    assert any(event["name"] == "execute create-virtual-environment" and event["pid"] != os.getpid() for event in events)
+
+
+def test_package_manager_environment_does_not_change_os_environ(tmp_path: Path) -> None:
+    # Arrange
+    bootstrap_env = CreateBootstrapEnvironment(BootstrapConfig(bootstrap_cache_dir=tmp_path / "cache"), tmp_path)
+    creator = CreateVirtualEnvironment(tmp_path, bootstrap_env)
+    environ_before = dict(os.environ)
+
+    # Act
+    with patch.object(bootstrap_env.virtual_env, "run") as package_manager_run:
+        creator.run()
+
+    # Assert
+    assert package_manager_run.call_args.kwargs["env"]["POETRY_VIRTUALENVS_IN_PROJECT"] == "true"
+    assert dict(os.environ) == environ_before